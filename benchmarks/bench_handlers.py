@@ -0,0 +1,554 @@
+"""
+Benchmarks every lambda_handler against an in-process AWS stand-in (moto).
+
+For each catalog size the table is seeded with PRODUCT# items, then each
+handler is driven with realistic events. Reported per scenario:
+
+    - p50/p95/p99/mean latency and throughput of warm invocations
+    - the latency of the first invocation after the boto3 clients were dropped
+    - DynamoDB items read and consumed capacity per invocation, collected with
+      ReturnConsumedCapacity on every table call
+    - peak Python memory of one invocation (tracemalloc)
+
+Every write is also checked against the key types of the secondary indexes.
+DynamoDB rejects a write whose index key attribute has the wrong type, moto
+does not, so the benchmark rejects it the same way and exits with status 1.
+
+It also measures how long each handler module takes to import in a fresh
+interpreter, cold (empty bytecode cache) and warm (bytecode cached).
+
+Nothing leaves the machine: moto intercepts every DynamoDB, SNS, SQS, STS and
+S3 call. The results are written as JSON, and --baseline compares them to an
+earlier run and exits with status 1 on a p95 regression.
+
+moto scans its tables for queries and copies them for every transaction, so
+an invocation gets slower as the catalog grows. --iterations applies up to
+ITERATION_BASE_SIZE products and shrinks in proportion above it (to at least
+MIN_ITERATIONS). The defaults take about 5 minutes: roughly 2 minutes for each
+catalog size plus the import timing. Larger catalogs take longer still, and
+--search slows every size down further.
+
+Requires moto (pip install "moto[dynamodb,sns,sqs,sts,s3]").
+
+Usage:
+    python benchmarks/bench_handlers.py [--sizes 1000,5000] [--iterations 20]
+        [--snapshot] [--search] [--output results.json] [--baseline previous.json] [--tolerance 0.25]
+"""
+import io
+import os
+import sys
+import re
+import json
+import time
+import uuid
+import random
+import argparse
+import platform
+import tempfile
+import importlib
+import subprocess
+import tracemalloc
+import contextlib
+import collections
+from decimal import Decimal
+from botocore.exceptions import ClientError
+
+LAMBDA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda')
+HANDLER_MODULES = (
+    'Get_All_Products_Lambda',
+    'Get_Product_Lambda',
+    'Post_Product_Lambda',
+    'Delete_Product_Lambda',
+    'Post_Purchase_Lambda',
+    'Post_Subscribe_Lambda',
+    'Search_Products_Lambda',
+    'Process_Orders_Lambda'
+)
+BENCHMARK_BUCKET = 'marketplace-benchmark-catalog'
+BENCHMARK_QUEUE = 'MarketPlaceOrderQueue'
+# moto serves every queue under its default account ID
+BENCHMARK_QUEUE_URL = f'https://sqs.us-east-1.amazonaws.com/123456789012/{BENCHMARK_QUEUE}'
+
+# Secondary indexes created by dynamodb/create_dynamodb_table.sh, as (name, [(attribute, type, key type)])
+TABLE_INDEXES = (
+    ('TypeIndex', [('Type', 'S', 'HASH'), ('PK', 'S', 'RANGE')]),
+    ('ProductNameIndex', [('ProductName', 'S', 'HASH')]),
+    ('PriceIndex', [('Type', 'S', 'HASH'), ('ProductPrice', 'N', 'RANGE')]),
+    ('OwnerIndex', [('ProductOwner', 'S', 'HASH'), ('PK', 'S', 'RANGE')]),
+    ('ChangeIndex', [('ChangeFeed', 'S', 'HASH'), ('UpdatedAt', 'N', 'RANGE')])
+)
+
+# Catalog size up to which every scenario runs --iterations times, and the
+# fewest iterations a larger catalog is scaled down to
+ITERATION_BASE_SIZE = 1000
+MIN_ITERATIONS = 5
+
+# DynamoDB operations that accept ReturnConsumedCapacity
+CAPACITY_OPERATIONS = ('GetItem', 'PutItem', 'UpdateItem', 'DeleteItem', 'Query', 'Scan',
+                       'BatchGetItem', 'BatchWriteItem', 'TransactGetItems', 'TransactWriteItems')
+
+OWNERS = [f'owner{index}@example.com' for index in range(50)]
+ADJECTIVES = ['Red', 'Blue', 'Vintage', 'Compact', 'Wireless', 'Heavy', 'Portable', 'Classic', 'Smart', 'Quiet']
+NOUNS = ['Laptop', 'Lamp', 'Ladder', 'Chair', 'Speaker', 'Camera', 'Backpack', 'Kettle', 'Monitor', 'Bicycle',
+         'Guitar', 'Jacket', 'Blender', 'Drill', 'Tent', 'Watch', 'Keyboard', 'Mirror', 'Printer', 'Sofa']
+
+parser = argparse.ArgumentParser(description="Benchmark the MarketPlace Lambda handlers offline.")
+parser.add_argument('--sizes', default='1000,5000', help="comma-separated catalog sizes to seed")
+parser.add_argument('--iterations', type=int, default=20,
+                    help=f"warm invocations per scenario, scaled down above {ITERATION_BASE_SIZE} products")
+parser.add_argument('--import-runs', type=int, default=5, help="fresh interpreters started per module to time imports")
+parser.add_argument('--snapshot', action='store_true', help="enable the S3 catalog snapshot for the listing handler")
+parser.add_argument('--search', action='store_true',
+                    help="seed the search index and benchmark the search handler (about 15 index items per product, "
+                         "which also slows moto's secondary index queries down)")
+parser.add_argument('--seed', type=int, default=42, help="random seed for the generated catalog")
+parser.add_argument('--output', help="write the JSON results to this file instead of stdout")
+parser.add_argument('--baseline', help="JSON results of an earlier run to compare against")
+parser.add_argument('--tolerance', type=float, default=0.25, help="allowed relative p95 increase over the baseline")
+
+class CapacityRecorder:
+    """
+    Collects ReturnConsumedCapacity results through botocore event hooks.
+    """
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.calls = 0
+        self.items_read = 0
+        self.capacity_units = 0.0
+
+    def install(self, session):
+        """
+        Registers the hooks on a boto3 session, before its clients are created.
+        """
+        for operation in CAPACITY_OPERATIONS:
+            session.events.register(f'provide-client-params.dynamodb.{operation}', self.request_capacity)
+        session.events.register('after-call.dynamodb', self.record)
+
+    def request_capacity(self, params, **kwargs):
+        params.setdefault('ReturnConsumedCapacity', 'TOTAL')
+
+    def record(self, parsed, model, **kwargs):
+        self.calls += 1
+        if model.name in ('Query', 'Scan'):
+            self.items_read += parsed.get('ScannedCount', 0)
+        elif model.name == 'GetItem' and 'Item' in parsed:
+            self.items_read += 1
+        elif model.name == 'BatchGetItem':
+            self.items_read += sum(len(items) for items in parsed.get('Responses', {}).values())
+        consumed = parsed.get('ConsumedCapacity') or []
+        if isinstance(consumed, dict):
+            consumed = [consumed]
+        self.capacity_units += sum(entry.get('CapacityUnits', 0) for entry in consumed)
+
+class IndexKeyChecker:
+    """
+    Rejects writes whose secondary index key attributes have the wrong type.
+    """
+    def __init__(self):
+        self.key_types = {}
+        for name, keys in TABLE_INDEXES:
+            for attribute, attribute_type, _ in keys:
+                self.key_types[attribute] = attribute_type
+        self.violations = []
+
+    def install(self):
+        """
+        Registers the check on the shared session, before any client is created.
+        """
+        import marketplace_common
+        marketplace_common.register_event_handler('before-call.dynamodb', self.check)
+
+    def written_attributes(self, operation, request):
+        """
+        Lists the (attribute, typed value) pairs a request writes.
+        """
+        items = []
+        if operation == 'PutItem':
+            items.append(request['Item'])
+        elif operation == 'BatchWriteItem':
+            items.extend(entry['PutRequest']['Item'] for entries in request['RequestItems'].values()
+                         for entry in entries if 'PutRequest' in entry)
+        elif operation == 'TransactWriteItems':
+            items.extend(entry['Put']['Item'] for entry in request['TransactItems'] if 'Put' in entry)
+        elif operation == 'UpdateItem' and 'UpdateExpression' in request:
+            names = request.get('ExpressionAttributeNames', {})
+            values = request.get('ExpressionAttributeValues', {})
+            # Plain assignments of the SET clause, e.g. '#name = :value'
+            for name, placeholder in re.findall(r'(#?\w+)\s*=\s*(:\w+)', request['UpdateExpression']):
+                if placeholder in values:
+                    items.append({names.get(name, name): values[placeholder]})
+        return [pair for item in items for pair in item.items()]
+
+    def check(self, model, params, **kwargs):
+        request = json.loads(params.get('body') or b'{}')
+        for attribute, value in self.written_attributes(model.name, request):
+            expected = self.key_types.get(attribute)
+            if expected and expected not in value:
+                message = (f"One or more parameter values were invalid: Type mismatch for Index Key {attribute} "
+                           f"Expected: {expected} Actual: {next(iter(value))}")
+                self.violations.append(f"{model.name}: {message}")
+                raise ClientError({'Error': {'Code': 'ValidationException', 'Message': message}}, model.name)
+
+def scaled_iterations(iterations, size):
+    """
+    Returns the warm invocations per scenario for a catalog of size products.
+    """
+    return min(iterations, max(MIN_ITERATIONS, iterations * ITERATION_BASE_SIZE // size))
+
+def percentile(values, fraction):
+    """
+    Returns the nearest-rank percentile of a list of values.
+    """
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+def time_imports(runs):
+    """
+    Times the import of every handler module in fresh interpreters.
+
+    The first run uses an empty bytecode cache (every module is compiled, as in
+    a new Lambda container), the following runs reuse it.
+
+    Returns:
+        dict: {'cold_ms', 'warm_ms'} per module.
+    """
+    script = ("import sys, time; sys.path.insert(0, sys.argv[1]); started = time.perf_counter(); "
+              "__import__(sys.argv[2]); print(time.perf_counter() - started)")
+    results = {}
+    for module in HANDLER_MODULES:
+        with tempfile.TemporaryDirectory() as pycache:
+            env = dict(os.environ, PYTHONPYCACHEPREFIX=pycache)
+            timings = []
+            for _ in range(max(2, runs)):
+                output = subprocess.run([sys.executable, '-c', script, LAMBDA_DIR, module],
+                                        env=env, capture_output=True, text=True, check=True).stdout
+                timings.append(float(output.strip()) * 1000)
+        warm = sorted(timings[1:])
+        results[module] = {'cold_ms': round(timings[0], 2), 'warm_ms': round(warm[len(warm) // 2], 2)}
+    return results
+
+def create_table():
+    """
+    Creates 'MarketPlaceDatabase' with the same keys and indexes as the deploy script.
+    """
+    import marketplace_common
+    attribute_types = {'PK': 'S', 'SK': 'S'}
+    indexes = []
+    for name, keys in TABLE_INDEXES:
+        attribute_types.update({attribute: attribute_type for attribute, attribute_type, _ in keys})
+        indexes.append({
+            'IndexName': name,
+            'KeySchema': [{'AttributeName': attribute, 'KeyType': key_type} for attribute, _, key_type in keys],
+            'Projection': {'ProjectionType': 'ALL'}
+        })
+    client = marketplace_common.get_client('dynamodb')
+    client.create_table(
+        TableName=marketplace_common.TABLE_NAME,
+        AttributeDefinitions=[{'AttributeName': name, 'AttributeType': value} for name, value in attribute_types.items()],
+        KeySchema=[{'AttributeName': 'PK', 'KeyType': 'HASH'}, {'AttributeName': 'SK', 'KeyType': 'RANGE'}],
+        GlobalSecondaryIndexes=indexes,
+        BillingMode='PAY_PER_REQUEST'
+    )
+
+def make_product(rng, index):
+    return {
+        'PK': f'PRODUCT#{uuid.UUID(int=rng.getrandbits(128), version=4)}',
+        'SK': '#DETAILS',
+        'Type': 'Product',
+        'ProductName': f'{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {index:06d}',
+        'ProductPrice': Decimal(rng.randint(100, 100000)) / 100,
+        'ProductOwner': rng.choice(OWNERS),
+        # Seeded products were last changed long before any sync cursor the scenarios use
+        'ChangeFeed': 'Catalog',
+        'UpdatedAt': 1700000000000 + index
+    }
+
+def seed_catalog(size, rng, search):
+    """
+    Writes size products to the table, and their search index items if search is set.
+
+    Returns:
+        list: The product items that were written.
+    """
+    import marketplace_common
+    import marketplace_search
+    products = [make_product(rng, index) for index in range(size)]
+    failed = marketplace_common.batch_write([{'PutRequest': {'Item': item}} for item in products])
+    marketplace_common.adjust_owner_counts(collections.Counter(item['ProductOwner'] for item in products))
+    if failed or (search and not marketplace_search.index_products(products)):
+        raise RuntimeError("The catalog could not be seeded")
+    return products
+
+def build_scenarios(products, rng, handlers, search):
+    """
+    Builds the benchmark scenarios for a seeded catalog.
+
+    Each scenario is (name, handler, make_event). make_event runs outside the
+    timed section, so it can prepare the data an invocation needs.
+    """
+    import marketplace_common
+    get_all = handlers['Get_All_Products_Lambda']
+    counter = iter(range(10 ** 9))
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        second_page_token = json.loads(get_all.lambda_handler({'limit': '100'}, None)['body'])['next_token']
+
+    def uncached(event):
+        def make_event():
+            get_all._listing_cache.clear()
+            return dict(event)
+        return make_event
+
+    def existing_product():
+        return rng.choice(products)
+
+    def product_to_delete():
+        item = make_product(rng, next(counter))
+        marketplace_common.get_table().put_item(Item=item)
+        return {'product_id': item['PK'].split('#', 1)[1], 'product_owner': item['ProductOwner']}
+
+    def product_to_delete_by_name():
+        item = make_product(rng, next(counter))
+        marketplace_common.get_table().put_item(Item=item)
+        return {'product_name': item['ProductName'], 'product_price': str(item['ProductPrice']),
+                'product_owner': item['ProductOwner']}
+
+    def products_to_delete(count):
+        owner = rng.choice(OWNERS)
+        items = [{**make_product(rng, next(counter)), 'ProductOwner': owner} for _ in range(count)]
+        marketplace_common.batch_write([{'PutRequest': {'Item': item}} for item in items])
+        return {'product_ids': [item['PK'].split('#', 1)[1] for item in items], 'product_owner': owner}
+
+    def new_product():
+        return {'product_name': f'Benchmark {next(counter)}', 'product_price': '19.99', 'product_owner': rng.choice(OWNERS)}
+
+    def products_to_buy(count):
+        items = [make_product(rng, next(counter)) for _ in range(count)]
+        marketplace_common.batch_write([{'PutRequest': {'Item': item}} for item in items])
+        return [{'product_id': item['PK'].split('#', 1)[1], 'product_name': item['ProductName'],
+                 'product_price': str(item['ProductPrice']), 'product_owner': item['ProductOwner']} for item in items]
+
+    def order_events(count):
+        records = []
+        for index in range(count):
+            item = existing_product()
+            order = {'order_id': f'benchmark-{next(counter)}', 'buyer': 'buyer@example.com', 'total': item['ProductPrice'],
+                     'items': [{'ProductID': item['PK'].split('#', 1)[1], 'ProductName': item['ProductName'],
+                                'ProductPrice': item['ProductPrice'], 'ProductOwner': item['ProductOwner']}]}
+            records.append({'messageId': str(index), 'body': marketplace_common.json_dumps(order)})
+        return {'Records': records}
+
+    scenarios = [
+        ('get_all_products.first_page', get_all.lambda_handler, uncached({})),
+        ('get_all_products.first_page_cached', get_all.lambda_handler, lambda: {}),
+        ('get_all_products.second_page', get_all.lambda_handler, uncached({'limit': '100', 'next_token': second_page_token})),
+        ('get_all_products.fields', get_all.lambda_handler, uncached({'limit': '100', 'fields': 'ProductID,ProductName'})),
+        ('get_all_products.under_50_cheapest', get_all.lambda_handler, uncached({'max_price': '50', 'sort': 'price_asc'})),
+        ('get_all_products.by_owner', get_all.lambda_handler, lambda: uncached({'owner': rng.choice(OWNERS)})()),
+        ('get_product.by_id', handlers['Get_Product_Lambda'].lambda_handler,
+         lambda: {'product_id': existing_product()['PK'].split('#', 1)[1]}),
+        ('get_product.by_name', handlers['Get_Product_Lambda'].lambda_handler,
+         lambda: {'product_name': existing_product()['ProductName']}),
+        ('post_product.single', handlers['Post_Product_Lambda'].lambda_handler, new_product),
+        ('post_product.idempotent_retry', handlers['Post_Product_Lambda'].lambda_handler,
+         lambda: {'product_name': 'Benchmark retry', 'product_price': '19.99', 'product_owner': OWNERS[0],
+                  'headers': {'Idempotency-Key': 'benchmark-retry'}}),
+        ('post_product.batch_25', handlers['Post_Product_Lambda'].lambda_handler,
+         lambda: {'products': [new_product() for _ in range(25)]}),
+        ('delete_product.by_id', handlers['Delete_Product_Lambda'].lambda_handler, product_to_delete),
+        ('delete_product.by_name', handlers['Delete_Product_Lambda'].lambda_handler, product_to_delete_by_name),
+        ('delete_product.bulk_100', handlers['Delete_Product_Lambda'].lambda_handler, lambda: products_to_delete(100)),
+        # moto copies every table on each transaction, so these grow with the catalog size offline
+        ('post_purchase.single', handlers['Post_Purchase_Lambda'].lambda_handler,
+         lambda: {**products_to_buy(1)[0], 'user_email': 'buyer@example.com'}),
+        ('post_purchase.cart_5', handlers['Post_Purchase_Lambda'].lambda_handler,
+         lambda: {'user_email': 'buyer@example.com', 'items': products_to_buy(5)}),
+        ('process_orders.batch_10', handlers['Process_Orders_Lambda'].lambda_handler, lambda: order_events(10)),
+        ('post_subscribe.new_email', handlers['Post_Subscribe_Lambda'].lambda_handler,
+         lambda: {'user_email': f'subscriber{next(counter)}@example.com'}),
+        # The creates, deletes and purchases of the scenarios above are the churn to sync
+        ('get_all_products.since_last_minute', get_all.lambda_handler,
+         lambda: {'since': str(marketplace_common.change_timestamp() - 60000)})
+    ]
+    if search:
+        scenarios.extend([
+            ('search_products.prefix', handlers['Search_Products_Lambda'].lambda_handler,
+             lambda: {'q': rng.choice(NOUNS)[:3]}),
+            ('search_products.two_words', handlers['Search_Products_Lambda'].lambda_handler,
+             lambda: {'q': f'{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)}'})
+        ])
+    return scenarios
+
+def run_scenario(handler, make_event, iterations, recorder):
+    """
+    Runs one scenario and summarizes its latency, reads and memory.
+    """
+    import marketplace_common
+
+    def invoke():
+        event = make_event()
+        started = time.perf_counter()
+        # Keep the handlers' logging out of the results
+        with contextlib.redirect_stdout(io.StringIO()):
+            response = handler(event, None)
+        latency = (time.perf_counter() - started) * 1000
+        if 'statusCode' not in response:
+            # The queue consumer answers with the events to retry instead of a status code
+            return latency, 'retry' if response.get('batchItemFailures') else 'ok'
+        return latency, response['statusCode']
+
+    # First invocation with fresh clients, as in a new container
+    marketplace_common.reset()
+    recorder.install(marketplace_common.get_session())
+    first_ms, _ = invoke()
+
+    recorder.reset()
+    latencies = []
+    status_codes = {}
+    started = time.perf_counter()
+    for _ in range(iterations):
+        latency, status_code = invoke()
+        latencies.append(latency)
+        status_codes[str(status_code)] = status_codes.get(str(status_code), 0) + 1
+    elapsed = time.perf_counter() - started
+    calls, items_read, capacity_units = recorder.calls, recorder.items_read, recorder.capacity_units
+
+    # Measured separately, since tracing slows every allocation down
+    tracemalloc.start()
+    invoke()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'iterations': iterations,
+        'first_invocation_ms': round(first_ms, 3),
+        'p50_ms': round(percentile(latencies, 0.50), 3),
+        'p95_ms': round(percentile(latencies, 0.95), 3),
+        'p99_ms': round(percentile(latencies, 0.99), 3),
+        'mean_ms': round(sum(latencies) / len(latencies), 3),
+        'throughput_per_s': round(iterations / elapsed, 2),
+        'dynamodb_calls': round(calls / iterations, 2),
+        'items_read': round(items_read / iterations, 2),
+        'consumed_capacity': round(capacity_units / iterations, 3),
+        'peak_memory_kib': round(peak / 1024, 1),
+        'status_codes': status_codes
+    }
+
+def benchmark_size(size, args, handlers):
+    """
+    Seeds a fresh in-process AWS backend with size products and runs every scenario.
+    """
+    from moto import mock_aws
+    import marketplace_common
+    import marketplace_snapshot
+
+    rng = random.Random(args.seed)
+    with mock_aws():
+        marketplace_common.reset()
+        handlers['Get_All_Products_Lambda']._listing_cache.clear()
+        create_table()
+        marketplace_common.get_client('sns').create_topic(Name=marketplace_common.TOPIC_NAME)
+        marketplace_common.get_client('sqs').create_queue(QueueName=BENCHMARK_QUEUE)
+
+        started = time.perf_counter()
+        products = seed_catalog(size, rng, args.search)
+        result = {'items': size, 'seed_seconds': round(time.perf_counter() - started, 2)}
+
+        if marketplace_snapshot.is_enabled():
+            marketplace_common.get_client('s3').create_bucket(Bucket=marketplace_snapshot.CATALOG_BUCKET)
+            started = time.perf_counter()
+            marketplace_snapshot.build_snapshot()
+            result['snapshot_seconds'] = round(time.perf_counter() - started, 2)
+
+        recorder = CapacityRecorder()
+        result['scenarios'] = {}
+        for name, handler, make_event in build_scenarios(products, rng, handlers, args.search):
+            print(f"  {name}", file=sys.stderr)
+            result['scenarios'][name] = run_scenario(handler, make_event, scaled_iterations(args.iterations, size), recorder)
+    return result
+
+def compare(results, baseline, tolerance):
+    """
+    Lists the scenarios whose p95 latency grew by more than tolerance.
+    """
+    regressions = []
+    previous = {run['items']: run['scenarios'] for run in baseline.get('runs', [])}
+    for run in results['runs']:
+        for name, stats in run['scenarios'].items():
+            before = previous.get(run['items'], {}).get(name)
+            if before and stats['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+                regressions.append(f"{run['items']} items, {name}: p95 {before['p95_ms']}ms -> {stats['p95_ms']}ms")
+    return regressions
+
+def main():
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+
+    # Credentials and settings must be in place before the shared module is imported
+    os.environ.update({
+        'AWS_ACCESS_KEY_ID': 'testing',
+        'AWS_SECRET_ACCESS_KEY': 'testing',
+        'AWS_DEFAULT_REGION': 'us-east-1',
+        'MARKETPLACE_CATALOG_CACHE_TTL': '60',
+        'MARKETPLACE_ORDER_QUEUE_URL': BENCHMARK_QUEUE_URL
+    })
+    for name in ('AWS_PROFILE', 'AWS_SESSION_TOKEN', 'AWS_ENDPOINT_URL', 'MARKETPLACE_TOPIC_ARN',
+                 'MARKETPLACE_READ_CAPACITY', 'MARKETPLACE_WRITE_CAPACITY'):
+        os.environ.pop(name, None)
+    if args.snapshot:
+        os.environ['MARKETPLACE_CATALOG_BUCKET'] = BENCHMARK_BUCKET
+    else:
+        os.environ.pop('MARKETPLACE_CATALOG_BUCKET', None)
+
+    try:
+        import moto  # noqa: F401
+    except ImportError:
+        print('Error: moto is not installed. Run: pip install "moto[dynamodb,sns,sqs,sts,s3]"')
+        sys.exit(1)
+
+    print("Timing handler imports", file=sys.stderr)
+    imports = time_imports(args.import_runs)
+
+    sys.path.insert(0, LAMBDA_DIR)
+    handlers = {module: importlib.import_module(module) for module in HANDLER_MODULES}
+    index_checker = IndexKeyChecker()
+    index_checker.install()
+
+    results = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'iterations': args.iterations,
+        'snapshot': args.snapshot,
+        'search': args.search,
+        'imports': imports,
+        'runs': []
+    }
+    for size in sizes:
+        print(f"Benchmarking {size} products", file=sys.stderr)
+        results['runs'].append(benchmark_size(size, args, handlers))
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    for violation in index_checker.violations:
+        print(f"Rejected write: {violation}", file=sys.stderr)
+    if index_checker.violations:
+        sys.exit(1)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
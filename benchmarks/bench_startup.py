@@ -0,0 +1,266 @@
+"""
+Compares the cold starts of the separate and the routed Lambda deployment.
+
+In the separate deployment (the default) every API route has its own function
+and its own pool of warm containers. In the routed deployment
+(DEPLOYMENT_MODE=routed) Router_Lambda serves every route from one function
+and imports a route's handler module the first time a container serves it.
+
+Measured per route, each in fresh interpreters with the Lambda sources copied
+to an empty directory (Lambda cannot write bytecode caches, so the handler
+modules are compiled on every cold start; boto3 keeps its cached bytecode, as
+in the Lambda runtime):
+
+    - init_ms: importing the function's handler module, i.e. the INIT phase
+    - first_call_ms: the first invocation of the route in a new container
+    - warm_first_call_ms (routed): the first invocation of the route in a
+      container that already served other routes, which pays the lazy import
+
+The traffic model then replays a day of Poisson request arrivals at
+--rates requests per hour per route. A container is assumed to be reclaimed
+after --idle-minutes without a request, and to serve one request at a time.
+It reports the cold starts and the startup time added in each deployment.
+
+Nothing leaves the machine: moto serves every AWS call.
+
+Requires moto (pip install "moto[dynamodb,sns,sqs,sts,s3]").
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 3] [--idle-minutes 10] [--hours 24]
+        [--rates get_all_products=600,get_product=300,...] [--output results.json]
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+from bench_handlers import LAMBDA_DIR
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Route name: (HTTP method, resource path, handler module, event of the first call)
+ROUTES = {
+    'get_all_products': ('GET', '/products/get_all_products', 'Get_All_Products_Lambda', {}),
+    'get_product': ('GET', '/products', 'Get_Product_Lambda', {'product_id': 'missing'}),
+    'search_products': ('GET', '/products/search', 'Search_Products_Lambda', {'q': 'lamp'}),
+    'create_product': ('POST', '/products', 'Post_Product_Lambda',
+                       {'product_name': 'Startup Lamp', 'product_price': '5', 'product_owner': 'seller@example.com'}),
+    'purchase_product': ('POST', '/products/purchase', 'Post_Purchase_Lambda',
+                         {'product_id': 'missing', 'product_name': 'Startup Lamp', 'product_price': '5',
+                          'product_owner': 'seller@example.com', 'user_email': 'buyer@example.com'}),
+    'delete_product': ('DELETE', '/products', 'Delete_Product_Lambda',
+                       {'product_id': 'missing', 'product_owner': 'seller@example.com'}),
+    'subscribe': ('POST', '/subscribe', 'Post_Subscribe_Lambda', {'user_email': 'subscriber@example.com'})
+}
+
+# Requests per hour of each route in the traffic model
+DEFAULT_RATES = ('get_all_products=600,get_product=300,search_products=120,create_product=30,'
+                 'purchase_product=20,delete_product=5,subscribe=2')
+
+parser = argparse.ArgumentParser(description="Compare cold starts of the separate and routed deployments.")
+parser.add_argument('--runs', type=int, default=3, help="fresh interpreters per measurement (the median is reported)")
+parser.add_argument('--rates', default=DEFAULT_RATES, help="requests per hour per route for the traffic model")
+parser.add_argument('--idle-minutes', type=float, default=10, help="idle time after which a container is reclaimed")
+parser.add_argument('--hours', type=float, default=24, help="hours of traffic to model")
+parser.add_argument('--seed', type=int, default=42, help="random seed for the traffic model")
+parser.add_argument('--output', help="write the JSON results to this file instead of stdout")
+parser.add_argument('--measure', help=argparse.SUPPRESS)
+
+def measure(spec):
+    """
+    Runs in a fresh interpreter: imports one handler module and invokes routes.
+
+    Args:
+        spec (dict): 'module' to import, 'calls' as a list of [route name, event]
+            and 'lambda_dir' holding the copied sources.
+
+    Returns:
+        dict: 'init_ms' and the 'calls_ms' of each call, in order.
+    """
+    sys.path.insert(0, spec['lambda_dir'])
+    started = time.perf_counter()
+    module = __import__(spec['module'])
+    init_ms = (time.perf_counter() - started) * 1000
+
+    # moto is imported after the handler module so its boto3 import is not free
+    from moto import mock_aws
+    from bench_handlers import create_table
+    import marketplace_common
+
+    calls_ms = []
+    with mock_aws():
+        marketplace_common.reset()
+        create_table()
+        marketplace_common.get_client('sns').create_topic(Name=marketplace_common.TOPIC_NAME)
+        # A new container has no clients yet
+        marketplace_common.reset()
+        for _, event in spec['calls']:
+            started = time.perf_counter()
+            module.lambda_handler(dict(event), None)
+            calls_ms.append((time.perf_counter() - started) * 1000)
+    return {'init_ms': init_ms, 'calls_ms': calls_ms}
+
+def run_measure(spec, runs):
+    """
+    Runs measure(spec) in runs fresh interpreters.
+
+    Returns:
+        dict: The median 'init_ms' and 'calls_ms'.
+    """
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    results = []
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory() as sources:
+            # A copy without __pycache__, so the handler modules are compiled as in a new container
+            for name in os.listdir(LAMBDA_DIR):
+                if name.endswith('.py'):
+                    shutil.copy(os.path.join(LAMBDA_DIR, name), sources)
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--measure', json.dumps({**spec, 'lambda_dir': sources})],
+                env=env, cwd=BENCHMARK_DIR, capture_output=True, text=True, check=True).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    def median(values):
+        return round(sorted(values)[len(values) // 2], 2)
+    return {
+        'init_ms': median([result['init_ms'] for result in results]),
+        'calls_ms': [median([result['calls_ms'][index] for result in results]) for index in range(len(spec['calls']))]
+    }
+
+def routed_event(name):
+    method, path, _, event = ROUTES[name]
+    return {**event, 'route': {'method': method, 'path': path}}
+
+def measure_routes(runs):
+    """
+    Measures the startup of every route in both deployments.
+    """
+    results = {}
+    for name, (_, _, module, event) in ROUTES.items():
+        print(f"  {name}", file=sys.stderr)
+        separate = run_measure({'module': module, 'calls': [[name, event]]}, runs)
+        routed = run_measure({'module': 'Router_Lambda', 'calls': [[name, routed_event(name)]]}, runs)
+        results[name] = {
+            'separate': {'init_ms': separate['init_ms'], 'first_call_ms': separate['calls_ms'][0]},
+            'routed': {'init_ms': routed['init_ms'], 'first_call_ms': routed['calls_ms'][0]}
+        }
+
+    # One routed container serving every route in turn: each route's first call pays its lazy import
+    names = list(ROUTES)
+    warm = run_measure({'module': 'Router_Lambda', 'calls': [[name, routed_event(name)] for name in names]}, runs)
+    for name, call_ms in zip(names[1:], warm['calls_ms'][1:]):
+        results[name]['routed']['warm_first_call_ms'] = call_ms
+    results[names[0]]['routed']['warm_first_call_ms'] = None
+    return results
+
+def model_traffic(routes, rates, idle_seconds, hours, seed):
+    """
+    Replays Poisson arrivals and counts cold starts in both deployments.
+
+    Args:
+        routes (dict): The results of measure_routes.
+        rates (dict): Requests per hour per route.
+        idle_seconds (float): Idle time after which a container is reclaimed.
+        hours (float): The modeled duration.
+        seed (int): The random seed.
+
+    Returns:
+        dict: Requests, cold starts and added startup seconds per deployment.
+    """
+    rng = random.Random(seed)
+    arrivals = []
+    for name, rate in rates.items():
+        now = 0.0
+        while rate > 0:
+            now += rng.expovariate(rate / 3600)
+            if now > hours * 3600:
+                break
+            arrivals.append((now, name))
+    arrivals.sort()
+
+    separate = {'cold_starts': 0, 'startup_seconds': 0.0}
+    routed = {'cold_starts': 0, 'lazy_imports': 0, 'startup_seconds': 0.0}
+    last_request = {}
+    router_last = None
+    router_imported = set()
+    for now, name in arrivals:
+        costs = routes[name]
+        if name not in last_request or now - last_request[name] > idle_seconds:
+            separate['cold_starts'] += 1
+            separate['startup_seconds'] += (costs['separate']['init_ms'] + costs['separate']['first_call_ms']) / 1000
+        last_request[name] = now
+
+        if router_last is None or now - router_last > idle_seconds:
+            routed['cold_starts'] += 1
+            routed['startup_seconds'] += (costs['routed']['init_ms'] + costs['routed']['first_call_ms']) / 1000
+            router_imported = {name}
+        elif name not in router_imported:
+            routed['lazy_imports'] += 1
+            routed['startup_seconds'] += (costs['routed']['warm_first_call_ms'] or costs['routed']['first_call_ms']) / 1000
+            router_imported.add(name)
+        router_last = now
+
+    for result in (separate, routed):
+        result['startup_seconds'] = round(result['startup_seconds'], 2)
+    return {'requests': len(arrivals), 'separate': separate, 'routed': routed}
+
+def main():
+    args = parser.parse_args()
+
+    # Credentials and settings must be in place before the shared modules are imported
+    os.environ.update({
+        'AWS_ACCESS_KEY_ID': 'testing',
+        'AWS_SECRET_ACCESS_KEY': 'testing',
+        'AWS_DEFAULT_REGION': 'us-east-1'
+    })
+    for name in ('AWS_PROFILE', 'AWS_SESSION_TOKEN', 'AWS_ENDPOINT_URL', 'MARKETPLACE_TOPIC_ARN',
+                 'MARKETPLACE_CATALOG_BUCKET', 'MARKETPLACE_ORDER_QUEUE_URL',
+                 'MARKETPLACE_READ_CAPACITY', 'MARKETPLACE_WRITE_CAPACITY'):
+        os.environ.pop(name, None)
+
+    if args.measure:
+        print(json.dumps(measure(json.loads(args.measure))))
+        return
+
+    try:
+        import moto  # noqa: F401
+    except ImportError:
+        print('Error: moto is not installed. Run: pip install "moto[dynamodb,sns,sqs,sts,s3]"')
+        sys.exit(1)
+
+    rates = {}
+    for entry in args.rates.split(','):
+        name, _, rate = entry.partition('=')
+        if name.strip() not in ROUTES:
+            print(f"Error: unknown route '{name.strip()}'. Routes: {', '.join(ROUTES)}")
+            sys.exit(1)
+        rates[name.strip()] = float(rate)
+
+    print("Measuring route startup", file=sys.stderr)
+    routes = measure_routes(args.runs)
+    results = {
+        'python': sys.version.split()[0],
+        'runs': args.runs,
+        'routes': routes,
+        'traffic_model': {
+            'rates_per_hour': rates,
+            'idle_minutes': args.idle_minutes,
+            'hours': args.hours,
+            **model_traffic(routes, rates, args.idle_minutes * 60, args.hours, args.seed)
+        }
+    }
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+if __name__ == '__main__':
+    main()
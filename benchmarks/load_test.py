@@ -0,0 +1,292 @@
+"""
+Load test of the MarketPlace handlers against a provisioned or on-demand table.
+
+moto does not enforce throughput, so ProvisionedTable puts the admission
+control of a provisioned DynamoDB table in front of it: a read and a write
+token bucket refilled at --capacity units per second, and a
+ProvisionedThroughputExceededException for every call made while a bucket is
+empty. Concurrent workers then drive a mix of product reads, seller listings
+and product creates for --duration seconds under each mode:
+
+    provisioned   --capacity RCU / WCU table, handlers only back off on throttles
+    paced         the same table, handlers also pace themselves to it
+                  (marketplace_capacity with MARKETPLACE_READ/WRITE_CAPACITY)
+    on_demand     PAY_PER_REQUEST table: no throughput limit and no pacing
+
+Reported per mode: sustained throughput of successful requests, status codes,
+p50/p95/p99 latency, throttles and retries seen by the handlers, time spent
+pacing, and the capacity the table served. The workers share one process, as
+if the table capacity were divided evenly between the Lambda containers.
+
+Requires moto (pip install "moto[dynamodb,sns,sqs,sts,s3]").
+
+Usage:
+    python benchmarks/load_test.py [--modes provisioned,paced,on_demand] [--duration 20]
+        [--concurrency 8] [--capacity 5] [--products 500] [--output results.json]
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import importlib
+import threading
+import contextlib
+import zlib
+
+from bench_handlers import LAMBDA_DIR, OWNERS, create_table, percentile, seed_catalog
+
+MODES = ('provisioned', 'paced', 'on_demand')
+
+# Share of each request type in the workload
+WORKLOAD = (
+    ('get_product', 0.5),
+    ('get_all_products.by_owner', 0.2),
+    ('post_product', 0.3)
+)
+
+READ_OPERATIONS = ('GetItem', 'BatchGetItem', 'TransactGetItems', 'Query', 'Scan')
+WRITE_OPERATIONS = ('PutItem', 'UpdateItem', 'DeleteItem', 'BatchWriteItem', 'TransactWriteItems')
+
+parser = argparse.ArgumentParser(description="Load test the MarketPlace handlers under each table capacity mode.")
+parser.add_argument('--modes', default=','.join(MODES), help="comma-separated modes to run")
+parser.add_argument('--duration', type=float, default=20, help="seconds of load per mode")
+parser.add_argument('--concurrency', type=int, default=8, help="concurrent workers")
+parser.add_argument('--capacity', type=float, default=5, help="read and write capacity units of the provisioned table")
+parser.add_argument('--burst', type=float, default=2,
+                    help="seconds of unused capacity the simulated table saves up (DynamoDB keeps up to 300)")
+parser.add_argument('--products', type=int, default=500, help="products seeded before each run")
+parser.add_argument('--seed', type=int, default=42, help="random seed for the catalog and the workload")
+parser.add_argument('--output', help="write the JSON results to this file instead of stdout")
+
+class ProvisionedTable:
+    """
+    Throttles the DynamoDB calls moto serves to a provisioned table's throughput.
+
+    Wraps moto's request processing, since every 'before-send' handler is
+    called even after one of them answered.
+    """
+    def __init__(self, capacity, burst_seconds):
+        import marketplace_capacity
+        self.read = marketplace_capacity.TokenBucket(capacity, burst_seconds)
+        self.write = marketplace_capacity.TokenBucket(capacity, burst_seconds)
+        self.lock = threading.Lock()
+        self.units = 0.0
+        self.original = None
+
+    def install(self):
+        from moto.core.models import botocore_stubber
+        self.original = botocore_stubber.process_request
+        botocore_stubber.process_request = self.process_request
+
+    def uninstall(self):
+        from moto.core.models import botocore_stubber
+        botocore_stubber.process_request = self.original
+
+    def process_request(self, request):
+        target = request.headers.get('X-Amz-Target') or ''
+        operation = target.split('.', 1)[1] if target.startswith('DynamoDB_') else None
+        bucket = self.read if operation in READ_OPERATIONS else self.write if operation in WRITE_OPERATIONS else None
+        if bucket is None:
+            return self.original(request)
+
+        if bucket.available() <= 0:
+            body = json.dumps({
+                '__type': 'com.amazonaws.dynamodb.v20120810#ProvisionedThroughputExceededException',
+                'message': 'The level of configured provisioned throughput for the table was exceeded.'
+            })
+            return 400, {'Content-Type': 'application/x-amz-json-1.0'}, body
+
+        response = self.original(request)
+        if response is None or response[0] != 200:
+            return response
+        status, headers, body = response
+        params = json.loads(request.data or b'{}')
+        result = json.loads(body or '{}')
+        units = self.consumed_units(operation, params, result)
+        bucket.settle(-units)
+        with self.lock:
+            self.units += units
+        if params.get('ReturnConsumedCapacity', 'NONE') == 'NONE':
+            return response
+
+        # Report what the table charged, as DynamoDB does (moto always reports 1 unit)
+        consumed = {'TableName': params.get('TableName'), 'CapacityUnits': units, 'Table': {'CapacityUnits': units}}
+        result['ConsumedCapacity'] = [consumed] if operation.startswith(('Batch', 'Transact')) else consumed
+        body = json.dumps(result)
+        headers = {name: value for name, value in headers.items() if name.lower() != 'x-amz-crc32'}
+        headers['x-amz-crc32'] = str(zlib.crc32(body.encode('utf-8')))
+        return status, headers, body
+
+    @staticmethod
+    def consumed_units(operation, params, result):
+        """
+        Returns the capacity units a call consumed, for items under 1 KB.
+        """
+        read_units = 1.0 if params.get('ConsistentRead') else 0.5
+        if operation in ('PutItem', 'UpdateItem', 'DeleteItem'):
+            return 1.0
+        if operation == 'BatchWriteItem':
+            written = sum(len(requests) for requests in params.get('RequestItems', {}).values())
+            return float(written - sum(len(requests) for requests in result.get('UnprocessedItems', {}).values()))
+        if operation in ('TransactWriteItems', 'TransactGetItems'):
+            return 2.0 * len(params.get('TransactItems', []))
+        if operation == 'BatchGetItem':
+            return 0.5 * sum(len(items) for items in result.get('Responses', {}).values())
+        if operation in ('Query', 'Scan'):
+            return read_units * max(1, result.get('ScannedCount', 0))
+        return read_units
+
+def build_workload(products, rng, handlers):
+    """
+    Returns a function that picks the next request as (name, handler, event).
+    """
+    names = [name for name, _ in WORKLOAD]
+    weights = [weight for _, weight in WORKLOAD]
+    counter = iter(range(10 ** 9))
+    lock = threading.Lock()
+
+    def next_request():
+        with lock:
+            name = rng.choices(names, weights)[0]
+            if name == 'get_product':
+                return name, handlers['Get_Product_Lambda'].lambda_handler, {
+                    'product_id': rng.choice(products)['PK'].split('#', 1)[1]}
+            if name == 'get_all_products.by_owner':
+                return name, handlers['Get_All_Products_Lambda'].lambda_handler, {'owner': rng.choice(OWNERS)}
+            return name, handlers['Post_Product_Lambda'].lambda_handler, {
+                'product_name': f'Load test {next(counter)}', 'product_price': '19.99', 'product_owner': rng.choice(OWNERS)}
+    return next_request
+
+def run_mode(mode, args, handlers):
+    """
+    Seeds a fresh in-process AWS backend and drives the workload under one mode.
+    """
+    from moto import mock_aws
+    import marketplace_common
+    import marketplace_capacity
+
+    rng = random.Random(args.seed)
+    with mock_aws():
+        marketplace_common.reset()
+        marketplace_capacity.configure(0, 0)
+        handlers['Get_All_Products_Lambda']._listing_cache.clear()
+        create_table()
+        marketplace_common.get_client('sns').create_topic(Name=marketplace_common.TOPIC_NAME)
+        products = seed_catalog(args.products, rng, search=False)
+
+        table = None
+        if mode != 'on_demand':
+            table = ProvisionedTable(args.capacity, args.burst)
+            table.install()
+        if mode == 'paced':
+            marketplace_capacity.configure(args.capacity, args.capacity, burst_seconds=args.burst)
+
+        next_request = build_workload(products, rng, handlers)
+        results = []
+        results_lock = threading.Lock()
+        counters = marketplace_capacity.get_counters()
+        deadline = time.perf_counter() + args.duration
+
+        def worker():
+            while time.perf_counter() < deadline:
+                name, handler, event = next_request()
+                started = time.perf_counter()
+                response = handler(event, None)
+                latency = (time.perf_counter() - started) * 1000
+                with results_lock:
+                    results.append((name, response['statusCode'], latency))
+
+        started = time.perf_counter()
+        try:
+            # redirect_stdout is process-wide, so the workers share one sink for the handlers' logging
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                threads = [threading.Thread(target=worker) for _ in range(args.concurrency)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+        finally:
+            if table is not None:
+                table.uninstall()
+            marketplace_capacity.configure(0, 0)
+        elapsed = time.perf_counter() - started
+
+    capacity = {name: value - counters[name] for name, value in marketplace_capacity.get_counters().items()}
+    latencies = [latency for _, _, latency in results]
+    status_codes = {}
+    requests = {}
+    for name, status_code, _ in results:
+        status_codes[str(status_code)] = status_codes.get(str(status_code), 0) + 1
+        requests.setdefault(name, {})
+        requests[name][str(status_code)] = requests[name].get(str(status_code), 0) + 1
+    succeeded = sum(count for code, count in status_codes.items() if code.startswith('2'))
+    return {
+        'requests': len(results),
+        'seconds': round(elapsed, 2),
+        'throughput_per_s': round(succeeded / elapsed, 2),
+        'success_rate': round(succeeded / len(results), 3) if results else None,
+        'p50_ms': round(percentile(latencies, 0.50), 3) if latencies else None,
+        'p95_ms': round(percentile(latencies, 0.95), 3) if latencies else None,
+        'p99_ms': round(percentile(latencies, 0.99), 3) if latencies else None,
+        'status_codes': status_codes,
+        'by_request': requests,
+        'throttles': capacity['throttles'],
+        'retries': capacity['retries'],
+        'throttled_calls_failed': capacity['exhausted'],
+        'paced_calls': capacity['paced_calls'],
+        'paced_seconds': round(capacity['paced_ms'] / 1000, 2),
+        'table_units_per_s': round(table.units / elapsed, 2) if table else None
+    }
+
+def main():
+    args = parser.parse_args()
+    modes = [mode.strip() for mode in args.modes.split(',') if mode.strip()]
+    unknown = set(modes) - set(MODES)
+    if unknown:
+        print(f"Error: unknown modes {', '.join(sorted(unknown))}. Modes: {', '.join(MODES)}")
+        sys.exit(1)
+
+    # Credentials and settings must be in place before the shared modules are imported
+    os.environ.update({
+        'AWS_ACCESS_KEY_ID': 'testing',
+        'AWS_SECRET_ACCESS_KEY': 'testing',
+        'AWS_DEFAULT_REGION': 'us-east-1'
+    })
+    for name in ('AWS_PROFILE', 'AWS_SESSION_TOKEN', 'AWS_ENDPOINT_URL', 'MARKETPLACE_TOPIC_ARN',
+                 'MARKETPLACE_CATALOG_BUCKET', 'MARKETPLACE_ORDER_QUEUE_URL',
+                 'MARKETPLACE_READ_CAPACITY', 'MARKETPLACE_WRITE_CAPACITY'):
+        os.environ.pop(name, None)
+
+    try:
+        import moto  # noqa: F401
+    except ImportError:
+        print('Error: moto is not installed. Run: pip install "moto[dynamodb,sns,sqs,sts,s3]"')
+        sys.exit(1)
+
+    sys.path.insert(0, LAMBDA_DIR)
+    handlers = {module: importlib.import_module(module)
+                for module in ('Get_Product_Lambda', 'Get_All_Products_Lambda', 'Post_Product_Lambda')}
+
+    results = {
+        'duration': args.duration,
+        'concurrency': args.concurrency,
+        'capacity': args.capacity,
+        'burst_seconds': args.burst,
+        'products': args.products,
+        'modes': {}
+    }
+    for mode in modes:
+        print(f"Load testing the {mode} table", file=sys.stderr)
+        results['modes'][mode] = run_mode(mode, args, handlers)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+if __name__ == '__main__':
+    main()
@@ -11,10 +11,36 @@ LAMBDA_GET_ALL_PRODUCTS="getAllProducts"
 LAMBDA_DELETE_PRODUCT="deleteProduct"
 LAMBDA_PURCHASE_PRODUCT="purchaseProduct"
 LAMBDA_SUBSCRIBE="subscribe"
+LAMBDA_SEARCH_PRODUCTS="searchProducts"
+
+# With DEPLOYMENT_MODE=routed every route invokes the single marketPlaceRouter
+# function (see deploy_lambda_scripts.sh), which dispatches on the method and
+# path the request templates add to the event
+DEPLOYMENT_MODE="${DEPLOYMENT_MODE:-separate}"
+if [ "$DEPLOYMENT_MODE" == "routed" ]; then
+    LAMBDA_ROUTER="marketPlaceRouter"
+    LAMBDA_CREATE_PRODUCT=$LAMBDA_ROUTER
+    LAMBDA_GET_PRODUCT=$LAMBDA_ROUTER
+    LAMBDA_GET_ALL_PRODUCTS=$LAMBDA_ROUTER
+    LAMBDA_DELETE_PRODUCT=$LAMBDA_ROUTER
+    LAMBDA_PURCHASE_PRODUCT=$LAMBDA_ROUTER
+    LAMBDA_SUBSCRIBE=$LAMBDA_ROUTER
+    LAMBDA_SEARCH_PRODUCTS=$LAMBDA_ROUTER
+elif [ "$DEPLOYMENT_MODE" != "separate" ]; then
+    echo "Error: DEPLOYMENT_MODE must be separate or routed."
+    exit 1
+fi
 
 # Set the region
 REGION="us-east-1"
 
+# Request template that maps query string parameters and the headers the handlers read (Accept-Encoding,
+# If-None-Match, Idempotency-Key) onto the Lambda event. Other headers, e.g. Authorization, are left out
+GET_REQUEST_TEMPLATE="api_templates/get_request_template.json"
+# Request template that passes the JSON body through and adds the same headers
+# Both templates also add the route (HTTP method and resource path) for the routed deployment
+POST_REQUEST_TEMPLATE="api_templates/post_request_template.json"
+
 # Get the AWS account ID
 ACCOUNT_ID=$(aws sts get-caller-identity --query "Account" --output text)
 
@@ -130,6 +156,7 @@ aws apigateway put-integration \
   --integration-http-method POST \
   --type AWS \
   --uri arn:aws:apigateway:$REGION:lambda:path/2015-03-31/functions/arn:aws:lambda:$REGION:$ACCOUNT_ID:function:$LAMBDA_CREATE_PRODUCT/invocations \
+  --request-templates file://$POST_REQUEST_TEMPLATE \
   --credentials $LAB_ROLE_ARN  # Specify the lab role ARN
 
 # Add Integration Response for 200 status code
@@ -169,6 +196,7 @@ aws apigateway put-method-response \
   --status-code 200
 
 # Integrate GET method with getProduct Lambda function (Non-Proxy) and set execution role
+# The request template passes query string parameters (product_id, product_name) through as event fields
 aws apigateway put-integration \
   --rest-api-id $API_ID \
   --region $REGION \
@@ -177,6 +205,7 @@ aws apigateway put-integration \
   --integration-http-method GET \
   --type AWS \
   --uri arn:aws:apigateway:$REGION:lambda:path/2015-03-31/functions/arn:aws:lambda:$REGION:$ACCOUNT_ID:function:$LAMBDA_GET_PRODUCT/invocations \
+  --request-templates file://$GET_REQUEST_TEMPLATE \
   --credentials $LAB_ROLE_ARN  # Specify the lab role ARN
 
 # Add Integration Response for 200 status code
@@ -261,6 +290,7 @@ aws apigateway put-method-response \
   --status-code 200
 
 # Integrate GET method with getAllProducts Lambda function (Non-Proxy) and set execution role
+# The request template passes query string parameters (limit, next_token, fields, min_price, max_price, sort, owner) through as event fields
 aws apigateway put-integration \
   --rest-api-id $API_ID \
   --region $REGION \
@@ -269,6 +299,7 @@ aws apigateway put-integration \
   --integration-http-method GET \
   --type AWS \
   --uri arn:aws:apigateway:$REGION:lambda:path/2015-03-31/functions/arn:aws:lambda:$REGION:$ACCOUNT_ID:function:$LAMBDA_GET_ALL_PRODUCTS/invocations \
+  --request-templates file://$GET_REQUEST_TEMPLATE \
   --credentials $LAB_ROLE_ARN  # Specify the lab role ARN
 
 # Add Integration Response for 200 status code
@@ -289,6 +320,100 @@ aws lambda add-permission \
   --action "lambda:InvokeFunction" \
   --source-arn arn:aws:execute-api:$REGION:$ACCOUNT_ID:$API_ID/*/GET/products/get_all_products
 
+# Create '/products/search' resource for searchProducts
+echo "Creating '/products/search' resource"
+SEARCH_PRODUCTS_RESOURCE_ID=$(aws apigateway create-resource \
+  --rest-api-id $API_ID \
+  --region $REGION \
+  --parent-id $PRODUCTS_RESOURCE_ID \
+  --path-part "search" \
+  --query "id" --output text)
+
+# Create OPTIONS method for CORS preflight
+echo "Creating OPTIONS method for '/products/search' resource"
+aws apigateway put-method \
+  --rest-api-id $API_ID \
+  --region $REGION \
+  --resource-id $SEARCH_PRODUCTS_RESOURCE_ID \
+  --http-method OPTIONS \
+  --authorization-type COGNITO_USER_POOLS \
+  --authorizer-id $AUTHORIZER_ID
+
+# Integrate OPTIONS method with mock integration
+aws apigateway put-integration \
+  --rest-api-id $API_ID \
+  --region $REGION \
+  --resource-id $SEARCH_PRODUCTS_RESOURCE_ID \
+  --http-method OPTIONS \
+  --type MOCK \
+  --request-templates "{\"application/json\": \"{\\\"statusCode\\\": 200}\"}"
+
+# Add Method Response for 200 status code
+aws apigateway put-method-response \
+  --rest-api-id $API_ID \
+  --region $REGION \
+  --resource-id $SEARCH_PRODUCTS_RESOURCE_ID \
+  --http-method OPTIONS \
+  --status-code 200
+
+# Add Integration Response for 200 status code
+aws apigateway put-integration-response \
+  --rest-api-id $API_ID \
+  --region $REGION \
+  --resource-id $SEARCH_PRODUCTS_RESOURCE_ID \
+  --http-method OPTIONS \
+  --status-code 200 \
+  --response-parameters "{\"method.response.header.Access-Control-Allow-Headers\": \"'*'\",\"method.response.header.Access-Control-Allow-Methods\": \"'*'\",\"method.response.header.Access-Control-Allow-Origin\": \"'*'\"}"
+
+# Create GET method for '/products/search' to search products (searchProducts Lambda)
+echo "Creating GET method for '/products/search' to search products (searchProducts Lambda)"
+aws apigateway put-method \
+  --rest-api-id $API_ID \
+  --region $REGION \
+  --resource-id $SEARCH_PRODUCTS_RESOURCE_ID \
+  --http-method GET \
+  --authorization-type COGNITO_USER_POOLS \
+  --authorizer-id $AUTHORIZER_ID
+
+# Add Method Response for 200 status code
+aws apigateway put-method-response \
+  --rest-api-id $API_ID \
+  --region $REGION \
+  --resource-id $SEARCH_PRODUCTS_RESOURCE_ID \
+  --http-method GET \
+  --status-code 200
+
+# Integrate GET method with searchProducts Lambda function (Non-Proxy) and set execution role
+# The request template passes query string parameters (q, limit, next_token, fields) through as event fields
+aws apigateway put-integration \
+  --rest-api-id $API_ID \
+  --region $REGION \
+  --resource-id $SEARCH_PRODUCTS_RESOURCE_ID \
+  --http-method GET \
+  --integration-http-method GET \
+  --type AWS \
+  --uri arn:aws:apigateway:$REGION:lambda:path/2015-03-31/functions/arn:aws:lambda:$REGION:$ACCOUNT_ID:function:$LAMBDA_SEARCH_PRODUCTS/invocations \
+  --request-templates file://$GET_REQUEST_TEMPLATE \
+  --credentials $LAB_ROLE_ARN  # Specify the lab role ARN
+
+# Add Integration Response for 200 status code
+aws apigateway put-integration-response \
+  --rest-api-id $API_ID \
+  --region $REGION \
+  --resource-id $SEARCH_PRODUCTS_RESOURCE_ID \
+  --http-method GET \
+  --status-code 200 \
+  --selection-pattern ""
+
+# Add resource-based permission for API Gateway to invoke the searchProducts Lambda function
+echo "Adding permission for API Gateway to invoke searchProducts Lambda"
+aws lambda add-permission \
+  --function-name $LAMBDA_SEARCH_PRODUCTS \
+  --principal apigateway.amazonaws.com \
+  --statement-id "api-gateway-access-searchProducts" \
+  --action "lambda:InvokeFunction" \
+  --source-arn arn:aws:execute-api:$REGION:$ACCOUNT_ID:$API_ID/*/GET/products/search
+
 # Create DELETE method for '/products' to delete a product (deleteProduct Lambda)
 echo "Creating DELETE method for '/products' to delete a product (deleteProduct Lambda)"
 aws apigateway put-method \
@@ -316,6 +441,7 @@ aws apigateway put-integration \
   --integration-http-method DELETE \
   --type AWS \
   --uri arn:aws:apigateway:$REGION:lambda:path/2015-03-31/functions/arn:aws:lambda:$REGION:$ACCOUNT_ID:function:$LAMBDA_DELETE_PRODUCT/invocations \
+  --request-templates file://$POST_REQUEST_TEMPLATE \
   --credentials $LAB_ROLE_ARN  # Specify the lab role ARN
 
 # Add Integration Response for 200 status code
@@ -408,6 +534,7 @@ aws apigateway put-integration \
   --integration-http-method POST \
   --type AWS \
   --uri arn:aws:apigateway:$REGION:lambda:path/2015-03-31/functions/arn:aws:lambda:$REGION:$ACCOUNT_ID:function:$LAMBDA_PURCHASE_PRODUCT/invocations \
+  --request-templates file://$POST_REQUEST_TEMPLATE \
   --credentials $LAB_ROLE_ARN  # Specify the lab role ARN
 
 # Add Integration Response for 200 status code
@@ -500,6 +627,7 @@ aws apigateway put-integration \
   --integration-http-method POST \
   --type AWS \
   --uri arn:aws:apigateway:$REGION:lambda:path/2015-03-31/functions/arn:aws:lambda:$REGION:$ACCOUNT_ID:function:$LAMBDA_SUBSCRIBE/invocations \
+  --request-templates file://$POST_REQUEST_TEMPLATE \
   --credentials $LAB_ROLE_ARN  # Specify the lab role ARN
 
 # Add Integration Response for 200 status code
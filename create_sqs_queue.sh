@@ -0,0 +1,53 @@
+#!/bin/bash
+
+# Set the queue names: order events go to the order queue, and events that keep
+# failing are moved to the dead-letter queue after MAX_RECEIVE_COUNT attempts
+QUEUE_NAME="MarketPlaceOrderQueue"
+DEAD_LETTER_QUEUE_NAME="MarketPlaceOrderQueueDLQ"
+MAX_RECEIVE_COUNT=5
+
+# Must be at least 6 times the timeout of the processOrders Lambda function
+VISIBILITY_TIMEOUT=180
+
+# Set the region
+REGION="us-east-1"
+
+# Create the dead-letter queue
+echo "Creating SQS queue: $DEAD_LETTER_QUEUE_NAME"
+DEAD_LETTER_QUEUE_URL=$(aws sqs create-queue \
+  --queue-name $DEAD_LETTER_QUEUE_NAME \
+  --attributes MessageRetentionPeriod=1209600 \
+  --region $REGION \
+  --query "QueueUrl" \
+  --output text)
+
+if [ $? -ne 0 ]; then
+  echo "Failed to create SQS queue '$DEAD_LETTER_QUEUE_NAME'"
+  exit 1
+fi
+
+DEAD_LETTER_QUEUE_ARN=$(aws sqs get-queue-attributes \
+  --queue-url $DEAD_LETTER_QUEUE_URL \
+  --attribute-names QueueArn \
+  --region $REGION \
+  --query "Attributes.QueueArn" \
+  --output text)
+
+# Create the order queue
+echo "Creating SQS queue: $QUEUE_NAME"
+REDRIVE_POLICY="{\\\"deadLetterTargetArn\\\":\\\"$DEAD_LETTER_QUEUE_ARN\\\",\\\"maxReceiveCount\\\":\\\"$MAX_RECEIVE_COUNT\\\"}"
+QUEUE_URL=$(aws sqs create-queue \
+  --queue-name $QUEUE_NAME \
+  --attributes "{\"VisibilityTimeout\":\"$VISIBILITY_TIMEOUT\",\"RedrivePolicy\":\"$REDRIVE_POLICY\"}" \
+  --region $REGION \
+  --query "QueueUrl" \
+  --output text)
+
+if [ $? -eq 0 ]; then
+  echo "SQS queue '$QUEUE_NAME' created successfully with URL: $QUEUE_URL"
+else
+  echo "Failed to create SQS queue '$QUEUE_NAME'"
+  exit 1
+fi
+
+echo "SQS queue setup completed successfully!"
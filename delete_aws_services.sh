@@ -8,6 +8,7 @@ chmod +x delete_scripts/delete_lambda_functions.sh
 chmod +x delete_scripts/delete_cognito_user_pool.sh
 chmod +x delete_scripts/delete_api_gateway.sh
 chmod +x delete_scripts/delete_sns_topic.sh
+chmod +x delete_scripts/delete_sqs_queue.sh
 # Launch delete scripts
 # ./delete_scripts/delete_dynamodb_table.sh
 # ./delete_scripts/delete_objects_s3_bucket.sh
@@ -15,6 +16,7 @@ chmod +x delete_scripts/delete_sns_topic.sh
 ./delete_scripts/delete_cognito_user_pool.sh
 ./delete_scripts/delete_api_gateway.sh
 ./delete_scripts/delete_sns_topic.sh
+./delete_scripts/delete_sqs_queue.sh
 
 echo "AWS Services successfully deleted!"
 # echo "AWS Services successfully deleted!"
\ No newline at end of file
@@ -1,7 +1,7 @@
 #!/bin/bash
 
 # Define the Lambda function names
-LAMBDA_FUNCTIONS=("getAllProducts" "getProduct" "createProduct" "deleteProduct" "purchaseProduct" "subscribe")
+LAMBDA_FUNCTIONS=("getAllProducts" "getProduct" "createProduct" "deleteProduct" "purchaseProduct" "subscribe" "searchProducts" "processOrders" "marketPlaceRouter")
 
 # Set the AWS region
 REGION="us-east-1"
@@ -11,6 +11,11 @@ delete_lambda_functions() {
     for FUNCTION_NAME in "${LAMBDA_FUNCTIONS[@]}"; do
         # Check if the Lambda function exists
         if aws lambda get-function --function-name $FUNCTION_NAME --region $REGION >/dev/null 2>&1; then
+            # Remove the function's event source mappings (e.g. the order queue trigger)
+            for UUID in $(aws lambda list-event-source-mappings --function-name $FUNCTION_NAME --region $REGION --query "EventSourceMappings[].UUID" --output text); do
+                aws lambda delete-event-source-mapping --uuid $UUID --region $REGION >/dev/null
+            done
+
             echo "Deleting Lambda function: $FUNCTION_NAME..."
             
             # Delete the Lambda function
@@ -0,0 +1,37 @@
+#!/bin/bash
+
+# Set the queue names
+QUEUE_NAMES=("MarketPlaceOrderQueue" "MarketPlaceOrderQueueDLQ")
+
+# Set the region
+REGION="us-east-1"
+
+for QUEUE_NAME in "${QUEUE_NAMES[@]}"; do
+  # Get the URL of the SQS queue
+  echo "Retrieving URL for SQS queue: $QUEUE_NAME"
+  QUEUE_URL=$(aws sqs get-queue-url \
+    --queue-name $QUEUE_NAME \
+    --region $REGION \
+    --query "QueueUrl" \
+    --output text 2>/dev/null)
+
+  if [ -z "$QUEUE_URL" ] || [ "$QUEUE_URL" == "None" ]; then
+    echo "SQS queue '$QUEUE_NAME' not found in region $REGION."
+    continue
+  fi
+
+  # Delete the SQS queue
+  echo "Deleting SQS queue: $QUEUE_NAME with URL: $QUEUE_URL"
+  aws sqs delete-queue \
+    --queue-url $QUEUE_URL \
+    --region $REGION
+
+  if [ $? -eq 0 ]; then
+    echo "SQS queue '$QUEUE_NAME' deleted successfully."
+  else
+    echo "Failed to delete SQS queue '$QUEUE_NAME'."
+    exit 1
+  fi
+done
+
+echo "SQS queue deletion completed!"
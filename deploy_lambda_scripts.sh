@@ -3,21 +3,50 @@
 # Disable AWS CLI pager
 export AWS_PAGER=""
 
+# 'separate' creates one function per API route, 'routed' creates a single
+# marketPlaceRouter function that serves every route, so they share warm
+# containers. Run e.g. DEPLOYMENT_MODE=routed ./deploy_lambda_scripts.sh, and
+# deploy the API with the same DEPLOYMENT_MODE
+DEPLOYMENT_MODE="${DEPLOYMENT_MODE:-separate}"
+if [ "$DEPLOYMENT_MODE" != "separate" ] && [ "$DEPLOYMENT_MODE" != "routed" ]; then
+    echo "Error: DEPLOYMENT_MODE must be separate or routed."
+    exit 1
+fi
+
+# S3 bucket of the catalog snapshot, passed to the function that serves the
+# product list (empty serves it from DynamoDB). Run e.g.
+# CATALOG_BUCKET=<bucket-name> ./deploy_lambda_scripts.sh
+export CATALOG_BUCKET="${CATALOG_BUCKET:-}"
+
 # Enable permissions
+chmod +x lambda/build_lambda_zips.sh
 chmod +x lambda/create_get_all_product_lambda.sh
 chmod +x lambda/create_get_product_lambda.sh
 chmod +x lambda/create_post_product_lambda.sh
 chmod +x lambda/create_post_purchase_lambda.sh
 chmod +x lambda/create_post_subscribe_lambda.sh
 chmod +x lambda/create_delete_product_lambda.sh
+chmod +x lambda/create_search_products_lambda.sh
+chmod +x lambda/create_process_orders_lambda.sh
+chmod +x lambda/create_router_lambda.sh
+
+# Package the Lambda handlers with the shared modules
+./lambda/build_lambda_zips.sh || exit 1
 
 # Launch create scripts
-./lambda/create_get_all_product_lambda.sh
-./lambda/create_get_product_lambda.sh
-./lambda/create_post_product_lambda.sh
-./lambda/create_post_purchase_lambda.sh
-./lambda/create_post_subscribe_lambda.sh
-./lambda/create_delete_product_lambda.sh
+if [ "$DEPLOYMENT_MODE" == "routed" ]; then
+    ./lambda/create_router_lambda.sh
+else
+    ./lambda/create_get_all_product_lambda.sh
+    ./lambda/create_get_product_lambda.sh
+    ./lambda/create_post_product_lambda.sh
+    ./lambda/create_post_purchase_lambda.sh
+    ./lambda/create_post_subscribe_lambda.sh
+    ./lambda/create_delete_product_lambda.sh
+    ./lambda/create_search_products_lambda.sh
+fi
+# The order queue consumer is not an API route, so it keeps its own function in both modes
+./lambda/create_process_orders_lambda.sh
 
 echo "Lambda Functions successfully created!" 
 #echo "Lambda Functions successfully created!"
\ No newline at end of file
@@ -4,14 +4,36 @@
 TABLE_NAME="MarketPlaceDatabase"
 REGION="us-east-1"
 
+# PROVISIONED keeps the table at READ_CAPACITY/WRITE_CAPACITY units per second
+# (the Lambda functions pace themselves to it), PAY_PER_REQUEST switches it to
+# on-demand capacity. Run e.g. BILLING_MODE=PAY_PER_REQUEST ./create_dynamodb_table.sh
+BILLING_MODE="${BILLING_MODE:-PROVISIONED}"
+READ_CAPACITY="${READ_CAPACITY:-5}"
+WRITE_CAPACITY="${WRITE_CAPACITY:-5}"
+
+if [ "$BILLING_MODE" != "PROVISIONED" ] && [ "$BILLING_MODE" != "PAY_PER_REQUEST" ]; then
+    echo "Error: BILLING_MODE must be PROVISIONED or PAY_PER_REQUEST."
+    exit 1
+fi
+
+# Capacity arguments of the table and of each index
+if [ "$BILLING_MODE" == "PROVISIONED" ]; then
+    TABLE_CAPACITY="--provisioned-throughput ReadCapacityUnits=$READ_CAPACITY,WriteCapacityUnits=$WRITE_CAPACITY"
+    INDEX_CAPACITY=", \"ProvisionedThroughput\": {\"ReadCapacityUnits\": $READ_CAPACITY, \"WriteCapacityUnits\": $WRITE_CAPACITY}"
+else
+    TABLE_CAPACITY="--billing-mode PAY_PER_REQUEST"
+    INDEX_CAPACITY=""
+fi
+
 # Create the DynamoDB table
 create_table() {
     # Check if the table already exists
     if aws dynamodb describe-table --table-name $TABLE_NAME --region $REGION >/dev/null 2>&1; then
         echo "Table '$TABLE_NAME' already exists."
+        set_billing_mode
     else
         echo "Creating DynamoDB table '$TABLE_NAME'..."
-        
+
         # Create table using AWS CLI
         aws dynamodb create-table \
             --table-name $TABLE_NAME \
@@ -21,13 +43,163 @@ create_table() {
             --key-schema \
                 AttributeName=PK,KeyType=HASH \
                 AttributeName=SK,KeyType=RANGE \
-            --provisioned-throughput \
-                ReadCapacityUnits=5,WriteCapacityUnits=5 \
+            $TABLE_CAPACITY \
             --region $REGION
-        
+
+        # Wait for the table to be active before adding indexes
+        aws dynamodb wait table-exists --table-name $TABLE_NAME --region $REGION
+
         echo "Table '$TABLE_NAME' created successfully!"
     fi
 }
 
+# Switch an existing table to BILLING_MODE (DynamoDB allows one switch to
+# on-demand per table every 24 hours)
+set_billing_mode() {
+    CURRENT_MODE=$(aws dynamodb describe-table \
+        --table-name $TABLE_NAME \
+        --region $REGION \
+        --query "Table.BillingModeSummary.BillingMode" \
+        --output text)
+    # Tables that were always provisioned have no billing mode summary
+    if [ -z "$CURRENT_MODE" ] || [ "$CURRENT_MODE" == "None" ]; then
+        CURRENT_MODE="PROVISIONED"
+    fi
+    if [ "$CURRENT_MODE" == "$BILLING_MODE" ]; then
+        echo "Table '$TABLE_NAME' already uses $BILLING_MODE capacity."
+        return
+    fi
+
+    echo "Switching table '$TABLE_NAME' from $CURRENT_MODE to $BILLING_MODE capacity..."
+    if [ "$BILLING_MODE" == "PAY_PER_REQUEST" ]; then
+        aws dynamodb update-table \
+            --table-name $TABLE_NAME \
+            --region $REGION \
+            --billing-mode PAY_PER_REQUEST \
+            >/dev/null
+    else
+        # Going back to provisioned capacity needs the throughput of every index too
+        INDEX_NAMES=$(aws dynamodb describe-table \
+            --table-name $TABLE_NAME \
+            --region $REGION \
+            --query "Table.GlobalSecondaryIndexes[].IndexName" \
+            --output text)
+        INDEX_UPDATES=""
+        for NAME in $INDEX_NAMES; do
+            if [ "$NAME" == "None" ]; then
+                continue
+            fi
+            INDEX_UPDATES="$INDEX_UPDATES{\"Update\": {\"IndexName\": \"$NAME\"${INDEX_CAPACITY}}},"
+        done
+        INDEX_ARGS=()
+        if [ -n "$INDEX_UPDATES" ]; then
+            INDEX_ARGS=(--global-secondary-index-updates "[${INDEX_UPDATES%,}]")
+        fi
+        aws dynamodb update-table \
+            --table-name $TABLE_NAME \
+            --region $REGION \
+            --billing-mode PROVISIONED \
+            --provisioned-throughput ReadCapacityUnits=$READ_CAPACITY,WriteCapacityUnits=$WRITE_CAPACITY \
+            "${INDEX_ARGS[@]}" \
+            >/dev/null
+    fi
+    aws dynamodb wait table-exists --table-name $TABLE_NAME --region $REGION
+
+    echo "Table '$TABLE_NAME' now uses $BILLING_MODE capacity. Set MARKETPLACE_READ_CAPACITY and MARKETPLACE_WRITE_CAPACITY of the Lambda functions to match (0 for on-demand)."
+}
+
+# Create a global secondary index if the table does not have it yet
+# Usage: create_index <index-name> <attribute-definitions-json> <key-schema-json>
+create_index() {
+    INDEX_NAME=$1
+    ATTRIBUTE_DEFINITIONS=$2
+    KEY_SCHEMA=$3
+
+    EXISTING_INDEX=$(aws dynamodb describe-table \
+        --table-name $TABLE_NAME \
+        --region $REGION \
+        --query "Table.GlobalSecondaryIndexes[?IndexName=='$INDEX_NAME'].IndexName" \
+        --output text)
+
+    if [ -n "$EXISTING_INDEX" ] && [ "$EXISTING_INDEX" != "None" ]; then
+        echo "Index '$INDEX_NAME' already exists."
+        return
+    fi
+
+    echo "Creating index '$INDEX_NAME' on table '$TABLE_NAME'..."
+    aws dynamodb update-table \
+        --table-name $TABLE_NAME \
+        --region $REGION \
+        --attribute-definitions "$ATTRIBUTE_DEFINITIONS" \
+        --global-secondary-index-updates "[{\"Create\": {\"IndexName\": \"$INDEX_NAME\", \"KeySchema\": $KEY_SCHEMA, \"Projection\": {\"ProjectionType\": \"ALL\"}${INDEX_CAPACITY}}}]" \
+        >/dev/null
+
+    # Only one index can be created at a time, so wait for this one to finish backfilling
+    echo "Waiting for index '$INDEX_NAME' to become active..."
+    while true; do
+        INDEX_STATUS=$(aws dynamodb describe-table \
+            --table-name $TABLE_NAME \
+            --region $REGION \
+            --query "Table.GlobalSecondaryIndexes[?IndexName=='$INDEX_NAME'].IndexStatus" \
+            --output text)
+        if [ "$INDEX_STATUS" == "ACTIVE" ]; then
+            break
+        fi
+        sleep 10
+    done
+
+    echo "Index '$INDEX_NAME' created successfully!"
+}
+
+# Let DynamoDB delete items once their 'ExpiresAt' time (epoch seconds) has passed
+enable_ttl() {
+    TTL_STATUS=$(aws dynamodb describe-time-to-live \
+        --table-name $TABLE_NAME \
+        --region $REGION \
+        --query "TimeToLiveDescription.TimeToLiveStatus" \
+        --output text)
+
+    if [ "$TTL_STATUS" == "ENABLED" ] || [ "$TTL_STATUS" == "ENABLING" ]; then
+        echo "Time to live is already enabled on '$TABLE_NAME'."
+        return
+    fi
+
+    echo "Enabling time to live on '$TABLE_NAME'..."
+    aws dynamodb update-time-to-live \
+        --table-name $TABLE_NAME \
+        --time-to-live-specification "Enabled=true, AttributeName=ExpiresAt" \
+        --region $REGION
+
+    echo "Time to live enabled successfully!"
+}
+
 # Run the function to create the table
 create_table
+
+# Idempotency records and deleted-product tombstones expire through the table's time to live
+enable_ttl
+
+# Index used to list products by item type without scanning the table
+create_index "TypeIndex" \
+    '[{"AttributeName": "Type", "AttributeType": "S"}, {"AttributeName": "PK", "AttributeType": "S"}]' \
+    '[{"AttributeName": "Type", "KeyType": "HASH"}, {"AttributeName": "PK", "KeyType": "RANGE"}]'
+
+# Index used to look up a product by name without scanning the table
+create_index "ProductNameIndex" \
+    '[{"AttributeName": "ProductName", "AttributeType": "S"}]' \
+    '[{"AttributeName": "ProductName", "KeyType": "HASH"}]'
+
+# Index used to filter and sort products by price without scanning the table
+create_index "PriceIndex" \
+    '[{"AttributeName": "Type", "AttributeType": "S"}, {"AttributeName": "ProductPrice", "AttributeType": "N"}]' \
+    '[{"AttributeName": "Type", "KeyType": "HASH"}, {"AttributeName": "ProductPrice", "KeyType": "RANGE"}]'
+
+# Index used to list one seller's products without scanning the table
+create_index "OwnerIndex" \
+    '[{"AttributeName": "ProductOwner", "AttributeType": "S"}, {"AttributeName": "PK", "AttributeType": "S"}]' \
+    '[{"AttributeName": "ProductOwner", "KeyType": "HASH"}, {"AttributeName": "PK", "KeyType": "RANGE"}]'
+
+# Index used to list the products created and deleted since a sync cursor
+create_index "ChangeIndex" \
+    '[{"AttributeName": "ChangeFeed", "AttributeType": "S"}, {"AttributeName": "UpdatedAt", "AttributeType": "N"}]' \
+    '[{"AttributeName": "ChangeFeed", "KeyType": "HASH"}, {"AttributeName": "UpdatedAt", "KeyType": "RANGE"}]'
@@ -1,85 +1,288 @@
-import json
-import boto3
-from botocore.exceptions import NoCredentialsError, PartialCredentialsError
+import os
+from collections import Counter
+from botocore.exceptions import ClientError, NoCredentialsError, PartialCredentialsError
+from boto3.dynamodb.conditions import Attr, Key
+from marketplace_common import (adjust_owner_counts, batch_get, batch_write, build_response, bump_catalog_version, get_table,
+                                log_cold_start, parse_price, record_tombstones)
+from marketplace_search import unindex_products
+from marketplace_capacity import throttle_aware
+from marketplace_metrics import instrument
+
+# Secondary index keyed on the product owner (HASH: ProductOwner, RANGE: PK)
+OWNER_INDEX = 'OwnerIndex'
+
+# Upper bound on products per bulk delete or purge request, so a request fits in
+# the function timeout at the table's write capacity. A purge of a seller with
+# more products reports 'has_more' and is repeated.
+MAX_BULK_PRODUCTS = 250
+# BatchWriteItem chunks written concurrently by a bulk delete
+BULK_DELETE_WORKERS = int(os.environ.get('MARKETPLACE_BULK_DELETE_WORKERS', '4'))
+BULK_STATUSES = ('DELETED', 'NOT_FOUND', 'FORBIDDEN', 'FAILED')
 
 class DynamoDBMarketPlace:
     def __init__(self):
-        dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
-        self.table = dynamodb.Table('MarketPlaceDatabase')
-    
-    def delete_product(self, product_name, product_price, product_owner):
+        self.table = get_table()
+
+    def find_product_id(self, product_name, product_price, product_owner):
+        """
+        Finds the ID of a product by name, price and owner through the owner index.
+
+        Only the owner's own products are read, so the lookup costs O(products
+        of the seller) whatever the size of the catalog.
+
+        Args:
+            product_name (str): The name of the product.
+            product_price (str): The price of the product.
+            product_owner (str): The owner of the product.
+
+        Returns:
+            str: The product ID if a matching product exists, None otherwise.
+        """
+        # Prices are stored as numbers, but products created before that keep the string they were sent with
+        price_filter = Attr('ProductPrice').eq(product_price)
         try:
-            # Query for the product by ProductName, ProductPrice, and ProductOwner
-            response = self.table.scan(
-                FilterExpression="ProductName = :name and ProductPrice = :price and ProductOwner = :owner",
-                ExpressionAttributeValues={
-                    ':name': product_name,
-                    ':price': product_price,
-                    ':owner': product_owner
-                }
+            price_filter = price_filter | Attr('ProductPrice').eq(parse_price(product_price))
+        except ValueError:
+            pass
+        query_kwargs = {
+            'IndexName': OWNER_INDEX,
+            'KeyConditionExpression': Key('ProductOwner').eq(product_owner),
+            'FilterExpression': Attr('ProductName').eq(product_name) & price_filter,
+            'ProjectionExpression': 'PK'
+        }
+        while True:
+            response = self.table.query(**query_kwargs)
+            for item in response.get('Items', []):
+                pk = item.get('PK', '')
+                if pk.startswith("PRODUCT#"):
+                    return pk.split("#", 1)[1]  # Extract the part after "PRODUCT#"
+            if 'LastEvaluatedKey' not in response:
+                return None
+            query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    def delete_product(self, product_id, product_owner):
+        """
+        Deletes a product with a single conditional write.
+
+        The delete only succeeds if the product exists and belongs to product_owner,
+        so concurrent deletes cannot race each other.
+
+        Args:
+            product_id (str): The ID of the product to delete.
+            product_owner (str): The user requesting the delete.
+
+        Returns:
+            str: 'DELETED', 'NOT_FOUND' or 'FORBIDDEN', or None if an error occurred.
+        """
+        try:
+            response = self.table.delete_item(
+                Key={
+                    'PK': f'PRODUCT#{product_id}',
+                    'SK': "#DETAILS"
+                },
+                ConditionExpression=Attr('PK').exists() & Attr('ProductOwner').eq(product_owner),
+                ReturnValues='ALL_OLD',
+                ReturnValuesOnConditionCheckFailure='ALL_OLD'
             )
-            items = response.get('Items', [])
-        
-            if items:
-                # Assuming only one product matches, delete the first one found
-                product_to_delete = items[0]
-            
-                # Extract ProductID from the PK (e.g., "PRODUCT#12345")
-                pk = product_to_delete.get('PK')
-                if pk and pk.startswith("PRODUCT#"):
-                    product_id = pk.split("#")[1]  # Extract the part after "PRODUCT#"
-                else:
-                    print("Error: PK is not in the expected format")
-                    return False
-
-                # Delete the product from DynamoDB
-                self.table.delete_item(
-                    Key={
-                        'PK': pk,  # Use the PK as-is
-                        'SK': "#DETAILS"  # The corresponding SK
-                    }
-                )
-                return True
+            adjust_owner_counts({product_owner: -1})
+            # Recorded before the bump, so a listing reloaded for the new version no longer has the product
+            record_tombstones([product_id])
+            bump_catalog_version()
+            # The deleted item has the name the search index entries were built from
+            unindex_products([response['Attributes']])
+            return 'DELETED'
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                # The old item is only returned if the product exists but has another owner
+                return 'FORBIDDEN' if e.response.get('Item') else 'NOT_FOUND'
+            print(f"Error deleting product: {e}")
+            return None
+        except (NoCredentialsError, PartialCredentialsError) as e:
+            print(f"Credentials error: {e}")
+            return None
+
+    def delete_products(self, product_ids, product_owner):
+        """
+        Deletes several of a seller's products with batched writes.
+
+        BatchWriteItem deletes cannot be conditional, so the products are read
+        with BatchGetItem first and only those that exist and belong to
+        product_owner are deleted.
+
+        Args:
+            product_ids (list): The IDs of the products to delete.
+            product_owner (str): The user requesting the delete.
+
+        Returns:
+            dict: 'DELETED', 'NOT_FOUND', 'FORBIDDEN' or 'FAILED' for each product ID.
+        """
+        product_ids = list(dict.fromkeys(product_ids))
+        items, unread = batch_get(
+            [{'PK': f'PRODUCT#{product_id}', 'SK': '#DETAILS'} for product_id in product_ids],
+            projection={'ProjectionExpression': '#pk, #name, #owner',
+                        'ExpressionAttributeNames': {'#pk': 'PK', '#name': 'ProductName', '#owner': 'ProductOwner'}}
+        )
+        found = {item['PK'].split('#', 1)[1]: item for item in items}
+        unread_ids = {key['PK'].split('#', 1)[1] for key in unread}
+
+        statuses = {}
+        owned = []
+        for product_id in product_ids:
+            item = found.get(product_id)
+            if product_id in unread_ids:
+                statuses[product_id] = 'FAILED'
+            elif item is None:
+                statuses[product_id] = 'NOT_FOUND'
+            elif item.get('ProductOwner') != product_owner:
+                statuses[product_id] = 'FORBIDDEN'
             else:
-                print("Error: No matching product found")
-                return False
+                owned.append(item)
+        statuses.update(self.delete_items(owned, product_owner))
+        return statuses
+
+    def purge_products(self, product_owner, limit=MAX_BULK_PRODUCTS):
+        """
+        Deletes up to limit of a seller's products, found through the owner index.
+
+        Args:
+            product_owner (str): The seller whose products are deleted.
+            limit (int): The maximum number of products to delete.
+
+        Returns:
+            tuple: ('DELETED' or 'FAILED' for each product ID, True if the
+            seller has more products to purge).
+        """
+        query_kwargs = {
+            'IndexName': OWNER_INDEX,
+            'KeyConditionExpression': Key('ProductOwner').eq(product_owner),
+            'ProjectionExpression': '#pk, #name',
+            'ExpressionAttributeNames': {'#pk': 'PK', '#name': 'ProductName'}
+        }
+        items = []
+        while len(items) <= limit:
+            # One item past the limit tells whether there are more
+            query_kwargs['Limit'] = limit + 1 - len(items)
+            response = self.table.query(**query_kwargs)
+            items.extend(item for item in response.get('Items', []) if item.get('PK', '').startswith('PRODUCT#'))
+            if 'LastEvaluatedKey' not in response:
+                break
+            query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+        has_more = len(items) > limit
+        return self.delete_items(items[:limit], product_owner), has_more
+
+    def delete_items(self, items, product_owner):
+        """
+        Deletes product items of one seller with BatchWriteItem.
+
+        The deletes are sent in chunks of 25, BULK_DELETE_WORKERS chunks at a
+        time, and unprocessed deletes are retried with backoff. The owner count,
+        catalog version, change feed and search index are then updated
+        once for the whole batch.
+
+        Args:
+            items (list): Product items with their 'PK' and 'ProductName'.
+            product_owner (str): The owner of every item.
+
+        Returns:
+            dict: 'DELETED' or 'FAILED' for each product ID.
+        """
+        if not items:
+            return {}
+        try:
+            failed = batch_write([{'DeleteRequest': {'Key': {'PK': item['PK'], 'SK': '#DETAILS'}}} for item in items],
+                                 max_workers=BULK_DELETE_WORKERS)
         except (NoCredentialsError, PartialCredentialsError) as e:
             print(f"Credentials error: {e}")
-            return False
-        except Exception as e:
-            print(f"Unhandled error: {e}")
-            return False
+            return {item['PK'].split('#', 1)[1]: 'FAILED' for item in items}
+        failed_keys = {request['DeleteRequest']['Key']['PK'] for request in failed}
+        deleted = [item for item in items if item['PK'] not in failed_keys]
+
+        if deleted:
+            # A product bought between the read and the delete is counted twice; tools/rebuild_owner_counts.py fixes that
+            adjust_owner_counts({product_owner: -len(deleted)})
+            record_tombstones([item['PK'].split('#', 1)[1] for item in deleted], max_workers=BULK_DELETE_WORKERS)
+            bump_catalog_version()
+            unindex_products(deleted)
+        return {item['PK'].split('#', 1)[1]: 'FAILED' if item['PK'] in failed_keys else 'DELETED' for item in items}
+
+def bulk_delete_response(statuses, has_more=None):
+    """
+    Builds the response of a bulk delete or purge.
+
+    Args:
+        statuses (dict): The status of each product ID.
+        has_more (bool): For a purge, whether the seller has more products to purge.
+
+    Returns:
+        dict: A dictionary containing the status code, response body, and headers.
+    """
+    counts = Counter(statuses.values())
+    body = {
+        'counts': {status: counts.get(status, 0) for status in BULK_STATUSES},
+        'products': [{'product_id': product_id, 'status': status} for product_id, status in statuses.items()]
+    }
+    if has_more is not None:
+        body['has_more'] = has_more
+    status_code = 500 if counts['FAILED'] and not counts['DELETED'] else 200
+    return build_response(status_code, body)
 
 # Lambda handler function
+@instrument
+@throttle_aware
 def lambda_handler(event, context):
+    log_cold_start(context)
+
+    # Bulk mode: a list of product IDs, or every product of the owner
+    product_ids = event.get('product_ids')
+    purge = event.get('purge') in (True, 'true')
+    if product_ids is not None or purge:
+        product_owner = event.get('product_owner')
+        if not product_owner:
+            return build_response(400, {'error': 'Missing product data'})
+        if product_ids is not None and purge:
+            return build_response(400, {'error': 'product_ids cannot be combined with purge'})
+        if product_ids is not None and (not isinstance(product_ids, list) or not product_ids
+                                        or len(product_ids) > MAX_BULK_PRODUCTS
+                                        or not all(isinstance(product_id, str) and product_id for product_id in product_ids)):
+            return build_response(400, {'error': f'product_ids must be a list of 1 to {MAX_BULK_PRODUCTS} product IDs'})
+
+        marketplace = DynamoDBMarketPlace()
+        try:
+            if purge:
+                statuses, has_more = marketplace.purge_products(product_owner)
+                return bulk_delete_response(statuses, has_more)
+            return bulk_delete_response(marketplace.delete_products(product_ids, product_owner))
+        except (ClientError, NoCredentialsError, PartialCredentialsError) as e:
+            print(f"Error deleting products: {e}")
+            return build_response(500, {'error': 'Failed to delete products'})
+
+    product_id = event.get('product_id')
     product_name = event.get('product_name')
     product_price = event.get('product_price')
     product_owner = event.get('product_owner')
 
-    if not product_name or not product_price or not product_owner:
-        return {
-            'statusCode': 400,
-            'body': json.dumps({'error': 'Missing product data'})
-        }
+    if not product_owner or not (product_id or (product_name and product_price)):
+        return build_response(400, {'error': 'Missing product data'})
 
     marketplace = DynamoDBMarketPlace()
-    success = marketplace.delete_product(product_name=product_name, product_price=product_price, product_owner=product_owner)
-
-    if success:
-        return {
-            'statusCode': 200,
-            'body': json.dumps({'message': 'Product deleted successfully'}),
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            }
-        }
+    result = None
+
+    if not product_id:
+        # Fallback for callers that only know the name, price and owner
+        try:
+            product_id = marketplace.find_product_id(product_name=product_name, product_price=product_price, product_owner=product_owner)
+            if not product_id:
+                result = 'NOT_FOUND'
+        except (ClientError, NoCredentialsError, PartialCredentialsError) as e:
+            print(f"Error looking up product: {e}")
+    if product_id:
+        result = marketplace.delete_product(product_id=product_id, product_owner=product_owner)
+
+    if result == 'DELETED':
+        return build_response(200, {'message': 'Product deleted successfully'})
+    elif result == 'NOT_FOUND':
+        return build_response(404, {'error': 'Product not found'})
+    elif result == 'FORBIDDEN':
+        return build_response(403, {'error': 'Unauthorized to delete this product'})
     else:
-        return {
-            'statusCode': 403,
-            'body': json.dumps({'error': 'Unauthorized or product not found'}),
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            }
-        }
+        return build_response(500, {'error': 'Failed to delete product'})
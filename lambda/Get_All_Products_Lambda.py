@@ -1,56 +1,439 @@
-import json
-import boto3
-from botocore.exceptions import NoCredentialsError, PartialCredentialsError
-from boto3.dynamodb.conditions import Attr
+import os
+import time
+import hashlib
+from botocore.exceptions import ClientError, NoCredentialsError, PartialCredentialsError
+from boto3.dynamodb.conditions import Key
+from marketplace_common import (CHANGE_FEED, CURSOR_OVERLAP_MS, PRODUCT_FIELDS, TOMBSTONE_SK, TOMBSTONE_TTL_SECONDS, accepts_gzip, build_response,
+                                change_timestamp, decode_next_token, encode_next_token, get_catalog_version, get_header, get_owner_count,
+                                get_table, gzip_body, json_dumps, log_cold_start, parse_fields, parse_limit, parse_price,
+                                product_projection, public_product)
+import marketplace_snapshot
+from marketplace_capacity import throttle_aware
+from marketplace_metrics import instrument
 
-def get_all_products():
+# Secondary index keyed on the item type (HASH: Type, RANGE: PK)
+TYPE_INDEX = 'TypeIndex'
+# Secondary index keyed on the item type and price (HASH: Type, RANGE: ProductPrice)
+PRICE_INDEX = 'PriceIndex'
+SORT_ORDERS = ('price_asc', 'price_desc')
+# Secondary index keyed on the product owner (HASH: ProductOwner, RANGE: PK)
+OWNER_INDEX = 'OwnerIndex'
+# Secondary index keyed on the change feed and update time (HASH: ChangeFeed, RANGE: UpdatedAt)
+CHANGE_INDEX = 'ChangeIndex'
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+# Products served from the catalog snapshot in one response, far below the 6 MB
+# Lambda response limit; the following pages are read from the type index
+SNAPSHOT_PAGE_SIZE = 1000
+
+# Serialized listings cached in this container, keyed by the request parameters
+CACHE_TTL_SECONDS = float(os.environ.get('MARKETPLACE_CATALOG_CACHE_TTL', '5'))
+MAX_CACHE_ENTRIES = 64
+_listing_cache = {}
+
+def get_all_products(limit=DEFAULT_PAGE_SIZE, next_token=None, fields=PRODUCT_FIELDS,
+                     min_price=None, max_price=None, sort=None):
+    """
+    Retrieves one page of products from the DynamoDB table 'MarketPlaceDatabase'.
+
+    The query goes through the type index, so the read cost depends on the page
+    size rather than on the size of the table. Only the requested fields are
+    read, which also lowers the read capacity the query consumes.
+
+    A price range or price sort order is answered by the price index instead:
+    the range becomes the key condition and the sort order the index order, so
+    'under $50, cheapest first' is still a single bounded query.
+
+    Args:
+        limit (int): The maximum number of products to return.
+        next_token (str): The continuation token from the previous page, if any.
+        fields (tuple): The product fields to return, as returned by parse_fields.
+        min_price (Decimal): Only return products costing at least this much.
+        max_price (Decimal): Only return products costing at most this much.
+        sort (str): 'price_asc' or 'price_desc', or None for the default order.
+
+    Returns:
+        tuple: (list of product items, next_token or None) if successful, None otherwise.
+    """
+    table = get_table()
+
+    query_kwargs = {
+        'IndexName': TYPE_INDEX,
+        'KeyConditionExpression': Key('Type').eq('Product'),
+        'Limit': limit,
+        **product_projection(fields)
+    }
+    if min_price is not None or max_price is not None or sort:
+        key_condition = Key('Type').eq('Product')
+        if min_price is not None and max_price is not None:
+            key_condition &= Key('ProductPrice').between(min_price, max_price)
+        elif min_price is not None:
+            key_condition &= Key('ProductPrice').gte(min_price)
+        elif max_price is not None:
+            key_condition &= Key('ProductPrice').lte(max_price)
+        query_kwargs['IndexName'] = PRICE_INDEX
+        query_kwargs['KeyConditionExpression'] = key_condition
+        query_kwargs['ScanIndexForward'] = sort != 'price_desc'
+    if next_token:
+        query_kwargs['ExclusiveStartKey'] = decode_next_token(next_token)
+
+    try:
+        response = table.query(**query_kwargs)
+        products = [public_product(item, fields) for item in response.get('Items', [])]
+        return products, encode_next_token(response.get('LastEvaluatedKey'))
+    except (NoCredentialsError, PartialCredentialsError) as e:
+        print(f"Credentials error: {e}")
+        return None
+    except ClientError as e:
+        print(f"Error querying products: {e}")
+        return None
+
+def get_owner_products(owner, limit=DEFAULT_PAGE_SIZE, next_token=None, fields=PRODUCT_FIELDS):
+    """
+    Retrieves one page of a seller's products through the owner index.
+
+    Args:
+        owner (str): The product owner.
+        limit (int): The maximum number of products to return.
+        next_token (str): The continuation token from the previous page, if any.
+        fields (tuple): The product fields to return, as returned by parse_fields.
+
+    Returns:
+        tuple: (list of product items, next_token or None) if successful, None otherwise.
+    """
+    table = get_table()
+
+    query_kwargs = {
+        'IndexName': OWNER_INDEX,
+        'KeyConditionExpression': Key('ProductOwner').eq(owner),
+        'Limit': limit,
+        **product_projection(fields)
+    }
+    if next_token:
+        query_kwargs['ExclusiveStartKey'] = decode_next_token(next_token)
+
+    try:
+        response = table.query(**query_kwargs)
+        products = [public_product(item, fields) for item in response.get('Items', [])]
+        return products, encode_next_token(response.get('LastEvaluatedKey'))
+    except (NoCredentialsError, PartialCredentialsError) as e:
+        print(f"Credentials error: {e}")
+        return None
+    except ClientError as e:
+        print(f"Error querying products of {owner}: {e}")
+        return None
+
+def get_product_changes(since, limit=MAX_PAGE_SIZE, next_token=None, fields=PRODUCT_FIELDS):
     """
-    Retrieves all products from the DynamoDB table 'MarketPlaceDatabase'.
+    Retrieves one page of the products created and deleted after a cursor.
+
+    The query goes through the change index, so the read cost depends on the
+    number of changes rather than on the size of the catalog. Changes are
+    read from CURSOR_OVERLAP_MS before the cursor, so a client may get a
+    change twice; applying one again does no harm.
+
+    Args:
+        since (int): The cursor, in epoch milliseconds.
+        limit (int): The maximum number of changes to return.
+        next_token (str): The continuation token from the previous page, if any.
+        fields (tuple): The product fields to return, as returned by parse_fields.
 
     Returns:
-        list: A list of product items if successful, None otherwise.
+        tuple: (list of created product items, list of deleted product IDs,
+        next_token or None) if successful, None otherwise.
     """
-    dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
-    table = dynamodb.Table('MarketPlaceDatabase')
-    
+    table = get_table()
+
+    # The PK and SK tell products and tombstones apart, whatever fields were asked for
+    projection = product_projection(fields)
+    names = {**projection['ExpressionAttributeNames'], '#pk': 'PK', '#sk': 'SK'}
+    query_kwargs = {
+        'IndexName': CHANGE_INDEX,
+        'KeyConditionExpression': Key('ChangeFeed').eq(CHANGE_FEED) & Key('UpdatedAt').gt(since - CURSOR_OVERLAP_MS),
+        'Limit': limit,
+        'ProjectionExpression': ', '.join(names),
+        'ExpressionAttributeNames': names
+    }
+    if next_token:
+        query_kwargs['ExclusiveStartKey'] = decode_next_token(next_token)
+
     try:
-        response = table.scan(
-            FilterExpression=Attr('Type').contains('Product')
-        )
-        return response.get('Items')
+        response = table.query(**query_kwargs)
     except (NoCredentialsError, PartialCredentialsError) as e:
         print(f"Credentials error: {e}")
         return None
+    except ClientError as e:
+        print(f"Error querying product changes: {e}")
+        return None
 
+    products = []
+    deleted = []
+    for item in response.get('Items', []):
+        if item.get('SK') == TOMBSTONE_SK:
+            deleted.append(item['PK'].split('#', 1)[1])
+        else:
+            products.append(public_product(item, fields))
+    return products, deleted, encode_next_token(response.get('LastEvaluatedKey'))
+
+def get_snapshot_products(limit=SNAPSHOT_PAGE_SIZE, fields=PRODUCT_FIELDS):
+    """
+    Retrieves the first page of the catalog from the S3 snapshot.
+
+    The snapshot is sorted by key like the type index, so the next_token of the
+    page continues with a type index query.
+
+    Args:
+        limit (int): The maximum number of products to return.
+        fields (tuple): The product fields to return, as returned by parse_fields.
+
+    Returns:
+        tuple: (list of product items, next_token or None), or None if the
+        snapshot is disabled or unavailable.
+    """
+    if not marketplace_snapshot.is_enabled():
+        return None
+    try:
+        products = marketplace_snapshot.read_catalog()
+    except Exception as e:
+        print(f"Error reading catalog snapshot: {e}")
+        return None
+    if products is None:
+        return None
+    page = products[:limit]
+    next_token = None
+    if len(products) > limit:
+        next_token = encode_next_token({'Type': 'Product', 'PK': page[-1]['PK'], 'SK': page[-1]['SK']})
+    return [public_product(item, fields) for item in page], next_token
+
+def load_products(limit, next_token, use_snapshot, fields=PRODUCT_FIELDS, min_price=None, max_price=None, sort=None,
+                  owner=None):
+    """
+    Loads one page of products, from the catalog snapshot when allowed.
+
+    A seller's listing also carries the seller's total product 'count', read
+    from the seller's counter item rather than by counting the products. The
+    catalog listing carries the 'cursor' to sync it from with 'since'.
+
+    Args:
+        limit (int): The maximum number of products to return.
+        next_token (str): The continuation token from the previous page, if any.
+        use_snapshot (bool): Serve the first SNAPSHOT_PAGE_SIZE products from the S3 snapshot if it is available.
+        fields (tuple): The product fields to return, as returned by parse_fields.
+        min_price (Decimal): Only return products costing at least this much.
+        max_price (Decimal): Only return products costing at most this much.
+        sort (str): 'price_asc' or 'price_desc', or None for the default order.
+        owner (str): Only return the products of this seller.
+
+    Returns:
+        dict: The response body with 'products' and 'next_token' if successful, None otherwise.
+    """
+    # Taken before reading, so changes made while the listing is read are synced too
+    cursor = change_timestamp()
+    if owner is not None:
+        result = get_owner_products(owner, limit=limit, next_token=next_token, fields=fields)
+        if result is None:
+            return None
+        products, next_token = result
+        try:
+            count = get_owner_count(owner)
+        except Exception as e:
+            print(f"Error reading product count of {owner}: {e}")
+            return None
+        return {'products': products, 'next_token': next_token, 'count': count}
+
+    if use_snapshot:
+        result = get_snapshot_products(fields=fields)
+        if result is not None:
+            products, next_token = result
+            return {'products': products, 'next_token': next_token, 'cursor': str(cursor)}
+    result = get_all_products(limit=limit, next_token=next_token, fields=fields,
+                              min_price=min_price, max_price=max_price, sort=sort)
+    if result is None:
+        return None
+    products, next_token = result
+    if min_price is not None or max_price is not None or sort is not None:
+        return {'products': products, 'next_token': next_token}
+    return {'products': products, 'next_token': next_token, 'cursor': str(cursor)}
+
+def parse_cursor(since):
+    """
+    Validates the cursor sent with 'since'.
+
+    Args:
+        since (str|int): The 'cursor' of an earlier catalog listing or sync.
+
+    Returns:
+        int: The cursor, in epoch milliseconds.
+
+    Raises:
+        ValueError: If the cursor is not a non-negative integer.
+    """
+    try:
+        cursor = int(since)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid since cursor: {since}")
+    if cursor < 0:
+        raise ValueError(f"Invalid since cursor: {since}")
+    return cursor
+
+def set_listing_cursor(entry, cursor):
+    """
+    Replaces the 'cursor' at the end of a cached listing's body.
+
+    Args:
+        entry (dict): The cache entry, with the 'cursor_offset' its cursor starts at.
+        cursor (int): The new cursor, in epoch milliseconds.
+    """
+    entry['body'] = entry['body'][:entry['cursor_offset']] + ',"cursor":' + json_dumps(str(cursor)) + '}'
+    entry.pop('gzipped_body', None)
+
+def get_cached_listing(cache_key, load):
+    """
+    Returns the serialized listing for a request, reusing this container's cache.
+
+    A cached listing is served without any read until it is CACHE_TTL_SECONDS
+    old. After that the catalog version is read (a single item): if no product
+    was created or deleted since, the listing is kept for another TTL, otherwise
+    it is rebuilt.
+
+    The ETag is computed without the listing's 'cursor', so every container
+    gives the same products the same ETag. The cursor is moved forward each
+    time the version confirms the listing is still current.
+
+    Args:
+        cache_key (tuple): The request parameters identifying the listing.
+        load (callable): Returns the response body (a dict), or None on failure.
+
+    Returns:
+        dict: The cache entry with the serialized 'body' and its 'etag' (plus the
+        compressed 'gzipped_body' once a client asked for gzip), or None if loading failed.
+    """
+    now = time.monotonic()
+    entry = _listing_cache.get(cache_key)
+    if entry and entry['expires_at'] > now:
+        return entry
+
+    # Taken before the version is read: the listing is current as of this time
+    checked_at = change_timestamp()
+    try:
+        version = get_catalog_version()
+    except Exception as e:
+        print(f"Error reading catalog version: {e}")
+        version = None
+
+    if entry and version is not None and entry['version'] == version:
+        entry['expires_at'] = now + CACHE_TTL_SECONDS
+        if 'cursor_offset' in entry:
+            set_listing_cursor(entry, checked_at)
+        return entry
+
+    result = load()
+    if result is None:
+        return None
+    cursor = result.pop('cursor', None)
+    body = json_dumps(result)
+    digest = hashlib.sha256(body.encode('utf-8')).hexdigest()[:32]
+    entry = {
+        'version': version,
+        'body': body,
+        'etag': f'"{digest}"',
+        'expires_at': now + CACHE_TTL_SECONDS
+    }
+    if cursor is not None:
+        # The listing was read after checked_at, so it has every change made before it
+        entry['cursor_offset'] = len(body) - 1
+        set_listing_cursor(entry, checked_at)
+
+    # Evict the oldest listing once the cache is full
+    _listing_cache.pop(cache_key, None)
+    if len(_listing_cache) >= MAX_CACHE_ENTRIES:
+        _listing_cache.pop(next(iter(_listing_cache)))
+    _listing_cache[cache_key] = entry
+    return entry
+
+@instrument
+@throttle_aware
 def lambda_handler(event, context):
     """
-    AWS Lambda handler function to retrieve all products.
+    AWS Lambda handler function to retrieve a page of products.
+
+    Responses carry an ETag. A request whose If-None-Match header matches it
+    gets a 304 Not Modified without a body.
+
+    The catalog listing also carries a 'cursor'. A request with 'since' set to
+    it gets only the products created ('products') and deleted ('deleted')
+    since, plus the 'cursor' for the next sync, so a client can keep its list
+    current without downloading the catalog again. A cursor older than the
+    deletions kept in the change feed gets a 410, and the client has to load
+    the catalog again.
 
     Args:
-        event (dict): The event data passed to the Lambda function.
+        event (dict): The event data passed to the Lambda function. Accepts the
+            optional 'limit' and 'next_token' pagination parameters, a 'fields'
+            list restricting the returned product attributes, 'min_price' and
+            'max_price' bounds and a 'sort' order ('price_asc' or 'price_desc'),
+            or an 'owner' to list one seller's products with their count, or a
+            'since' cursor to list the changes since an earlier response.
         context (object): The context object passed to the Lambda function.
 
     Returns:
         dict: A dictionary containing the status code, response body, and headers.
     """
-    # Call the get_all_products function
-    products = get_all_products()
-
-    if products is not None:
-        return {
-            'statusCode': 200,
-            'body': json.dumps(products),
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            }
-        }
-    else:
-        return {
-            'statusCode': 500,
-            'body': json.dumps({'error': 'Failed to retrieve products'}),
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            }
-        }
\ No newline at end of file
+    log_cold_start(context)
+
+    try:
+        limit = parse_limit(event.get('limit'), DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+        next_token = event.get('next_token') or None
+        if next_token:
+            decode_next_token(next_token)
+        fields = parse_fields(event.get('fields'))
+        min_price = parse_price(event['min_price']) if event.get('min_price') not in (None, '') else None
+        max_price = parse_price(event['max_price']) if event.get('max_price') not in (None, '') else None
+        sort = event.get('sort') or None
+        if sort is not None and sort not in SORT_ORDERS:
+            raise ValueError(f"sort must be one of: {', '.join(SORT_ORDERS)}")
+        if min_price is not None and max_price is not None and min_price > max_price:
+            raise ValueError("min_price must not be greater than max_price")
+        owner = event.get('owner') or None
+        if owner is not None and (min_price is not None or max_price is not None or sort is not None):
+            raise ValueError("owner cannot be combined with min_price, max_price or sort")
+        since = parse_cursor(event['since']) if event.get('since') not in (None, '') else None
+        if since is not None and (owner is not None or min_price is not None or max_price is not None or sort is not None):
+            raise ValueError("since cannot be combined with owner, min_price, max_price or sort")
+    except ValueError as e:
+        return build_response(400, {'error': str(e)})
+
+    if since is not None:
+        # Changes are only read in their own order, and never cached
+        cursor = change_timestamp()
+        if since < cursor - TOMBSTONE_TTL_SECONDS * 1000:
+            return build_response(410, {'error': 'The cursor has expired, load the catalog again'})
+        result = get_product_changes(since, limit=parse_limit(event.get('limit'), MAX_PAGE_SIZE, MAX_PAGE_SIZE),
+                                     next_token=next_token, fields=fields)
+        if result is None:
+            return build_response(500, {'error': 'Failed to retrieve product changes'})
+        products, deleted, next_token = result
+        return build_response(200, {'products': products, 'deleted': deleted, 'next_token': next_token, 'cursor': str(cursor)},
+                              event, headers={'Cache-Control': 'no-store'})
+
+    # Serve the first request from the catalog snapshot when it is available,
+    # and fall back to the paginated query otherwise
+    price_query = min_price is not None or max_price is not None or sort is not None
+    use_snapshot = not next_token and not event.get('limit') and not price_query and owner is None
+    cache_key = (use_snapshot, limit, next_token, fields, min_price, max_price, sort, owner)
+    listing = get_cached_listing(cache_key, lambda: load_products(limit, next_token, use_snapshot, fields,
+                                                                  min_price=min_price, max_price=max_price, sort=sort,
+                                                                  owner=owner))
+
+    if listing is None:
+        return build_response(500, {'error': 'Failed to retrieve products'})
+
+    if get_header(event, 'If-None-Match') == listing['etag']:
+        return build_response(304, headers={'ETag': listing['etag']})
+
+    # Compress each cached listing at most once
+    if accepts_gzip(event) and 'gzipped_body' not in listing:
+        listing['gzipped_body'] = gzip_body(listing['body'])
+    return build_response(200, listing['body'], event,
+                          headers={'ETag': listing['etag'], 'Cache-Control': 'no-cache'},
+                          gzipped_body=listing.get('gzipped_body'))
@@ -1,71 +1,95 @@
-import json
-import boto3
-from botocore.exceptions import NoCredentialsError, PartialCredentialsError
+from botocore.exceptions import ClientError, NoCredentialsError, PartialCredentialsError
+from boto3.dynamodb.conditions import Key
+from marketplace_common import PRODUCT_FIELDS, build_response, get_table, log_cold_start, parse_fields, product_projection, public_product
+from marketplace_capacity import throttle_aware
+from marketplace_metrics import instrument
 
-def get_product(product_name):
+# Secondary index keyed on the product name (HASH: ProductName)
+PRODUCT_NAME_INDEX = 'ProductNameIndex'
+
+def get_product(product_name=None, product_id=None, fields=PRODUCT_FIELDS):
     """
-    Retrieves a product from the DynamoDB table 'MarketPlaceDatabase' based on the product name.
+    Retrieves a product from the DynamoDB table 'MarketPlaceDatabase'.
+
+    A product_id is resolved with a direct get_item on the product's key. Otherwise
+    the product name is looked up through the name index, so neither path scans
+    the table.
 
     Args:
         product_name (str): The name of the product to retrieve.
+        product_id (str): The ID of the product to retrieve (takes precedence over the name).
+        fields (tuple): The product fields to read, as returned by parse_fields.
 
     Returns:
         dict: A dictionary containing the product details if found, None otherwise.
     """
-    dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
-    table = dynamodb.Table('MarketPlaceDatabase')
-    
-    try:
-        response = table.scan(
-            FilterExpression=boto3.dynamodb.conditions.Attr('ProductName').eq(product_name)
+    table = get_table()
+    projection = product_projection(fields)
+
+    if product_id:
+        response = table.get_item(
+            Key={
+                'PK': f'PRODUCT#{product_id}',
+                'SK': '#DETAILS'
+            },
+            **projection
         )
-        items = response.get('Items')
-        if items:
-            return items[0]  # Assuming product names are unique and returning the first match
-        else:
-            return None
-    except (NoCredentialsError, PartialCredentialsError) as e:
-        print(f"Credentials error: {e}")
+        item = response.get('Item')
+        return public_product(item, fields) if item else None
+
+    response = table.query(
+        IndexName=PRODUCT_NAME_INDEX,
+        KeyConditionExpression=Key('ProductName').eq(product_name),
+        Limit=1,
+        **projection
+    )
+    items = response.get('Items')
+    if items:
+        return public_product(items[0], fields)  # Product names are not unique, return the first match
+    else:
         return None
 
+@instrument
+@throttle_aware
 def lambda_handler(event, context):
     """
-    AWS Lambda handler function to retrieve a product based on the product name.
+    AWS Lambda handler function to retrieve a product based on the product ID or name.
 
     Args:
-        event (dict): The event data passed to the Lambda function.
+        event (dict): The event data passed to the Lambda function. Accepts an
+            optional 'fields' list restricting the returned product attributes.
         context (object): The context object passed to the Lambda function.
 
     Returns:
         dict: A dictionary containing the status code, response body, and headers.
     """
-    # Extract product_name from the event
+    log_cold_start(context)
+
+    # Extract product_id or product_name from the event
+    product_id = event.get('product_id')
     product_name = event.get('product_name')
 
-    if not product_name:
-        return {
-            'statusCode': 400,
-            'body': json.dumps({'error': 'Missing product_name'})
-        }
+    if not product_id and not product_name:
+        return build_response(400, {'error': 'Missing product_id or product_name'})
+
+    try:
+        fields = parse_fields(event.get('fields'))
+    except ValueError as e:
+        return build_response(400, {'error': str(e)})
 
     # Call the get_product function
-    product = get_product(product_name)
+    try:
+        product = get_product(product_name=product_name, product_id=product_id, fields=fields)
+    except (NoCredentialsError, PartialCredentialsError) as e:
+        print(f"Credentials error: {e}")
+        product = False
+    except ClientError as e:
+        print(f"Error retrieving product: {e}")
+        product = False
 
-    if product is not None:
-        return {
-            'statusCode': 200,
-            'body': json.dumps(product),
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            }
-        }
+    if product is None:
+        return build_response(404, {'error': 'Product not found'})
+    elif product is False:
+        return build_response(500, {'error': 'Failed to retrieve product'})
     else:
-        return {
-            'statusCode': 500,
-            'body': json.dumps({'error': 'Failed to retrieve product'}),
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            }
-        }
\ No newline at end of file
+        return build_response(200, product, event)
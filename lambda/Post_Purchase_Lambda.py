@@ -1,150 +1,278 @@
 import json
-import boto3
-from botocore.exceptions import NoCredentialsError, PartialCredentialsError
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from botocore.exceptions import ClientError, NoCredentialsError, PartialCredentialsError
+from boto3.dynamodb.conditions import Attr, Key
+from marketplace_common import (adjust_owner_counts, build_response, bump_catalog_version, get_table, log_cold_start, parse_price,
+                                record_tombstones)
+from marketplace_orders import MAX_ORDER_ITEMS, build_order_item, enqueue_order, order_event, process_orders
+from marketplace_idempotency import idempotent
+from marketplace_capacity import throttle_aware
+from marketplace_metrics import instrument
 
-class SNSNotificationService:
+# Limit for cart checkouts: the order and every product must fit in one transaction
+MAX_CART_ITEMS = MAX_ORDER_ITEMS
+
+# Secondary index keyed on the product name (HASH: ProductName)
+PRODUCT_NAME_INDEX = 'ProductNameIndex'
+
+# Cancellation reasons of a purchase transaction that mean a product was sold or changed meanwhile
+UNAVAILABLE_REASONS = ('ConditionalCheckFailed', 'TransactionConflict')
+
+class DynamoDBMarketPlace:
     def __init__(self):
         """
-        Initializes the SNSNotificationService class and sets up the SNS client.
+        Initializes the DynamoDBMarketPlace class with the shared DynamoDB table resource.
         """
-        self.sns_client = boto3.client('sns', region_name='us-east-1')
-        self.sts_client = boto3.client('sts')
+        self.table = get_table()
 
+    """
+    Finds a product by name and price through the name index.
+    Args: product_name (str): The name of the product.
+    product_price (Decimal): The price of the product.
+    price_text (str): The price as sent by the buyer, for products created with a string price.
+    Returns: The product item if one matches, None otherwise.
+    """
+    def find_product(self, product_name, product_price, price_text):
+        query_kwargs = {
+            'IndexName': PRODUCT_NAME_INDEX,
+            'KeyConditionExpression': Key('ProductName').eq(product_name),
+            'FilterExpression': Attr('ProductPrice').is_in([product_price, price_text])
+        }
+        while True:
+            response = self.table.query(**query_kwargs)
+            for item in response.get('Items', []):
+                if item.get('PK', '').startswith("PRODUCT#"):
+                    return item
+            if 'LastEvaluatedKey' not in response:
+                return None
+            query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
 
     """
-    Retrieves the AWS account ID associated with the current credentials.
-    Returns: The AWS account ID if successful, None otherwise.
+    Resolves the products a buyer asked for.
+    Items with a product_id and product_owner are taken as they are (the purchase
+    transaction checks them), so the usual purchase needs no read at all. Other
+    items are read by ID, or looked up by name and price.
+    Args: items (list): The validated cart items.
+    Returns: A list with the product (ProductID, ProductName, ProductPrice, ProductOwner)
+    of each item, or None for items that do not match a product.
     """
-    def get_account_id(self):
-        try:
-            response = self.sts_client.get_caller_identity()
-            account_id = response['Account']
-            if not account_id:
-                raise ValueError("Account ID is empty.")
-            return account_id
-        except Exception as e:
-            print(f"Error retrieving AWS account ID: {e}")
-            return None
+    def resolve_products(self, items):
+        products = []
+        for item in items:
+            if item.get('product_id') and item.get('product_owner'):
+                products.append({
+                    'ProductID': item['product_id'],
+                    'ProductName': item['product_name'],
+                    'ProductPrice': item['product_price'],
+                    'ProductOwner': item['product_owner']
+                })
+                continue
+
+            if item.get('product_id'):
+                found = self.table.get_item(Key={'PK': f"PRODUCT#{item['product_id']}", 'SK': '#DETAILS'}).get('Item')
+            else:
+                found = self.find_product(item['product_name'], item['product_price'], item['price_text'])
+            if found is None:
+                products.append(None)
+                continue
+            products.append({
+                'ProductID': found['PK'].split('#', 1)[1],
+                'ProductName': found.get('ProductName'),
+                'ProductPrice': item['product_price'],
+                'ProductOwner': found.get('ProductOwner')
+            })
+        return products
 
     """
-    Sends a purchase confirmation notification to the recipient.
-    Args: recipient (str): The email address of the recipient.
-    product_name (str): The name of the purchased product.
-    product_price (float): The price of the purchased product.
-    Returns: The response from SNS if the notification is sent successfully, None otherwise.
+    Records an order and removes its products with a single transaction.
+    Each product is deleted on the condition that it still exists with the name,
+    price and owner the buyer saw, so a product can only be bought once.
+    Args: buyer (str): The email address of the buyer.
+    products (list): The resolved products.
+    price_texts (list): The prices as sent by the buyer, one per product.
+    Returns: A tuple ('CONFIRMED', order item), ('UNAVAILABLE', indexes of the
+    products that were sold or changed), or (None, None) if an error occurred.
     """
-    def send_notification(self, recipient, product_name, product_price):
-        if not recipient:
-            print("Recipient is missing.")
-            return None
-        if not product_name or not product_price:
-            print("Product information is missing.")
-            return None
-        
-        message = f"Thank you for purchasing {product_name} for ${product_price}. Your purchase has been confirmed."
-        subject = f"Purchase Confirmation for {product_name}"
+    def place_order(self, buyer, products, price_texts):
+        order_item = build_order_item(
+            order_id=str(uuid.uuid4()),
+            buyer=buyer,
+            products=products,
+            created_at=datetime.now(timezone.utc).isoformat()
+        )
+        transact_items = [{
+            'Put': {
+                'TableName': self.table.name,
+                'Item': order_item,
+                'ConditionExpression': 'attribute_not_exists(PK)'
+            }
+        }]
+        for product, price_text in zip(products, price_texts):
+            transact_items.append({
+                'Delete': {
+                    'TableName': self.table.name,
+                    'Key': {'PK': f"PRODUCT#{product['ProductID']}", 'SK': '#DETAILS'},
+                    'ConditionExpression': ('attribute_exists(PK) AND #name = :name AND #owner = :owner '
+                                            'AND #price IN (:price, :price_text)'),
+                    'ExpressionAttributeNames': {'#name': 'ProductName', '#owner': 'ProductOwner', '#price': 'ProductPrice'},
+                    'ExpressionAttributeValues': {
+                        ':name': product['ProductName'],
+                        ':owner': product['ProductOwner'],
+                        ':price': product['ProductPrice'],
+                        ':price_text': price_text
+                    }
+                }
+            })
 
         try:
-            account_id = self.get_account_id()
-            if not account_id:
-                raise Exception("Could not fetch AWS account ID.")
-            
-            sns_topic_arn = f'arn:aws:sns:us-east-1:{account_id}:MarketPlaceTopic'
-
-            response = self.sns_client.publish(
-                TopicArn=sns_topic_arn,
-                Message=message,
-                Subject=subject
-            )
-            return response
+            # The resource's client converts the Python values, as the table methods do
+            self.table.meta.client.transact_write_items(TransactItems=transact_items)
+            return 'CONFIRMED', order_item
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'TransactionCanceledException':
+                reasons = e.response.get('CancellationReasons', [])
+                unavailable = [index for index, reason in enumerate(reasons[1:])
+                               if reason.get('Code') in UNAVAILABLE_REASONS]
+                if unavailable:
+                    return 'UNAVAILABLE', unavailable
+            print(f"Error placing order: {e}")
+            return None, None
         except (NoCredentialsError, PartialCredentialsError) as e:
             print(f"Credentials error: {e}")
-            return None
-        except Exception as e:
-            print(f"Error sending notification: {e}")
-            return None
+            return None, None
 
 """
-AWS Lambda handler function to send a purchase confirmation notification.
-Args: event (dict): The event data passed to the Lambda function.
+Validates the items of a cart checkout.
+Args: items (list): The 'items' field of the event.
+Returns: An error message if the cart is invalid, None otherwise.
+"""
+def validate_cart(items):
+    if not isinstance(items, list) or not items or len(items) > MAX_CART_ITEMS:
+        return f'items must be a list of 1 to {MAX_CART_ITEMS} products'
+    invalid = [str(index) for index, item in enumerate(items)
+               if not isinstance(item, dict) or not item.get('product_name') or not item.get('product_price')]
+    if invalid:
+        return f'Missing product_name or product_price for items: {", ".join(invalid)}'
+    return None
+
+"""
+Normalizes the prices of validated cart items.
+Args: items (list): The validated cart items.
+Returns: A tuple (items with 'product_price' parsed and the original in 'price_text',
+error message or None).
+"""
+def parse_items(items):
+    parsed = []
+    invalid = []
+    for index, item in enumerate(items):
+        try:
+            parsed.append({**item, 'product_price': parse_price(item['product_price']), 'price_text': str(item['product_price'])})
+        except ValueError:
+            invalid.append(str(index))
+    if invalid:
+        return None, f'Invalid product_price for items: {", ".join(invalid)}'
+    return parsed, None
+
+"""
+AWS Lambda handler function to purchase a product, or a cart of products.
+The purchase is committed with one DynamoDB transaction that records the order
+and removes the products. The confirmation email and the search index
+updates are queued for Process_Orders_Lambda.
+Args: event (dict): The event data passed to the Lambda function. Either a single
+product ('product_id', 'product_name', 'product_price', 'product_owner') or an
+'items' list of such dictionaries, plus the buyer's 'user_email'. product_id and
+product_owner are optional, but without them the product has to be looked up first.
 context (object): The context object passed to the Lambda function.
 Returns: A dictionary containing the status code, response body, and headers.
 """
+@instrument
+@throttle_aware
+@idempotent
 def lambda_handler(event, context):
+    log_cold_start(context)
+
     try:
         # Log the received event
         print("Received event:", json.dumps(event))
 
-        # Extract fields from the event directly (since body is already parsed)
-        product_name = event.get('product_name')
-        product_price = event.get('product_price')
         user_email = event.get('user_email')
 
-        # Validate that all required fields are present
-        if not product_name or not product_price or not user_email:
-            missing_fields = []
-            if not product_name:
-                missing_fields.append('product_name')
-            if not product_price:
-                missing_fields.append('product_price')
-            if not user_email:
-                missing_fields.append('user_email')
-
-            return {
-                'statusCode': 400,
-                'body': json.dumps({'error': f'Missing required data: {", ".join(missing_fields)}'}),
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                }
-            }
+        # Cart mode: several products bought with a single order
+        cart = event.get('items') is not None
+        if cart:
+            items = event['items']
+            error = 'Missing required data: user_email' if not user_email else validate_cart(items)
+            if error:
+                return build_response(400, {'error': error})
+        else:
+            # Extract fields from the event directly (since body is already parsed)
+            product_name = event.get('product_name')
+            product_price = event.get('product_price')
 
-        # Initialize the notification service
-        notification_service = SNSNotificationService()
+            # Validate that all required fields are present
+            if not product_name or not product_price or not user_email:
+                missing_fields = []
+                if not product_name:
+                    missing_fields.append('product_name')
+                if not product_price:
+                    missing_fields.append('product_price')
+                if not user_email:
+                    missing_fields.append('user_email')
 
-        # Send a purchase confirmation notification
-        notification_response = notification_service.send_notification(
-            recipient=user_email,
-            product_name=product_name,
-            product_price=product_price
-        )
+                return build_response(400, {'error': f'Missing required data: {", ".join(missing_fields)}'})
+            items = [{
+                'product_id': event.get('product_id'),
+                'product_name': product_name,
+                'product_price': product_price,
+                'product_owner': event.get('product_owner')
+            }]
 
-        if notification_response:
-            return {
-                'statusCode': 200,
-                'body': json.dumps({'message': 'Purchase confirmation notification sent successfully'}),
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                }
-            }
-        else:
-            return {
-                'statusCode': 500,
-                'body': json.dumps({'error': 'Failed to send confirmation notification'}),
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                }
-            }
+        items, error = parse_items(items)
+        if error:
+            return build_response(400, {'error': error})
+
+        marketplace = DynamoDBMarketPlace()
+        try:
+            products = marketplace.resolve_products(items)
+        except (ClientError, NoCredentialsError, PartialCredentialsError) as e:
+            print(f"Error looking up products: {e}")
+            return build_response(500, {'error': 'Failed to complete purchase'})
+
+        missing = [index for index, product in enumerate(products) if product is None]
+        if missing:
+            if not cart:
+                return build_response(404, {'error': 'Product not found'})
+            return build_response(409, {'error': 'Some products are no longer available', 'unavailable': missing})
+        if len({product['ProductID'] for product in products}) != len(products):
+            return build_response(400, {'error': 'items must not contain the same product twice'})
+
+        status, result = marketplace.place_order(user_email, products, [item['price_text'] for item in items])
+        if status == 'UNAVAILABLE':
+            if not cart:
+                return build_response(409, {'error': 'Product is no longer available'})
+            return build_response(409, {'error': 'Some products are no longer available', 'unavailable': result})
+        if status != 'CONFIRMED':
+            return build_response(500, {'error': 'Failed to complete purchase'})
+
+        adjust_owner_counts({owner: -count for owner, count in Counter(product['ProductOwner'] for product in products).items()})
+        # Recorded before the bump and before answering, so listings reloaded for the new
+        # version and the buyer's next catalog sync already drop the products
+        record_tombstones([product['ProductID'] for product in products])
+        bump_catalog_version()
+
+        # The purchase is committed: the rest happens in Process_Orders_Lambda, or inline without a queue
+        order = order_event(result)
+        if not enqueue_order(order):
+            if process_orders([order]):
+                print(f"Failed to send the confirmation of order {order['order_id']}")
+
+        return build_response(200, {'message': 'Purchase confirmed', 'order_id': order['order_id']})
 
     except ValueError as e:
         print(f"Error parsing the JSON body: {e}")
-        return {
-            'statusCode': 400,
-            'body': json.dumps({'error': 'Invalid JSON format in request body.'}),
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            }
-        }
+        return build_response(400, {'error': 'Invalid JSON format in request body.'})
     except Exception as e:
         print(f"Error in lambda_handler: {e}")
-        return {
-            'statusCode': 500,
-            'body': json.dumps({'error': 'Internal server error'}),
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            }
-        }
\ No newline at end of file
+        return build_response(500, {'error': 'Internal server error'})
@@ -1,48 +1,92 @@
 import json
-import boto3
-from botocore.exceptions import NoCredentialsError, PartialCredentialsError
+from datetime import datetime, timezone
+from botocore.exceptions import ClientError, NoCredentialsError, PartialCredentialsError
+from boto3.dynamodb.conditions import Attr
+from marketplace_common import build_response, call_with_topic_arn, get_client, get_table, log_cold_start
+from marketplace_capacity import throttle_aware
+from marketplace_metrics import instrument
+
+def subscriber_key(email):
+    """
+    Builds the key of the subscriber record kept for an email address.
+
+    Args:
+        email (str): The subscribed email address.
+
+    Returns:
+        dict: The PK/SK of the 'SUBSCRIBER#<email>' item.
+    """
+    return {
+        'PK': f'SUBSCRIBER#{email.strip().lower()}',
+        'SK': '#DETAILS'
+    }
+
+def subscriber_item(email, subscription_arn):
+    """
+    Builds the subscriber record stored in 'MarketPlaceDatabase'.
+
+    Args:
+        email (str): The subscribed email address.
+        subscription_arn (str): The SNS subscription ARN, or 'pending confirmation'.
+
+    Returns:
+        dict: The item to write.
+    """
+    return {
+        **subscriber_key(email),
+        'Type': 'Subscriber',
+        'Email': email,
+        'SubscriptionArn': subscription_arn,
+        # Not 'UpdatedAt', which is the numeric sort key of ChangeIndex
+        'SubscribedAt': datetime.now(timezone.utc).isoformat()
+    }
 
 class SNSSubscriptionService:
     def __init__(self):
-        self.sns_client = boto3.client('sns', region_name='us-east-1')
-        self.sts_client = boto3.client('sts')
-
-    def get_account_id(self):
-        """
-        Retrieves the AWS account ID using the STS client.
-        """
-        try:
-            response = self.sts_client.get_caller_identity()
-            account_id = response['Account']
-            if not account_id:
-                raise ValueError("Account ID is empty.")
-            return account_id
-        except Exception as e:
-            print(f"Error retrieving AWS account ID: {e}")
-            return None
+        self.sns_client = get_client('sns')
+        self.table = get_table()
 
-    def email_already_subscribed(self, email, topic_arn):
+    def email_already_subscribed(self, email):
         """
         Checks if the given email is already subscribed to the SNS topic.
 
         Args:
             email (str): The email address to check.
-            topic_arn (str): The ARN of the SNS topic.
 
         Returns:
             bool: True if the email is already subscribed, False otherwise.
         """
         try:
-            paginator = self.sns_client.get_paginator('list_subscriptions_by_topic')
-            for page in paginator.paginate(TopicArn=topic_arn):
-                for subscription in page['Subscriptions']:
-                    if subscription['Endpoint'] == email and subscription['Protocol'] == 'email':
-                        return True
-            return False
+            response = self.table.get_item(Key=subscriber_key(email))
+            return 'Item' in response
         except Exception as e:
             print(f"Error checking subscription: {e}")
             return False
 
+    def reserve_subscription(self, email):
+        """
+        Claims the subscriber record for an email with a conditional put.
+
+        Only one concurrent request can create the record, so the same address
+        is never passed to sns.subscribe twice.
+
+        Args:
+            email (str): The email address to subscribe.
+
+        Returns:
+            bool: True if the record was created, False if it already exists.
+        """
+        try:
+            self.table.put_item(
+                Item=subscriber_item(email, 'pending subscribe'),
+                ConditionExpression=Attr('PK').not_exists()
+            )
+            return True
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                return False
+            raise
+
     def create_email_subscription(self, email):
         """
         Creates an email subscription to an SNS topic if not already subscribed.
@@ -58,23 +102,25 @@ class SNSSubscriptionService:
             return None
         
         try:
-            account_id = self.get_account_id()
-            if not account_id:
-                raise Exception("Could not fetch AWS account ID.")
-            
-            sns_topic_arn = f'arn:aws:sns:us-east-1:{account_id}:MarketPlaceTopic'
-
-            # Check if the email is already subscribed
-            if self.email_already_subscribed(email, sns_topic_arn):
+            # Check if the email is already subscribed (one read, since the storefront
+            # subscribes on every login) and claim the record if not
+            if self.email_already_subscribed(email) or not self.reserve_subscription(email):
                 print(f"Email {email} is already subscribed to the topic.")
                 return {'message': 'Already subscribed', 'status': 'ALREADY_SUBSCRIBED'}
-            
+
             # Subscribe the email
-            response = self.sns_client.subscribe(
-                TopicArn=sns_topic_arn,
-                Protocol='email',
-                Endpoint=email
-            )
+            try:
+                response = call_with_topic_arn(
+                    self.sns_client.subscribe,
+                    Protocol='email',
+                    Endpoint=email
+                )
+            except Exception:
+                # Release the claim so the subscription can be retried
+                self.table.delete_item(Key=subscriber_key(email))
+                raise
+
+            self.table.put_item(Item=subscriber_item(email, response.get('SubscriptionArn', 'pending confirmation')))
             return response
         except (NoCredentialsError, PartialCredentialsError) as e:
             print(f"Credentials error: {e}")
@@ -83,6 +129,8 @@ class SNSSubscriptionService:
             print(f"Error creating email subscription: {e}")
             return None
 
+@instrument
+@throttle_aware
 def lambda_handler(event, context):
     """
     Lambda handler for subscribing a user to an SNS topic.
@@ -94,6 +142,8 @@ def lambda_handler(event, context):
     Returns:
         dict: A response containing the status code, message, and headers.
     """
+    log_cold_start(context)
+
     try:
         # Log the received event
         print("Received event:", json.dumps(event))
@@ -101,14 +151,7 @@ def lambda_handler(event, context):
         # Extract email from the event
         email = event.get('user_email')
         if not email:
-            return {
-                'statusCode': 400,
-                'body': json.dumps({'error': 'Email is required'}),
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                }
-            }
+            return build_response(400, {'error': 'Email is required'})
 
         # Initialize the subscription service
         subscription_service = SNSSubscriptionService()
@@ -117,41 +160,13 @@ def lambda_handler(event, context):
         subscription_response = subscription_service.create_email_subscription(email=email)
 
         if subscription_response and subscription_response.get('status') == 'ALREADY_SUBSCRIBED':
-            return {
-                'statusCode': 200,
-                'body': json.dumps({'message': f'Email {email} is already subscribed to the topic.'}),
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                }
-            }
+            return build_response(200, {'message': f'Email {email} is already subscribed to the topic.'})
 
         if subscription_response and 'SubscriptionArn' in subscription_response:
-            return {
-                'statusCode': 200,
-                'body': json.dumps({'message': f'Subscription request sent to {email}. Confirm via email.'}),
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                }
-            }
+            return build_response(200, {'message': f'Subscription request sent to {email}. Confirm via email.'})
         else:
-            return {
-                'statusCode': 500,
-                'body': json.dumps({'error': 'Failed to create email subscription'}),
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                }
-            }
+            return build_response(500, {'error': 'Failed to create email subscription'})
 
     except Exception as e:
         print(f"Error in lambda_handler: {e}")
-        return {
-            'statusCode': 500,
-            'body': json.dumps({'error': 'Internal server error'}),
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            }
-        }
+        return build_response(500, {'error': 'Internal server error'})
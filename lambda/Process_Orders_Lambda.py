@@ -0,0 +1,43 @@
+from marketplace_common import log_cold_start
+from marketplace_orders import parse_order_event, process_orders
+from marketplace_metrics import instrument
+
+@instrument
+def lambda_handler(event, context):
+    """
+    AWS Lambda handler function to process queued orders.
+
+    Triggered by the order queue with batches of up to 10 order events. Sold
+    products are removed from the search index once per batch, and the
+    confirmation emails are sent with as few SNS calls as possible.
+
+    Args:
+        event (dict): The SQS event, with one record per order event.
+        context (object): The context object passed to the Lambda function.
+
+    Returns:
+        dict: The 'batchItemFailures' to retry (the event source mapping is
+        created with ReportBatchItemFailures).
+    """
+    log_cold_start(context)
+
+    orders = []
+    message_ids = {}
+    failures = []
+    for record in event.get('Records', []):
+        try:
+            order = parse_order_event(record['body'])
+            order_id = order['order_id']
+        except (KeyError, TypeError, ValueError) as e:
+            # A malformed event never gets better, so it is dropped instead of retried
+            print(f"Skipping malformed order event {record.get('messageId')}: {e}")
+            continue
+        orders.append(order)
+        message_ids.setdefault(order_id, []).append(record['messageId'])
+
+    failed = process_orders(orders) if orders else set()
+    for order_id in failed:
+        failures.extend({'itemIdentifier': message_id} for message_id in message_ids[order_id])
+    if failures:
+        print(f"Failed to send the confirmation of {len(failed)} orders, they will be retried.")
+    return {'batchItemFailures': failures}
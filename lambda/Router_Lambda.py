@@ -0,0 +1,64 @@
+import importlib
+from marketplace_common import build_response
+
+# Handler module of each API route, keyed by the HTTP method and resource path
+# that the request templates add to the event as 'route'
+ROUTES = {
+    ('GET', '/products'): 'Get_Product_Lambda',
+    ('POST', '/products'): 'Post_Product_Lambda',
+    ('DELETE', '/products'): 'Delete_Product_Lambda',
+    ('GET', '/products/get_all_products'): 'Get_All_Products_Lambda',
+    ('GET', '/products/search'): 'Search_Products_Lambda',
+    ('POST', '/products/purchase'): 'Post_Purchase_Lambda',
+    ('POST', '/subscribe'): 'Post_Subscribe_Lambda'
+}
+
+# Handlers imported so far in this container, by module name
+_handlers = {}
+
+def get_handler(module_name):
+    """
+    Returns the lambda_handler of a route, importing its module on first use.
+
+    Only the shared modules are imported when the container starts, so a cold
+    start pays for the routes it serves and not for all of them.
+
+    Args:
+        module_name (str): The handler module, e.g. 'Get_Product_Lambda'.
+
+    Returns:
+        callable: The module's lambda_handler.
+    """
+    handler = _handlers.get(module_name)
+    if handler is None:
+        handler = importlib.import_module(module_name).lambda_handler
+        _handlers[module_name] = handler
+    return handler
+
+def lambda_handler(event, context):
+    """
+    AWS Lambda handler function that serves every API route from one function.
+
+    Used by the routed deployment (DEPLOYMENT_MODE=routed), where all API
+    Gateway integrations invoke this function, so the routes share one pool of
+    warm containers. The event is passed on, without 'route', to the same
+    lambda_handler the separate functions run.
+
+    Args:
+        event (dict): The event data passed to the Lambda function, with the
+            'route' ('method' and 'path') added by the request templates.
+        context (object): The context object passed to the Lambda function.
+
+    Returns:
+        dict: The response of the route's handler, or a 404 response for an unknown route.
+    """
+    route = event.get('route')
+    if not isinstance(route, dict):
+        route = {}
+    method = str(route.get('method') or '').upper()
+    path = route.get('path')
+    module_name = ROUTES.get((method, path))
+    if module_name is None:
+        print(f"No route for {method} {path}")
+        return build_response(404, {'error': f'No route for {method} {path}'})
+    return get_handler(module_name)({name: value for name, value in event.items() if name != 'route'}, context)
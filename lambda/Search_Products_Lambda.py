@@ -0,0 +1,105 @@
+from botocore.exceptions import ClientError, NoCredentialsError, PartialCredentialsError
+from boto3.dynamodb.conditions import Key
+from marketplace_common import (PRODUCT_FIELDS, build_response, decode_next_token, encode_next_token, get_table, log_cold_start,
+                                parse_fields, parse_limit)
+from marketplace_search import MIN_PREFIX_LENGTH, TOKEN_PREFIX, index_prefix, matches, tokenize
+from marketplace_capacity import throttle_aware
+from marketplace_metrics import instrument
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+def search_products(words, limit=DEFAULT_PAGE_SIZE, next_token=None, fields=PRODUCT_FIELDS):
+    """
+    Retrieves one page of products matching a search query from the prefix index.
+
+    Only the partition of the longest query word is read, so the cost depends on
+    the number of products matching that word, not on the size of the catalog.
+    The other words are checked against the product names of those matches.
+
+    Args:
+        words (list): The lowercase query words, as returned by tokenize.
+        limit (int): The maximum number of products to return.
+        next_token (str): The continuation token from the previous page, if any.
+        fields (tuple): The product fields to return, as returned by parse_fields.
+
+    Returns:
+        tuple: (list of products, next_token or None). Whole-word matches come
+        first, then prefix matches, each with the shortest names first.
+    """
+    table = get_table()
+
+    lookup_word = max(words, key=len)
+    # A single word that is itself an indexed prefix needs no further check
+    check_names = len(words) > 1 or index_prefix(lookup_word) != lookup_word
+
+    query_kwargs = {
+        'KeyConditionExpression': Key('PK').eq(f'{TOKEN_PREFIX}{index_prefix(lookup_word)}'),
+        'Limit': limit
+    }
+    if next_token:
+        query_kwargs['ExclusiveStartKey'] = decode_next_token(next_token)
+
+    products = []
+    while True:
+        response = table.query(**query_kwargs)
+        items = response.get('Items', [])
+        for position, item in enumerate(items):
+            product = item['Product']
+            if check_names and not matches(product.get('ProductName', ''), words):
+                continue
+            products.append({field: product[field] for field in fields if field in product})
+            if len(products) == limit:
+                # Resume after this item, unless it was the last match
+                if position < len(items) - 1 or 'LastEvaluatedKey' in response:
+                    return products, encode_next_token({'PK': item['PK'], 'SK': item['SK']})
+                return products, None
+        if 'LastEvaluatedKey' not in response:
+            return products, None
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+@instrument
+@throttle_aware
+def lambda_handler(event, context):
+    """
+    AWS Lambda handler function to search products by name.
+
+    Every word of the query matches product names containing a word that starts
+    with it, so 'lap' finds 'Laptop' and 'red lap' finds 'Red Laptop Sleeve'.
+
+    Args:
+        event (dict): The event data passed to the Lambda function. Requires 'q'
+            and accepts the optional 'limit', 'next_token' and 'fields' parameters.
+        context (object): The context object passed to the Lambda function.
+
+    Returns:
+        dict: A dictionary containing the status code, response body, and headers.
+    """
+    log_cold_start(context)
+
+    words = tokenize(event.get('q') or '')
+    if not any(len(word) >= MIN_PREFIX_LENGTH for word in words):
+        return build_response(400, {'error': f'q must contain a word of at least {MIN_PREFIX_LENGTH} characters'})
+
+    try:
+        limit = parse_limit(event.get('limit'), DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+        next_token = event.get('next_token') or None
+        if next_token:
+            decode_next_token(next_token)
+        fields = parse_fields(event.get('fields'))
+    except ValueError as e:
+        return build_response(400, {'error': str(e)})
+
+    try:
+        products, next_token = search_products(words, limit=limit, next_token=next_token, fields=fields)
+    except (NoCredentialsError, PartialCredentialsError) as e:
+        print(f"Credentials error: {e}")
+        return build_response(500, {'error': 'Failed to search products'})
+    except ClientError as e:
+        # A token from another query points outside the queried partition
+        if e.response['Error']['Code'] == 'ValidationException':
+            return build_response(400, {'error': 'Invalid next_token'})
+        print(f"Error searching products: {e}")
+        return build_response(500, {'error': 'Failed to search products'})
+
+    return build_response(200, {'products': products, 'next_token': next_token}, event)
@@ -0,0 +1,53 @@
+#!/bin/bash
+
+# Package each Lambda handler together with the shared marketplace_* modules
+
+# Directory containing the Lambda sources and the output directory for the ZIP files
+LAMBDA_DIR="lambda"
+ZIP_DIR="zip_files"
+
+# Lambda handler sources to package
+LAMBDA_SOURCES=(
+    "Get_All_Products_Lambda"
+    "Get_Product_Lambda"
+    "Post_Product_Lambda"
+    "Post_Purchase_Lambda"
+    "Post_Subscribe_Lambda"
+    "Delete_Product_Lambda"
+    "Search_Products_Lambda"
+    "Process_Orders_Lambda"
+)
+
+# Check that zip is installed
+if ! command -v zip >/dev/null 2>&1; then
+    echo "Error: 'zip' is not installed."
+    exit 1
+fi
+
+mkdir -p $ZIP_DIR
+
+for SOURCE in "${LAMBDA_SOURCES[@]}"; do
+    ZIP_FILE="$ZIP_DIR/$SOURCE.zip"
+    echo "Packaging '$SOURCE' into '$ZIP_FILE'..."
+
+    # Rebuild from scratch so removed modules do not linger in the archive
+    rm -f $ZIP_FILE
+    zip -q -j $ZIP_FILE $LAMBDA_DIR/$SOURCE.py $LAMBDA_DIR/marketplace_*.py
+    if [ $? -ne 0 ]; then
+        echo "Error: Failed to package '$SOURCE'."
+        exit 1
+    fi
+done
+
+# The routed deployment serves every API route from one function, so its
+# archive holds every handler (Router_Lambda imports them on first use)
+ZIP_FILE="$ZIP_DIR/Router_Lambda.zip"
+echo "Packaging 'Router_Lambda' and every handler into '$ZIP_FILE'..."
+rm -f $ZIP_FILE
+zip -q -j $ZIP_FILE $LAMBDA_DIR/*_Lambda.py $LAMBDA_DIR/marketplace_*.py
+if [ $? -ne 0 ]; then
+    echo "Error: Failed to package 'Router_Lambda'."
+    exit 1
+fi
+
+echo "Lambda ZIP files successfully built!"
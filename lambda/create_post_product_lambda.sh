@@ -8,6 +8,9 @@ FUNCTION_NAME="createProduct"
 ROLE_NAME="LabRole"
 ZIP_FILE="zip_files/Post_Product_Lambda.zip"
 
+# Fraction of invocations that emit performance metrics (0 disables them)
+METRICS_SAMPLE_RATE="0.1"
+
 # Check if the Lambda function already exists
 if aws lambda get-function --function-name $FUNCTION_NAME >/dev/null 2>&1; then
     echo "Function '$FUNCTION_NAME' already exists."
@@ -23,6 +26,16 @@ if [ -z "$ROLE" ] || [ "$ROLE" == "None" ]; then
     exit 1
 fi
 
+# Pace DynamoDB calls to the table's provisioned capacity (an on-demand table reports 0, which disables pacing)
+READ_CAPACITY=$(aws dynamodb describe-table --table-name MarketPlaceDatabase --query "Table.ProvisionedThroughput.ReadCapacityUnits" --output text 2>/dev/null)
+WRITE_CAPACITY=$(aws dynamodb describe-table --table-name MarketPlaceDatabase --query "Table.ProvisionedThroughput.WriteCapacityUnits" --output text 2>/dev/null)
+if [ -z "$READ_CAPACITY" ] || [ "$READ_CAPACITY" == "None" ]; then
+    READ_CAPACITY="0"
+fi
+if [ -z "$WRITE_CAPACITY" ] || [ "$WRITE_CAPACITY" == "None" ]; then
+    WRITE_CAPACITY="0"
+fi
+
 # Check if the ZIP file exists
 if [ ! -f "$ZIP_FILE" ]; then
     echo "Error: ZIP file '$ZIP_FILE' not found."
@@ -37,6 +50,8 @@ aws lambda create-function \
   --role $ROLE \
   --zip-file fileb://$ZIP_FILE \
   --handler Post_Product_Lambda.lambda_handler \
+  --timeout 30 \
+  --environment "Variables={MARKETPLACE_METRICS_SAMPLE_RATE=$METRICS_SAMPLE_RATE,MARKETPLACE_READ_CAPACITY=$READ_CAPACITY,MARKETPLACE_WRITE_CAPACITY=$WRITE_CAPACITY}" \
   --region us-east-1
 
 # Wait for the function to be created and active
@@ -8,6 +8,9 @@ FUNCTION_NAME="purchaseProduct"
 ROLE_NAME="LabRole"
 ZIP_FILE="zip_files/Post_Purchase_Lambda.zip"
 
+# Fraction of invocations that emit performance metrics (0 disables them)
+METRICS_SAMPLE_RATE="0.1"
+
 # Check if the Lambda function already exists
 if aws lambda get-function --function-name $FUNCTION_NAME >/dev/null 2>&1; then
     echo "Function '$FUNCTION_NAME' already exists."
@@ -23,6 +26,28 @@ if [ -z "$ROLE" ] || [ "$ROLE" == "None" ]; then
     exit 1
 fi
 
+# Resolve the SNS topic ARN once at deploy time so the function does not have to call STS
+ACCOUNT_ID=$(aws sts get-caller-identity --query "Account" --output text)
+TOPIC_ARN="arn:aws:sns:us-east-1:${ACCOUNT_ID}:MarketPlaceTopic"
+
+# Order events are queued for the processOrders function. Without the queue
+# (create_sqs_queue.sh not run) the function sends confirmations itself
+QUEUE_URL=$(aws sqs get-queue-url --queue-name MarketPlaceOrderQueue --query "QueueUrl" --output text 2>/dev/null)
+if [ -z "$QUEUE_URL" ] || [ "$QUEUE_URL" == "None" ]; then
+    echo "Warning: SQS queue 'MarketPlaceOrderQueue' not found, confirmations will be sent synchronously."
+    QUEUE_URL=""
+fi
+
+# Pace DynamoDB calls to the table's provisioned capacity (an on-demand table reports 0, which disables pacing)
+READ_CAPACITY=$(aws dynamodb describe-table --table-name MarketPlaceDatabase --query "Table.ProvisionedThroughput.ReadCapacityUnits" --output text 2>/dev/null)
+WRITE_CAPACITY=$(aws dynamodb describe-table --table-name MarketPlaceDatabase --query "Table.ProvisionedThroughput.WriteCapacityUnits" --output text 2>/dev/null)
+if [ -z "$READ_CAPACITY" ] || [ "$READ_CAPACITY" == "None" ]; then
+    READ_CAPACITY="0"
+fi
+if [ -z "$WRITE_CAPACITY" ] || [ "$WRITE_CAPACITY" == "None" ]; then
+    WRITE_CAPACITY="0"
+fi
+
 # Check if the ZIP file exists
 if [ ! -f "$ZIP_FILE" ]; then
     echo "Error: ZIP file '$ZIP_FILE' not found."
@@ -43,11 +68,12 @@ aws lambda create-function \
 echo "Waiting for function to be active..."
 aws lambda wait function-active --function-name $FUNCTION_NAME
 
-# Update the timeout configuration to 30 seconds
-echo "Setting Lambda function timeout to 30 seconds..."
+# Update the timeout configuration to 30 seconds and set the topic ARN and queue URL
+echo "Setting Lambda function timeout to 30 seconds, topic ARN and queue URL..."
 aws lambda update-function-configuration \
   --function-name $FUNCTION_NAME \
   --timeout 30 \
+  --environment "Variables={MARKETPLACE_TOPIC_ARN=$TOPIC_ARN,MARKETPLACE_ORDER_QUEUE_URL=$QUEUE_URL,MARKETPLACE_METRICS_SAMPLE_RATE=$METRICS_SAMPLE_RATE,MARKETPLACE_READ_CAPACITY=$READ_CAPACITY,MARKETPLACE_WRITE_CAPACITY=$WRITE_CAPACITY}" \
   --region us-east-1
 
 # Publish a new version of the Lambda function
@@ -0,0 +1,91 @@
+#!/bin/bash
+
+# Disable AWS CLI pager
+export AWS_PAGER=""
+
+# Set Lambda function name, role name, and ZIP file
+FUNCTION_NAME="processOrders"
+ROLE_NAME="LabRole"
+ZIP_FILE="zip_files/Process_Orders_Lambda.zip"
+QUEUE_NAME="MarketPlaceOrderQueue"
+
+# Order events handed to one invocation, and how long to wait to fill a batch
+BATCH_SIZE=10
+MAXIMUM_BATCHING_WINDOW=1
+
+# Fraction of invocations that emit performance metrics (0 disables them)
+METRICS_SAMPLE_RATE="0.1"
+
+# Check if the Lambda function already exists
+if aws lambda get-function --function-name $FUNCTION_NAME >/dev/null 2>&1; then
+    echo "Function '$FUNCTION_NAME' already exists."
+    exit 1
+fi    
+
+# Get the IAM role ARN
+ROLE=$(aws iam get-role --role-name $ROLE_NAME --query "Role.Arn" --output text)
+
+# Check if the role exists
+if [ -z "$ROLE" ] || [ "$ROLE" == "None" ]; then
+    echo "IAM role '$ROLE_NAME' not found."
+    exit 1
+fi
+
+# Resolve the SNS topic and SQS queue ARNs once at deploy time
+ACCOUNT_ID=$(aws sts get-caller-identity --query "Account" --output text)
+TOPIC_ARN="arn:aws:sns:us-east-1:${ACCOUNT_ID}:MarketPlaceTopic"
+QUEUE_ARN="arn:aws:sqs:us-east-1:${ACCOUNT_ID}:${QUEUE_NAME}"
+
+# Check that the queue exists
+if ! aws sqs get-queue-url --queue-name $QUEUE_NAME >/dev/null 2>&1; then
+    echo "SQS queue '$QUEUE_NAME' not found. Run create_sqs_queue.sh first."
+    exit 1
+fi
+
+# Pace DynamoDB calls to the table's provisioned capacity (an on-demand table reports 0, which disables pacing)
+READ_CAPACITY=$(aws dynamodb describe-table --table-name MarketPlaceDatabase --query "Table.ProvisionedThroughput.ReadCapacityUnits" --output text 2>/dev/null)
+WRITE_CAPACITY=$(aws dynamodb describe-table --table-name MarketPlaceDatabase --query "Table.ProvisionedThroughput.WriteCapacityUnits" --output text 2>/dev/null)
+if [ -z "$READ_CAPACITY" ] || [ "$READ_CAPACITY" == "None" ]; then
+    READ_CAPACITY="0"
+fi
+if [ -z "$WRITE_CAPACITY" ] || [ "$WRITE_CAPACITY" == "None" ]; then
+    WRITE_CAPACITY="0"
+fi
+
+# Check if the ZIP file exists
+if [ ! -f "$ZIP_FILE" ]; then
+    echo "Error: ZIP file '$ZIP_FILE' not found."
+    exit 1
+fi
+
+# Create the Lambda function
+echo "Creating Lambda function '$FUNCTION_NAME'..."
+aws lambda create-function \
+  --function-name $FUNCTION_NAME \
+  --runtime python3.13 \
+  --role $ROLE \
+  --zip-file fileb://$ZIP_FILE \
+  --handler Process_Orders_Lambda.lambda_handler \
+  --timeout 30 \
+  --environment "Variables={MARKETPLACE_TOPIC_ARN=$TOPIC_ARN,MARKETPLACE_METRICS_SAMPLE_RATE=$METRICS_SAMPLE_RATE,MARKETPLACE_READ_CAPACITY=$READ_CAPACITY,MARKETPLACE_WRITE_CAPACITY=$WRITE_CAPACITY}" \
+  --region us-east-1
+
+# Wait for the function to be created and active
+echo "Waiting for function to be active..."
+aws lambda wait function-active --function-name $FUNCTION_NAME
+
+# Drain the queue in batches, retrying only the order events whose confirmation failed
+echo "Connecting the function to SQS queue '$QUEUE_NAME'..."
+aws lambda create-event-source-mapping \
+  --function-name $FUNCTION_NAME \
+  --event-source-arn $QUEUE_ARN \
+  --batch-size $BATCH_SIZE \
+  --maximum-batching-window-in-seconds $MAXIMUM_BATCHING_WINDOW \
+  --function-response-types ReportBatchItemFailures \
+  --region us-east-1
+
+# Publish a new version of the Lambda function
+echo "Publishing function version..."
+aws lambda publish-version --function-name $FUNCTION_NAME
+
+echo "Lambda function '$FUNCTION_NAME' created and version published successfully!"
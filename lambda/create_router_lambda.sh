@@ -0,0 +1,82 @@
+#!/bin/bash
+
+# Disable AWS CLI pager
+export AWS_PAGER=""
+
+# Set Lambda function name, role name, and ZIP file
+# This one function serves every API route in the routed deployment (DEPLOYMENT_MODE=routed)
+FUNCTION_NAME="marketPlaceRouter"
+ROLE_NAME="LabRole"
+ZIP_FILE="zip_files/Router_Lambda.zip"
+
+# Fraction of invocations that emit performance metrics (0 disables them)
+METRICS_SAMPLE_RATE="0.1"
+
+# S3 bucket holding the catalog snapshot (leave empty to always read DynamoDB).
+# Set it for the deployment, e.g. CATALOG_BUCKET=<bucket-name> ./deploy_lambda_scripts.sh
+CATALOG_BUCKET="${CATALOG_BUCKET:-}"
+
+# Check if the Lambda function already exists
+if aws lambda get-function --function-name $FUNCTION_NAME >/dev/null 2>&1; then
+    echo "Function '$FUNCTION_NAME' already exists."
+    exit 1
+fi
+
+# Get the IAM role ARN
+ROLE=$(aws iam get-role --role-name $ROLE_NAME --query "Role.Arn" --output text)
+
+# Check if the role exists
+if [ -z "$ROLE" ] || [ "$ROLE" == "None" ]; then
+    echo "IAM role '$ROLE_NAME' not found."
+    exit 1
+fi
+
+# Resolve the SNS topic ARN once at deploy time so the function does not have to call STS
+ACCOUNT_ID=$(aws sts get-caller-identity --query "Account" --output text)
+TOPIC_ARN="arn:aws:sns:us-east-1:${ACCOUNT_ID}:MarketPlaceTopic"
+
+# Order events are queued for the processOrders function. Without the queue
+# (create_sqs_queue.sh not run) purchases send confirmations themselves
+QUEUE_URL=$(aws sqs get-queue-url --queue-name MarketPlaceOrderQueue --query "QueueUrl" --output text 2>/dev/null)
+if [ -z "$QUEUE_URL" ] || [ "$QUEUE_URL" == "None" ]; then
+    echo "Warning: SQS queue 'MarketPlaceOrderQueue' not found, confirmations will be sent synchronously."
+    QUEUE_URL=""
+fi
+
+# Pace DynamoDB calls to the table's provisioned capacity (an on-demand table reports 0, which disables pacing)
+READ_CAPACITY=$(aws dynamodb describe-table --table-name MarketPlaceDatabase --query "Table.ProvisionedThroughput.ReadCapacityUnits" --output text 2>/dev/null)
+WRITE_CAPACITY=$(aws dynamodb describe-table --table-name MarketPlaceDatabase --query "Table.ProvisionedThroughput.WriteCapacityUnits" --output text 2>/dev/null)
+if [ -z "$READ_CAPACITY" ] || [ "$READ_CAPACITY" == "None" ]; then
+    READ_CAPACITY="0"
+fi
+if [ -z "$WRITE_CAPACITY" ] || [ "$WRITE_CAPACITY" == "None" ]; then
+    WRITE_CAPACITY="0"
+fi
+
+# Check if the ZIP file exists
+if [ ! -f "$ZIP_FILE" ]; then
+    echo "Error: ZIP file '$ZIP_FILE' not found."
+    exit 1
+fi
+
+# Create the Lambda function
+echo "Creating Lambda function '$FUNCTION_NAME'..."
+aws lambda create-function \
+  --function-name $FUNCTION_NAME \
+  --runtime python3.13 \
+  --role $ROLE \
+  --zip-file fileb://$ZIP_FILE \
+  --handler Router_Lambda.lambda_handler \
+  --timeout 30 \
+  --environment "Variables={MARKETPLACE_TOPIC_ARN=$TOPIC_ARN,MARKETPLACE_ORDER_QUEUE_URL=$QUEUE_URL,MARKETPLACE_CATALOG_BUCKET=$CATALOG_BUCKET,MARKETPLACE_METRICS_SAMPLE_RATE=$METRICS_SAMPLE_RATE,MARKETPLACE_READ_CAPACITY=$READ_CAPACITY,MARKETPLACE_WRITE_CAPACITY=$WRITE_CAPACITY}" \
+  --region us-east-1
+
+# Wait for the function to be created and active
+echo "Waiting for function to be active..."
+aws lambda wait function-active --function-name $FUNCTION_NAME
+
+# Publish a new version of the Lambda function
+echo "Publishing function version..."
+aws lambda publish-version --function-name $FUNCTION_NAME
+
+echo "Lambda function '$FUNCTION_NAME' created and version published successfully!"
@@ -0,0 +1,319 @@
+"""
+Capacity-aware DynamoDB calls for the provisioned 'MarketPlaceDatabase' table.
+
+Importing this module hooks every DynamoDB call made through the shared boto3
+session (see marketplace_common.register_event_handler):
+
+    - Pacing: each container keeps a read and a write token bucket refilled at
+      MARKETPLACE_READ_CAPACITY / MARKETPLACE_WRITE_CAPACITY units per second.
+      A call takes an estimate of its cost before it is sent and is settled
+      with the ConsumedCapacity DynamoDB reports, so a container that runs out
+      of capacity waits (at most MAX_WAIT_SECONDS per call) instead of being
+      throttled. 0, the default, disables pacing, as for an on-demand table.
+    - Backoff: throttled calls (ProvisionedThroughputExceededException and
+      friends) are retried up to THROTTLE_MAX_ATTEMPTS times with jittered
+      exponential backoff, and the bucket is emptied so the other threads of
+      the container slow down too.
+    - Counters: throttles, retries, throttled calls that ran out of retries and
+      the time spent pacing are counted per container (see get_counters), and
+      @instrument adds them to the metrics of sampled invocations.
+
+Decorate a lambda_handler with @throttle_aware to answer 503 with a
+Retry-After header, instead of a 500, when it failed because the table stayed
+throttled.
+"""
+import os
+import time
+import functools
+import threading
+from botocore.exceptions import ClientError
+from marketplace_common import backoff_delay, build_response, register_event_handler
+
+READ_CAPACITY = float(os.environ.get('MARKETPLACE_READ_CAPACITY', '0'))
+WRITE_CAPACITY = float(os.environ.get('MARKETPLACE_WRITE_CAPACITY', '0'))
+
+# Unused capacity a bucket can save up, in seconds of its rate
+BURST_SECONDS = 10
+# Longest a single call waits for capacity. Beyond that the call is sent anyway
+# and the table's own burst capacity or the throttle backoff absorbs it
+MAX_WAIT_SECONDS = 2.0
+
+# Error codes DynamoDB returns when a request exceeds the table's throughput
+THROTTLE_ERROR_CODES = ('ProvisionedThroughputExceededException', 'ThrottlingException',
+                        'RequestLimitExceeded', 'Throttling')
+THROTTLE_MAX_ATTEMPTS = 6
+THROTTLE_BASE_DELAY = 0.1
+THROTTLE_MAX_DELAY = 2.0
+
+# Sent with a 503 so clients wait before retrying
+RETRY_AFTER_SECONDS = 1
+
+READ_OPERATIONS = ('GetItem', 'BatchGetItem', 'TransactGetItems', 'Query', 'Scan')
+WRITE_OPERATIONS = ('PutItem', 'UpdateItem', 'DeleteItem', 'BatchWriteItem', 'TransactWriteItems')
+
+class TokenBucket:
+    """
+    Thread-safe token bucket measured in capacity units.
+
+    Callers take units before they know the exact cost, so the bucket can go
+    into debt. Debt is repaid at the refill rate by making later callers wait.
+    """
+    def __init__(self, rate, burst_seconds=BURST_SECONDS):
+        self.rate = rate
+        self.capacity = rate * burst_seconds
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, units):
+        """
+        Takes units from the bucket, waiting until they are available.
+
+        Args:
+            units (float): The capacity units the caller is about to consume.
+
+        Returns:
+            float: The seconds spent waiting.
+        """
+        with self.lock:
+            self._refill()
+            self.tokens -= units
+            wait = min(MAX_WAIT_SECONDS, -self.tokens / self.rate) if self.tokens < 0 else 0
+            # Debt beyond what the caller waits for is forgiven, so one large call
+            # does not stall every caller after it
+            self.tokens = max(self.tokens, -self.rate * MAX_WAIT_SECONDS)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def settle(self, units):
+        """
+        Gives units back to the bucket, or takes more when units is negative.
+        """
+        with self.lock:
+            self._refill()
+            self.tokens = max(min(self.capacity, self.tokens + units), -self.rate * MAX_WAIT_SECONDS)
+
+    def available(self):
+        """
+        Returns the units currently in the bucket (negative while in debt).
+        """
+        with self.lock:
+            self._refill()
+            return self.tokens
+
+    def drain(self):
+        """
+        Empties the bucket, e.g. after DynamoDB throttled a call.
+        """
+        with self.lock:
+            self._refill()
+            self.tokens = min(self.tokens, 0)
+
+_lock = threading.Lock()
+_buckets = {}
+_counters = {'throttles': 0, 'retries': 0, 'exhausted': 0, 'paced_calls': 0, 'paced_ms': 0.0}
+
+def configure(read_capacity=READ_CAPACITY, write_capacity=WRITE_CAPACITY, burst_seconds=BURST_SECONDS):
+    """
+    Sets the capacity the container paces its DynamoDB calls to.
+
+    Args:
+        read_capacity (float): Read capacity units per second, 0 to disable read pacing.
+        write_capacity (float): Write capacity units per second, 0 to disable write pacing.
+        burst_seconds (float): Unused capacity a bucket can save up, in seconds of its rate.
+    """
+    with _lock:
+        _buckets['read'] = TokenBucket(read_capacity, burst_seconds) if read_capacity > 0 else None
+        _buckets['write'] = TokenBucket(write_capacity, burst_seconds) if write_capacity > 0 else None
+
+def get_counters():
+    """
+    Returns a copy of the container's throttle and retry counters.
+
+    Returns:
+        dict: 'throttles' (throttled responses), 'retries' (retries scheduled
+        after a throttle), 'exhausted' (calls still throttled after the last
+        attempt), 'paced_calls' and 'paced_ms' (calls that waited for capacity
+        and the total wait).
+    """
+    with _lock:
+        return dict(_counters)
+
+def _count(name, amount=1):
+    with _lock:
+        _counters[name] += amount
+
+def _bucket_for(operation):
+    if operation in READ_OPERATIONS:
+        return _buckets.get('read')
+    if operation in WRITE_OPERATIONS:
+        return _buckets.get('write')
+    return None
+
+def estimate_capacity(operation, params):
+    """
+    Estimates the capacity units a DynamoDB call consumes before it is sent.
+
+    Query and Scan are charged for one item; the rest of their cost is settled
+    with the ConsumedCapacity of the response.
+
+    Args:
+        operation (str): The operation name, e.g. 'PutItem'.
+        params (dict): The call's parameters.
+
+    Returns:
+        float: The estimated capacity units.
+    """
+    read_units = 1.0 if params.get('ConsistentRead') else 0.5
+    if operation in ('PutItem', 'UpdateItem', 'DeleteItem'):
+        return 1.0
+    if operation == 'BatchWriteItem':
+        return float(sum(len(requests) for requests in params.get('RequestItems', {}).values()))
+    if operation in ('TransactWriteItems', 'TransactGetItems'):
+        # Transactions consume two units per item
+        return 2.0 * len(params.get('TransactItems', []))
+    if operation == 'BatchGetItem':
+        return 0.5 * sum(len(request.get('Keys', [])) for request in params.get('RequestItems', {}).values())
+    return read_units
+
+def consumed_units(parsed):
+    """
+    Returns the capacity a response consumed from the busiest table or index.
+
+    The table and each of its indexes have their own provisioned throughput, so
+    a product write charged to the table and four indexes costs one unit of
+    any single one of them.
+
+    Args:
+        parsed (dict): The parsed DynamoDB response.
+
+    Returns:
+        float: The consumed capacity units, or None if the response has none.
+    """
+    consumed = parsed.get('ConsumedCapacity')
+    if not consumed:
+        return None
+    if isinstance(consumed, dict):
+        consumed = [consumed]
+    total = 0.0
+    for entry in consumed:
+        units = [entry.get('Table', {}).get('CapacityUnits', 0)]
+        for indexes in (entry.get('GlobalSecondaryIndexes'), entry.get('LocalSecondaryIndexes')):
+            units.extend(index.get('CapacityUnits', 0) for index in (indexes or {}).values())
+        total += max(units) or entry.get('CapacityUnits', 0)
+    return total
+
+def is_throttled(response):
+    """
+    Returns True if a parsed DynamoDB response is a throttling error.
+
+    A transaction canceled only because some of its items were throttled
+    counts as throttled too.
+
+    Args:
+        response (dict): The parsed response, or ClientError.response.
+    """
+    code = response.get('Error', {}).get('Code')
+    if code in THROTTLE_ERROR_CODES:
+        return True
+    if code == 'TransactionCanceledException':
+        reasons = {reason.get('Code') for reason in response.get('CancellationReasons', [])} - {'None', None}
+        return reasons == {'ThrottlingError'}
+    return False
+
+def is_throttle_error(error):
+    """
+    Returns True if an exception is a DynamoDB throttling error.
+    """
+    return isinstance(error, ClientError) and is_throttled(error.response)
+
+def _charge(params, model, context, **kwargs):
+    bucket = _bucket_for(model.name)
+    if bucket is None:
+        return
+    # Report the capacity per table and index, to settle the estimate
+    params['ReturnConsumedCapacity'] = 'INDEXES'
+    estimate = estimate_capacity(model.name, params)
+    context['capacity_charge'] = (bucket, estimate)
+    waited = bucket.acquire(estimate)
+    if waited:
+        with _lock:
+            _counters['paced_calls'] += 1
+            _counters['paced_ms'] += waited * 1000
+
+def _settle(context, parsed=None, **kwargs):
+    if parsed and is_throttled(parsed):
+        _count('exhausted')
+    charge = context.pop('capacity_charge', None)
+    if charge is None:
+        return
+    bucket, estimate = charge
+    # Failed calls consume nothing, calls without ConsumedCapacity keep the estimate
+    used = 0 if not parsed or 'Error' in parsed else consumed_units(parsed)
+    if used is not None:
+        bucket.settle(estimate - used)
+
+def _retry_throttled(response, attempts, operation, caught_exception=None, **kwargs):
+    if caught_exception is not None or response is None or not is_throttled(response[1]):
+        # Anything else is left to the client's standard retry mode
+        return None
+    _count('throttles')
+    bucket = _bucket_for(operation.name)
+    if bucket is not None:
+        bucket.drain()
+    if attempts >= THROTTLE_MAX_ATTEMPTS:
+        return None
+    _count('retries')
+    return backoff_delay(attempts - 1, base=THROTTLE_BASE_DELAY, cap=THROTTLE_MAX_DELAY)
+
+configure()
+for _operation in READ_OPERATIONS + WRITE_OPERATIONS:
+    register_event_handler(f'provide-client-params.dynamodb.{_operation}', _charge)
+register_event_handler('after-call.dynamodb', _settle)
+register_event_handler('after-call-error.dynamodb', _settle)
+# Session handlers are copied to each client before its retry handler, so this
+# one decides first for throttles
+register_event_handler('needs-retry.dynamodb', _retry_throttled)
+
+def throttle_aware(handler):
+    """
+    Decorates a lambda_handler so throttling surfaces as 503 instead of 500.
+
+    A 500 response, or a throttling ClientError raised by the handler, becomes
+    a 503 with a Retry-After header when a DynamoDB call of the invocation was
+    still throttled after its last attempt.
+
+    Args:
+        handler (callable): The Lambda handler.
+
+    Returns:
+        callable: The wrapped handler.
+    """
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        exhausted = _counters['exhausted']
+        try:
+            response = handler(event, context)
+        except ClientError as e:
+            if not is_throttle_error(e):
+                raise
+            print(f"DynamoDB is throttling requests: {e}")
+            return throttled_response()
+        if isinstance(response, dict) and response.get('statusCode') == 500 and _counters['exhausted'] > exhausted:
+            print("DynamoDB is throttling requests, answering 503")
+            return throttled_response()
+        return response
+    return wrapper
+
+def throttled_response():
+    """
+    Builds the 503 response sent when the table is throttling requests.
+    """
+    return build_response(503, {'error': 'The marketplace is busy, please try again shortly'},
+                          headers={'Retry-After': str(RETRY_AFTER_SECONDS)})
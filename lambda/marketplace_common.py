@@ -0,0 +1,734 @@
+"""
+Shared data-access layer for the MarketPlace Lambda functions.
+
+boto3 clients and the DynamoDB table are created lazily and kept at module
+scope, so a warm container reuses the same session, endpoint resolution and
+connection pool across invocations instead of rebuilding them on every request.
+"""
+import os
+import json
+import gzip
+import time
+import base64
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+REGION = os.environ.get('MARKETPLACE_REGION', 'us-east-1')
+TABLE_NAME = os.environ.get('MARKETPLACE_TABLE', 'MarketPlaceDatabase')
+TOPIC_NAME = 'MarketPlaceTopic'
+
+# BatchWriteItem accepts at most 25 requests per call, BatchGetItem at most 100 keys
+BATCH_WRITE_SIZE = 25
+BATCH_WRITE_MAX_ATTEMPTS = 6
+BATCH_GET_SIZE = 100
+
+# Item holding the catalog version counter, bumped on every product create and delete
+CATALOG_VERSION_KEY = {'PK': 'CATALOG#VERSION', 'SK': '#DETAILS'}
+
+# Per-seller product counters are stored as OWNER#<email> / #COUNT items
+OWNER_PREFIX = 'OWNER#'
+OWNER_COUNT_SK = '#COUNT'
+
+# Product changes are listed in update order through the change index (HASH:
+# ChangeFeed, RANGE: UpdatedAt). A deleted or sold product leaves a
+# PRODUCT#<id> / #TOMBSTONE item in the feed until the tombstone expires.
+CHANGE_FEED = 'Catalog'
+TOMBSTONE_SK = '#TOMBSTONE'
+TOMBSTONE_TTL_SECONDS = 7 * 24 * 3600
+# Changes are read from this long before a cursor, so writes that reach the
+# change index late (or come from a container with a slightly slow clock) are not missed
+CURSOR_OVERLAP_MS = 5000
+
+# Layout version of the product items written now (stored as SchemaVersion).
+# tools/migrate_products.py brings items written before up to it.
+PRODUCT_SCHEMA_VERSION = 2
+
+# Headers sent with every API response
+DEFAULT_HEADERS = {
+    'Content-Type': 'application/json',
+    'Access-Control-Allow-Origin': '*'
+}
+
+# Product attributes a client can ask for with 'fields'. ProductID is derived
+# from the PK, the other keys (PK, SK, Type) are internal and never returned.
+PRODUCT_FIELDS = ('ProductID', 'ProductName', 'ProductPrice', 'ProductOwner')
+
+# Prices are stored as DynamoDB numbers rounded to cents, so they sort numerically
+PRICE_QUANTUM = Decimal('0.01')
+MAX_PRICE = Decimal('1000000000')
+
+# Response bodies smaller than this are not worth compressing
+GZIP_MIN_BYTES = 1024
+
+# SNS error codes returned when the cached topic ARN is stale or malformed
+INVALID_TOPIC_ERROR_CODES = ('NotFound', 'InvalidParameter')
+
+# Keep connections open between invocations and allow a few concurrent requests
+# per client (batch and parallel operations share the same pool)
+BOTO_CONFIG = Config(
+    region_name=REGION,
+    max_pool_connections=int(os.environ.get('MARKETPLACE_MAX_POOL_CONNECTIONS', '10')),
+    tcp_keepalive=True,
+    connect_timeout=3,
+    read_timeout=10,
+    retries={'max_attempts': 3, 'mode': 'standard'}
+)
+
+_lock = threading.RLock()
+_session = None
+_clients = {}
+_resources = {}
+_table = None
+_event_handlers = []
+_topic_arn = os.environ.get('MARKETPLACE_TOPIC_ARN') or None
+_cold_start = True
+
+_serializer = TypeSerializer()
+_deserializer = TypeDeserializer()
+
+def get_session():
+    """
+    Returns the boto3 session shared by every client in this container.
+    """
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                session = boto3.session.Session(region_name=REGION)
+                for event_name, handler in _event_handlers:
+                    session.events.register(event_name, handler)
+                _session = session
+    return _session
+
+def register_event_handler(event_name, handler):
+    """
+    Registers a botocore event handler on the shared session.
+
+    The handler is also registered on every session created after a reset().
+    Clients copy the session's handlers when they are created, so register
+    handlers before the first client is requested (e.g. at import time).
+
+    Args:
+        event_name (str): The botocore event, e.g. 'before-call.dynamodb'.
+        handler (callable): The function called with the event's keyword arguments.
+    """
+    with _lock:
+        _event_handlers.append((event_name, handler))
+        if _session is not None:
+            _session.events.register(event_name, handler)
+
+def get_client(service_name):
+    """
+    Returns a cached low-level boto3 client for the given service.
+
+    Args:
+        service_name (str): The AWS service name (e.g. 'sns', 'sts').
+
+    Returns:
+        botocore.client.BaseClient: The shared client.
+    """
+    client = _clients.get(service_name)
+    if client is None:
+        with _lock:
+            client = _clients.get(service_name)
+            if client is None:
+                client = get_session().client(service_name, config=BOTO_CONFIG)
+                _clients[service_name] = client
+    return client
+
+def get_resource(service_name):
+    """
+    Returns a cached boto3 resource for the given service.
+
+    Args:
+        service_name (str): The AWS service name (e.g. 'dynamodb').
+
+    Returns:
+        boto3.resources.base.ServiceResource: The shared resource.
+    """
+    resource = _resources.get(service_name)
+    if resource is None:
+        with _lock:
+            resource = _resources.get(service_name)
+            if resource is None:
+                resource = get_session().resource(service_name, config=BOTO_CONFIG)
+                _resources[service_name] = resource
+    return resource
+
+def get_table():
+    """
+    Returns the shared 'MarketPlaceDatabase' table resource.
+    """
+    global _table
+    if _table is None:
+        _table = get_resource('dynamodb').Table(TABLE_NAME)
+    return _table
+
+def backoff_delay(attempt, base=0.05, cap=2.0):
+    """
+    Returns a jittered exponential backoff delay in seconds.
+
+    Args:
+        attempt (int): The zero-based retry attempt.
+        base (float): The delay of the first retry before jitter.
+        cap (float): The maximum delay before jitter.
+
+    Returns:
+        float: A random delay between 0 and min(cap, base * 2**attempt).
+    """
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+def _write_chunk(client, pending, max_attempts):
+    # Returns the requests of one BatchWriteItem chunk that could not be written
+    for attempt in range(max_attempts):
+        try:
+            response = client.batch_write_item(RequestItems={TABLE_NAME: pending})
+        except ClientError as e:
+            print(f"Error writing batch: {e}")
+            break
+        pending = response.get('UnprocessedItems', {}).get(TABLE_NAME, [])
+        if not pending or attempt == max_attempts - 1:
+            break
+        time.sleep(backoff_delay(attempt))
+    return pending
+
+def batch_write(write_requests, max_attempts=BATCH_WRITE_MAX_ATTEMPTS, max_workers=1):
+    """
+    Writes PutRequest/DeleteRequest entries to the table with BatchWriteItem.
+
+    The requests are sent in chunks of 25. UnprocessedItems are retried with
+    jittered exponential backoff until max_attempts is reached. With
+    max_workers above 1, that many chunks are written at a time; the calls
+    still go through the container's capacity pacing, so more workers do not
+    write faster than the table's capacity.
+
+    Args:
+        write_requests (list): Entries such as {'PutRequest': {'Item': {...}}}.
+        max_attempts (int): The number of calls made per chunk before giving up.
+        max_workers (int): The number of chunks written concurrently.
+
+    Returns:
+        list: The write requests that could not be written.
+    """
+    # The resource's client accepts plain Python values, like table.put_item does
+    client = get_resource('dynamodb').meta.client
+    chunks = [write_requests[start:start + BATCH_WRITE_SIZE] for start in range(0, len(write_requests), BATCH_WRITE_SIZE)]
+    if max_workers > 1 and len(chunks) > 1:
+        # Low-level clients are thread-safe, unlike Table resources
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as executor:
+            results = list(executor.map(lambda chunk: _write_chunk(client, chunk, max_attempts), chunks))
+    else:
+        results = [_write_chunk(client, chunk, max_attempts) for chunk in chunks]
+    return [request for pending in results for request in pending]
+
+def batch_get(keys, projection=None, max_attempts=BATCH_WRITE_MAX_ATTEMPTS):
+    """
+    Reads items by key with BatchGetItem.
+
+    The keys are read in chunks of 100. UnprocessedKeys are retried with
+    jittered exponential backoff until max_attempts is reached.
+
+    Args:
+        keys (list): The PK/SK of each item.
+        projection (dict): 'ProjectionExpression' and 'ExpressionAttributeNames'
+            arguments, as returned by product_projection, or None for whole items.
+        max_attempts (int): The number of calls made per chunk before giving up.
+
+    Returns:
+        tuple: (list of the items found, list of the keys that could not be read).
+
+    Raises:
+        ClientError: If a call fails.
+    """
+    client = get_resource('dynamodb').meta.client
+    items = []
+    unread = []
+    for start in range(0, len(keys), BATCH_GET_SIZE):
+        pending = keys[start:start + BATCH_GET_SIZE]
+        for attempt in range(max_attempts):
+            response = client.batch_get_item(RequestItems={TABLE_NAME: {'Keys': pending, **(projection or {})}})
+            items.extend(response.get('Responses', {}).get(TABLE_NAME, []))
+            pending = response.get('UnprocessedKeys', {}).get(TABLE_NAME, {}).get('Keys', [])
+            if not pending or attempt == max_attempts - 1:
+                break
+            time.sleep(backoff_delay(attempt))
+        unread.extend(pending)
+    return items, unread
+
+def get_catalog_version():
+    """
+    Returns the current catalog version.
+
+    Uses a strongly consistent read so a version bumped by another container
+    is never missed.
+
+    Returns:
+        int: The version counter, 0 if the catalog was never changed.
+    """
+    response = get_table().get_item(Key=CATALOG_VERSION_KEY, ConsistentRead=True)
+    return int(response.get('Item', {}).get('Version', 0))
+
+def bump_catalog_version():
+    """
+    Increments the catalog version so cached product listings are invalidated.
+
+    Errors are logged and swallowed: a missed bump only delays invalidation
+    until the listing caches expire.
+
+    Returns:
+        int: The new version, or None if the update failed.
+    """
+    try:
+        response = get_table().update_item(
+            Key=CATALOG_VERSION_KEY,
+            UpdateExpression='ADD #version :one',
+            ExpressionAttributeNames={'#version': 'Version'},
+            ExpressionAttributeValues={':one': 1},
+            ReturnValues='UPDATED_NEW'
+        )
+        return int(response['Attributes']['Version'])
+    except Exception as e:
+        print(f"Error bumping catalog version: {e}")
+        return None
+
+def owner_count_key(owner):
+    """
+    Returns the key of the item holding a seller's product count.
+
+    Args:
+        owner (str): The product owner.
+
+    Returns:
+        dict: The PK/SK of the counter item.
+    """
+    return {'PK': f'{OWNER_PREFIX}{owner}', 'SK': OWNER_COUNT_SK}
+
+def get_owner_count(owner):
+    """
+    Returns the number of products a seller has listed.
+
+    Args:
+        owner (str): The product owner.
+
+    Returns:
+        int: The product count, 0 if the seller never listed a product.
+    """
+    response = get_table().get_item(Key=owner_count_key(owner))
+    return int(response.get('Item', {}).get('ProductCount', 0))
+
+def adjust_owner_counts(deltas):
+    """
+    Adds to the product counts of several sellers.
+
+    Errors are logged and swallowed, like catalog version bumps: a missed
+    update leaves the count off until tools/rebuild_owner_counts.py is run.
+
+    Args:
+        deltas (dict): The change of each owner's count, e.g. {'a@b.com': 3}.
+
+    Returns:
+        bool: True if every count was updated, False otherwise.
+    """
+    updated = True
+    for owner, delta in deltas.items():
+        if not delta:
+            continue
+        try:
+            get_table().update_item(
+                Key=owner_count_key(owner),
+                UpdateExpression='ADD #count :delta',
+                ExpressionAttributeNames={'#count': 'ProductCount'},
+                ExpressionAttributeValues={':delta': delta}
+            )
+        except Exception as e:
+            print(f"Error updating product count of {owner}: {e}")
+            updated = False
+    return updated
+
+def change_timestamp():
+    """
+    Returns the UpdatedAt value of a change made now.
+
+    Returns:
+        int: The current time in epoch milliseconds.
+    """
+    return int(time.time() * 1000)
+
+def build_tombstone_item(product_id, updated_at):
+    """
+    Builds the item that records a deleted product in the change feed.
+
+    Args:
+        product_id (str): The ID of the deleted product.
+        updated_at (int): The time of the delete, as returned by change_timestamp.
+
+    Returns:
+        dict: The item to write to 'MarketPlaceDatabase'. It has no Type, so it
+        stays out of every product index but the change index.
+    """
+    return {
+        'PK': f'PRODUCT#{product_id}',
+        'SK': TOMBSTONE_SK,
+        'ChangeFeed': CHANGE_FEED,
+        'UpdatedAt': updated_at,
+        'ExpiresAt': updated_at // 1000 + TOMBSTONE_TTL_SECONDS
+    }
+
+def record_tombstones(product_ids, max_workers=1):
+    """
+    Records deleted products in the change feed, so clients syncing the catalog drop them.
+
+    Errors are logged and swallowed, like catalog version bumps: a missed
+    tombstone only leaves the product in clients' lists until they reload the
+    whole catalog.
+
+    Args:
+        product_ids (list): The IDs of the deleted products.
+        max_workers (int): The number of BatchWriteItem chunks written concurrently.
+
+    Returns:
+        bool: True if every tombstone was written, False otherwise.
+    """
+    updated_at = change_timestamp()
+    write_requests = [{'PutRequest': {'Item': build_tombstone_item(product_id, updated_at)}} for product_id in product_ids]
+    try:
+        failed = batch_write(write_requests, max_workers=max_workers)
+    except Exception as e:
+        print(f"Error recording tombstones: {e}")
+        return False
+    if failed:
+        print(f"Failed to record {len(failed)} tombstones")
+        return False
+    return True
+
+def parse_price(value):
+    """
+    Normalizes a price sent by a client to the number stored in the table.
+
+    Args:
+        value (str|int|float|Decimal): The price, e.g. '19.99', 19.99 or '$5'.
+
+    Returns:
+        Decimal: The price rounded to cents.
+
+    Raises:
+        ValueError: If the value is not a number between 0 and MAX_PRICE.
+    """
+    if value is None or isinstance(value, bool):
+        raise ValueError("price must be a number")
+    try:
+        price = Decimal(str(value).strip().lstrip('$'))
+    except InvalidOperation:
+        raise ValueError(f"Invalid price: {value}")
+    if not price.is_finite() or price < 0 or price > MAX_PRICE:
+        raise ValueError(f"price must be between 0 and {MAX_PRICE}")
+    return price.quantize(PRICE_QUANTUM, rounding=ROUND_HALF_UP)
+
+def get_header(event, name):
+    """
+    Returns a request header from the event, ignoring the header name's case.
+
+    Args:
+        event (dict): The event data passed to the Lambda function.
+        name (str): The header name.
+
+    Returns:
+        str: The header value, or None if the header is missing.
+    """
+    headers = event.get('headers') or {}
+    name = name.lower()
+    for header_name, value in headers.items():
+        if header_name.lower() == name:
+            return value or None
+    return None
+
+def _encode_decimal(value):
+    # DynamoDB returns every number as a Decimal. Integers are emitted exactly as
+    # ints. Any decimal with at most 15 significant digits survives the conversion
+    # to float unchanged (repr gives back the same digits), so only longer values
+    # need to fall back to a string to avoid losing precision.
+    if isinstance(value, Decimal):
+        if value == value.to_integral_value():
+            return int(value)
+        if len(value.as_tuple().digits) <= 15:
+            return float(value)
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def json_dumps(value):
+    """
+    Serializes a value to compact JSON, including DynamoDB Decimal numbers.
+
+    Args:
+        value: The value to serialize.
+
+    Returns:
+        str: The JSON text.
+    """
+    return json.dumps(value, default=_encode_decimal, separators=(',', ':'))
+
+def encode_next_token(last_evaluated_key):
+    """
+    Encodes a DynamoDB LastEvaluatedKey as an opaque continuation token.
+
+    Args:
+        last_evaluated_key (dict): The LastEvaluatedKey returned by a query, or None.
+
+    Returns:
+        str: A URL-safe token, or None when there are no more pages.
+    """
+    if not last_evaluated_key:
+        return None
+    wire_key = {name: _serializer.serialize(value) for name, value in last_evaluated_key.items()}
+    raw = json.dumps(wire_key, separators=(',', ':'), sort_keys=True).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+def decode_next_token(next_token):
+    """
+    Decodes a continuation token produced by encode_next_token.
+
+    Args:
+        next_token (str): The token sent back by the client.
+
+    Returns:
+        dict: The ExclusiveStartKey to resume the query from.
+
+    Raises:
+        ValueError: If the token is malformed.
+    """
+    try:
+        wire_key = json.loads(base64.urlsafe_b64decode(next_token.encode('ascii')))
+        return {name: _deserializer.deserialize(value) for name, value in wire_key.items()}
+    except Exception as e:
+        raise ValueError(f"Invalid next_token: {e}")
+
+def parse_limit(limit, default, maximum):
+    """
+    Validates a requested page size.
+
+    Args:
+        limit (str|int): The page size sent by the client, or None for the default.
+        default (int): The page size used when no limit is given.
+        maximum (int): The largest page size allowed.
+
+    Returns:
+        int: A page size between 1 and maximum.
+
+    Raises:
+        ValueError: If the limit is not a positive integer.
+    """
+    if limit in (None, ''):
+        return default
+    limit = int(limit)
+    if limit < 1:
+        raise ValueError("limit must be a positive integer")
+    return min(limit, maximum)
+
+def parse_fields(fields):
+    """
+    Validates the product attributes requested with the 'fields' parameter.
+
+    Args:
+        fields (str|list): A comma-separated string or a list of attribute names,
+            or None for every field in PRODUCT_FIELDS.
+
+    Returns:
+        tuple: The requested fields, in PRODUCT_FIELDS order.
+
+    Raises:
+        ValueError: If a field is not in PRODUCT_FIELDS.
+    """
+    if fields in (None, '', []):
+        return PRODUCT_FIELDS
+    if isinstance(fields, str):
+        fields = fields.split(',')
+    requested = {str(field).strip() for field in fields} - {''}
+    unknown = requested - set(PRODUCT_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}. Allowed fields: {', '.join(PRODUCT_FIELDS)}")
+    return tuple(field for field in PRODUCT_FIELDS if field in requested) or PRODUCT_FIELDS
+
+def product_projection(fields):
+    """
+    Builds the ProjectionExpression that reads only the requested product fields.
+
+    Args:
+        fields (tuple): Fields returned by parse_fields.
+
+    Returns:
+        dict: 'ProjectionExpression' and 'ExpressionAttributeNames' arguments for
+        get_item, query or scan.
+    """
+    # ProductID is read from the PK
+    attributes = ['PK' if field == 'ProductID' else field for field in fields]
+    names = {f'#{name.lower()}': name for name in attributes}
+    return {
+        'ProjectionExpression': ', '.join(names),
+        'ExpressionAttributeNames': names
+    }
+
+def public_product(item, fields=PRODUCT_FIELDS):
+    """
+    Converts a product item to the representation returned by the API.
+
+    Args:
+        item (dict): The product item read from the table.
+        fields (tuple): Fields returned by parse_fields.
+
+    Returns:
+        dict: The requested fields that the item has, without internal keys.
+    """
+    product = {}
+    for field in fields:
+        if field == 'ProductID':
+            if 'PK' in item:
+                product['ProductID'] = item['PK'].split('#', 1)[1]
+        elif field in item:
+            product[field] = item[field]
+    return product
+
+def accepts_gzip(event):
+    """
+    Returns True if the client sent 'Accept-Encoding: gzip'.
+    """
+    return 'gzip' in (get_header(event, 'Accept-Encoding') or '').lower()
+
+def gzip_body(body):
+    """
+    Compresses a response body for API Gateway.
+
+    Args:
+        body (str): The response body.
+
+    Returns:
+        str: The base64-encoded gzip data.
+    """
+    return base64.b64encode(gzip.compress(body.encode('utf-8'), compresslevel=6)).decode('ascii')
+
+def build_response(status_code, body=None, event=None, headers=None, gzipped_body=None):
+    """
+    Builds an API Gateway response.
+
+    Bodies of at least GZIP_MIN_BYTES are gzip'd and base64-encoded when the
+    request in event accepts gzip.
+
+    Args:
+        status_code (int): The HTTP status code.
+        body: A value to serialize as JSON, an already serialized string, or None for no body.
+        event (dict): The request event, used to check Accept-Encoding.
+        headers (dict): Headers to add to the default ones.
+        gzipped_body (str): The result of gzip_body(body), if the caller already has it.
+
+    Returns:
+        dict: A dictionary containing the status code, response body, and headers.
+    """
+    if body is None:
+        body = ''
+    elif not isinstance(body, str):
+        body = json_dumps(body)
+
+    response_headers = dict(DEFAULT_HEADERS)
+    if headers:
+        response_headers.update(headers)
+    response = {
+        'statusCode': status_code,
+        'body': body,
+        'headers': response_headers
+    }
+
+    if event is not None and len(body) >= GZIP_MIN_BYTES and accepts_gzip(event):
+        response['body'] = gzipped_body or gzip_body(body)
+        response['isBase64Encoded'] = True
+        response_headers['Content-Encoding'] = 'gzip'
+        response_headers['Vary'] = 'Accept-Encoding'
+    return response
+
+def get_topic_arn(refresh=False):
+    """
+    Returns the ARN of the 'MarketPlaceTopic' SNS topic.
+
+    The ARN comes from the MARKETPLACE_TOPIC_ARN environment variable when it is
+    set. Otherwise it is built from the account ID, which is fetched from STS once
+    per container and then cached.
+
+    Args:
+        refresh (bool): Ignore the cached value and resolve the ARN through STS again.
+
+    Returns:
+        str: The topic ARN.
+
+    Raises:
+        ValueError: If STS returns an empty account ID.
+    """
+    global _topic_arn
+    if refresh or _topic_arn is None:
+        account_id = get_client('sts').get_caller_identity().get('Account')
+        if not account_id:
+            raise ValueError("Account ID is empty.")
+        _topic_arn = f'arn:aws:sns:{REGION}:{account_id}:{TOPIC_NAME}'
+    return _topic_arn
+
+def call_with_topic_arn(operation, **kwargs):
+    """
+    Calls an SNS operation on the MarketPlace topic using the cached topic ARN.
+
+    If SNS rejects the topic, the ARN is resolved again through STS and the call
+    is retried once.
+
+    Args:
+        operation (callable): A bound SNS client method, e.g. sns_client.publish.
+        **kwargs: Arguments for the operation, other than TopicArn.
+
+    Returns:
+        dict: The response from SNS.
+    """
+    try:
+        return operation(TopicArn=get_topic_arn(), **kwargs)
+    except ClientError as e:
+        if e.response['Error']['Code'] not in INVALID_TOPIC_ERROR_CODES:
+            raise
+        print(f"Topic ARN rejected, resolving it again: {e}")
+        return operation(TopicArn=get_topic_arn(refresh=True), **kwargs)
+
+def log_cold_start(context):
+    """
+    Logs whether this invocation is the first one in its container.
+
+    The structured log line lets CloudWatch Logs Insights split invocation
+    latency into cold and warm starts.
+
+    Args:
+        context (object): The context object passed to the Lambda function.
+
+    Returns:
+        bool: True on the first invocation in this container, False afterwards.
+    """
+    global _cold_start
+    cold_start, _cold_start = _cold_start, False
+    print(json.dumps({
+        'message': 'Invocation started',
+        'function': getattr(context, 'function_name', None),
+        'cold_start': cold_start
+    }))
+    return cold_start
+
+def reset():
+    """
+    Drops every cached client and marks the container as cold again.
+
+    Used by local tooling that swaps the AWS backend between runs.
+    """
+    global _session, _table, _topic_arn, _cold_start
+    with _lock:
+        _session = None
+        _table = None
+        _topic_arn = os.environ.get('MARKETPLACE_TOPIC_ARN') or None
+        _clients.clear()
+        _resources.clear()
+        _cold_start = True
@@ -0,0 +1,159 @@
+"""
+Idempotency-Key support for the Lambda handlers that create things.
+
+Decorate a lambda_handler with @idempotent so a request carrying an
+'Idempotency-Key' header is only executed once per key. The first request
+claims the key with a conditional put of
+
+    PK: IDEMPOTENCY#<function>#<key>
+    SK: #DETAILS
+
+and stores its response there when it finishes. A retry with the same key then
+gets the stored response back (with an 'Idempotent-Replayed: true' header)
+instead of creating a second product or order. Server errors are not stored,
+so a request that failed can be retried with the same key.
+
+Records expire after MARKETPLACE_IDEMPOTENCY_TTL seconds (24 hours by default)
+through the table's TTL on 'ExpiresAt'. Requests without the header behave as
+before.
+"""
+import os
+import json
+import time
+import hashlib
+import functools
+from botocore.exceptions import ClientError
+from boto3.dynamodb.types import TypeDeserializer
+from marketplace_common import build_response, get_header, get_table
+
+IDEMPOTENCY_PREFIX = 'IDEMPOTENCY#'
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+
+TTL_SECONDS = int(os.environ.get('MARKETPLACE_IDEMPOTENCY_TTL', str(24 * 60 * 60)))
+# A claim older than this belongs to an invocation that timed out or crashed
+# (the Lambda functions time out after 30 seconds), so the key can be claimed again
+IN_PROGRESS_SECONDS = 60
+
+_deserializer = TypeDeserializer()
+
+def request_hash(event):
+    """
+    Hashes the request data of an event, without its headers.
+
+    Args:
+        event (dict): The event data passed to the Lambda function.
+
+    Returns:
+        str: The SHA-256 hex digest of the request data.
+    """
+    payload = {name: value for name, value in event.items() if name != 'headers'}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+def claim_key(record_key, fingerprint, now):
+    """
+    Claims an idempotency key for the current request.
+
+    Args:
+        record_key (dict): The PK/SK of the idempotency record.
+        fingerprint (str): The request hash, as returned by request_hash.
+        now (int): The current time in epoch seconds.
+
+    Returns:
+        dict: None if the key was claimed, otherwise the existing record.
+    """
+    try:
+        get_table().put_item(
+            Item={
+                **record_key,
+                'Status': 'IN_PROGRESS',
+                'RequestHash': fingerprint,
+                'LockedUntil': now + IN_PROGRESS_SECONDS,
+                'ExpiresAt': now + TTL_SECONDS
+            },
+            # Expired records may linger until the TTL deletes them, so they count as missing
+            ConditionExpression=('attribute_not_exists(PK) OR ExpiresAt < :now '
+                                 'OR (#status = :in_progress AND LockedUntil < :now)'),
+            ExpressionAttributeNames={'#status': 'Status'},
+            ExpressionAttributeValues={':now': now, ':in_progress': 'IN_PROGRESS'},
+            ReturnValuesOnConditionCheckFailure='ALL_OLD'
+        )
+        return None
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            # Error responses are not converted by the table resource
+            item = e.response.get('Item') or {}
+            return {name: _deserializer.deserialize(value) for name, value in item.items()}
+        raise
+
+def replay(record, fingerprint):
+    """
+    Builds the response to a request whose key is already claimed.
+
+    Args:
+        record (dict): The existing idempotency record, deserialized.
+        fingerprint (str): The request hash of the current request.
+
+    Returns:
+        dict: The stored response, or an error response.
+    """
+    if record.get('RequestHash') != fingerprint:
+        return build_response(422, {'error': f'{IDEMPOTENCY_HEADER} was already used for a different request'})
+    if record.get('Status') != 'COMPLETED':
+        return build_response(409, {'error': f'A request with this {IDEMPOTENCY_HEADER} is still in progress'})
+    response = json.loads(record['Response'])
+    response['headers'] = {**(response.get('headers') or {}), REPLAYED_HEADER: 'true'}
+    return response
+
+def idempotent(handler):
+    """
+    Decorates a lambda_handler so requests with an Idempotency-Key run only once.
+
+    Errors reading or writing the idempotency record are logged and the request
+    runs without protection, like a request without the header.
+
+    Args:
+        handler (callable): The Lambda handler.
+
+    Returns:
+        callable: The wrapped handler.
+    """
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        key = get_header(event, IDEMPOTENCY_HEADER)
+        if key is None:
+            return handler(event, context)
+        if len(key) > MAX_KEY_LENGTH:
+            return build_response(400, {'error': f'{IDEMPOTENCY_HEADER} must be at most {MAX_KEY_LENGTH} characters'})
+
+        record_key = {'PK': f'{IDEMPOTENCY_PREFIX}{handler.__module__}#{key}', 'SK': '#DETAILS'}
+        fingerprint = request_hash(event)
+        try:
+            record = claim_key(record_key, fingerprint, int(time.time()))
+        except Exception as e:
+            print(f"Error claiming idempotency key: {e}")
+            return handler(event, context)
+        if record is not None:
+            print(f"Idempotency key {key} was already used, not running the request again")
+            return replay(record, fingerprint)
+
+        response = None
+        try:
+            response = handler(event, context)
+            return response
+        finally:
+            try:
+                if isinstance(response, dict) and response.get('statusCode', 500) < 500:
+                    get_table().update_item(
+                        Key=record_key,
+                        UpdateExpression='SET #status = :completed, #response = :response REMOVE LockedUntil',
+                        ExpressionAttributeNames={'#status': 'Status', '#response': 'Response'},
+                        ExpressionAttributeValues={':completed': 'COMPLETED', ':response': json.dumps(response)}
+                    )
+                else:
+                    # Release the key so the client can retry after a server error
+                    get_table().delete_item(Key=record_key)
+            except Exception as e:
+                print(f"Error saving idempotency record: {e}")
+    return wrapper
@@ -0,0 +1,193 @@
+"""
+Per-invocation performance metrics in CloudWatch Embedded Metric Format (EMF).
+
+Decorate a lambda_handler with @instrument to log, for a sampled fraction of
+invocations, one structured line with the handler latency, cold start, response
+size and the duration of every AWS call made through the shared boto3 session,
+plus the DynamoDB consumed capacity, item counts and throttling (see
+marketplace_capacity). CloudWatch turns the line into metrics without any extra
+API call.
+
+MARKETPLACE_METRICS_SAMPLE_RATE sets the sampled fraction (0 to 1). It defaults
+to 0, which leaves every invocation untouched apart from one random() call.
+"""
+import os
+import json
+import time
+import random
+import functools
+from marketplace_common import register_event_handler
+from marketplace_capacity import get_counters
+
+NAMESPACE = os.environ.get('MARKETPLACE_METRICS_NAMESPACE', 'MarketPlace')
+SAMPLE_RATE = float(os.environ.get('MARKETPLACE_METRICS_SAMPLE_RATE', '0'))
+
+# Metric name prefix per botocore service id
+SERVICE_PREFIXES = {'dynamodb': 'DynamoDB', 'sns': 'SNS', 'sts': 'STS', 's3': 'S3', 'sqs': 'SQS'}
+
+# DynamoDB operations that accept ReturnConsumedCapacity
+CAPACITY_OPERATIONS = ('GetItem', 'PutItem', 'UpdateItem', 'DeleteItem', 'Query', 'Scan',
+                       'BatchGetItem', 'BatchWriteItem', 'TransactGetItems', 'TransactWriteItems')
+
+# Calls recorded for the current sampled invocation, None when it is not sampled
+_calls = None
+_cold_start = True
+
+def _before_call(model, context, **kwargs):
+    if _calls is not None:
+        # after-call-error does not receive the model, so keep the names with the start time
+        context['metrics_call'] = (model.service_model.service_id.hyphenize(), model.name, time.perf_counter())
+
+def _after_call(context, parsed=None, exception=None, **kwargs):
+    if _calls is None or 'metrics_call' not in context:
+        return
+    service, operation, started = context.pop('metrics_call')
+    call = {
+        'service': service,
+        'operation': operation,
+        'duration_ms': round((time.perf_counter() - started) * 1000, 3)
+    }
+    if exception is not None:
+        call['error'] = type(exception).__name__
+    elif parsed:
+        if 'Error' in parsed:
+            call['error'] = parsed['Error'].get('Code')
+        consumed = parsed.get('ConsumedCapacity')
+        if consumed:
+            if isinstance(consumed, dict):
+                consumed = [consumed]
+            call['consumed_capacity'] = sum(entry.get('CapacityUnits', 0) for entry in consumed)
+        if 'Count' in parsed:
+            call['count'] = parsed['Count']
+            call['scanned_count'] = parsed.get('ScannedCount', parsed['Count'])
+    # list.append is atomic, so calls from worker threads are recorded safely
+    _calls.append(call)
+
+def _request_capacity(params, **kwargs):
+    if _calls is not None:
+        params.setdefault('ReturnConsumedCapacity', 'TOTAL')
+
+register_event_handler('before-call', _before_call)
+register_event_handler('after-call', _after_call)
+register_event_handler('after-call-error', _after_call)
+for _operation in CAPACITY_OPERATIONS:
+    register_event_handler(f'provide-client-params.dynamodb.{_operation}', _request_capacity)
+
+def build_metrics_record(function_name, latency_ms, cold_start, response_bytes, calls, error=None, capacity=None):
+    """
+    Builds the EMF log record of one invocation.
+
+    Args:
+        function_name (str): The Lambda function name, used as the metric dimension.
+        latency_ms (float): The handler latency.
+        cold_start (bool): Whether this was the first invocation in the container.
+        response_bytes (int): The size of the response body.
+        calls (list): The AWS calls recorded during the invocation.
+        error (str): The exception type if the handler raised one.
+        capacity (dict): The change of the marketplace_capacity counters during
+            the invocation.
+
+    Returns:
+        dict: The record to log as one JSON line.
+    """
+    metrics = [
+        {'Name': 'Latency', 'Unit': 'Milliseconds'},
+        {'Name': 'ColdStart', 'Unit': 'Count'},
+        {'Name': 'ResponseBytes', 'Unit': 'Bytes'},
+        {'Name': 'Errors', 'Unit': 'Count'}
+    ]
+    record = {
+        'FunctionName': function_name,
+        'Latency': round(latency_ms, 3),
+        'ColdStart': int(cold_start),
+        'ResponseBytes': response_bytes,
+        'Errors': int(error is not None),
+        'Calls': calls
+    }
+    if error is not None:
+        record['Error'] = error
+
+    # One metric per service with every call duration (EMF accepts value arrays)
+    durations = {}
+    for call in calls:
+        prefix = SERVICE_PREFIXES.get(call['service'], call['service'].upper())
+        durations.setdefault(f'{prefix}CallLatency', []).append(call['duration_ms'])
+    for name, values in durations.items():
+        metrics.append({'Name': name, 'Unit': 'Milliseconds'})
+        record[name] = values
+
+    dynamodb_calls = [call for call in calls if call['service'] == 'dynamodb']
+    if dynamodb_calls:
+        metrics.extend([
+            {'Name': 'DynamoDBConsumedCapacity', 'Unit': 'Count'},
+            {'Name': 'DynamoDBItemsReturned', 'Unit': 'Count'},
+            {'Name': 'DynamoDBItemsScanned', 'Unit': 'Count'}
+        ])
+        record['DynamoDBConsumedCapacity'] = sum(call.get('consumed_capacity', 0) for call in dynamodb_calls)
+        record['DynamoDBItemsReturned'] = sum(call.get('count', 0) for call in dynamodb_calls)
+        record['DynamoDBItemsScanned'] = sum(call.get('scanned_count', 0) for call in dynamodb_calls)
+
+    if capacity:
+        metrics.extend([
+            {'Name': 'DynamoDBThrottles', 'Unit': 'Count'},
+            {'Name': 'DynamoDBRetries', 'Unit': 'Count'},
+            {'Name': 'DynamoDBPacedTime', 'Unit': 'Milliseconds'}
+        ])
+        record['DynamoDBThrottles'] = capacity['throttles']
+        record['DynamoDBRetries'] = capacity['retries']
+        record['DynamoDBPacedTime'] = round(capacity['paced_ms'], 3)
+
+    record['_aws'] = {
+        'Timestamp': int(time.time() * 1000),
+        'CloudWatchMetrics': [{
+            'Namespace': NAMESPACE,
+            'Dimensions': [['FunctionName']],
+            'Metrics': metrics
+        }]
+    }
+    return record
+
+def instrument(handler):
+    """
+    Decorates a lambda_handler so sampled invocations log EMF metrics.
+
+    Args:
+        handler (callable): The Lambda handler.
+
+    Returns:
+        callable: The wrapped handler.
+    """
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        global _calls, _cold_start
+        cold_start, _cold_start = _cold_start, False
+        if SAMPLE_RATE <= 0 or random.random() >= SAMPLE_RATE:
+            return handler(event, context)
+
+        calls = _calls = []
+        counters = get_counters()
+        started = time.perf_counter()
+        response = None
+        error = None
+        try:
+            response = handler(event, context)
+            return response
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            latency_ms = (time.perf_counter() - started) * 1000
+            _calls = None
+            capacity = {name: value - counters[name] for name, value in get_counters().items()}
+            body = response.get('body') if isinstance(response, dict) else None
+            record = build_metrics_record(
+                function_name=getattr(context, 'function_name', None) or handler.__module__,
+                latency_ms=latency_ms,
+                cold_start=cold_start,
+                response_bytes=len(body.encode('utf-8')) if isinstance(body, str) else 0,
+                calls=calls,
+                error=error,
+                capacity=capacity
+            )
+            print(json.dumps(record, separators=(',', ':')))
+    return wrapper
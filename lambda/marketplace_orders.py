@@ -0,0 +1,256 @@
+"""
+Order records and the work that follows a purchase.
+
+A purchase is committed by Post_Purchase_Lambda with one DynamoDB transaction
+that writes the order item
+
+    PK: ORDER#<order id>
+    SK: #DETAILS
+
+and deletes every purchased PRODUCT# item on the condition that it still has
+the name, price and owner the buyer saw, so two buyers can never both win the
+same product.
+
+The rest (removing the products from the search index and emailing the
+confirmation) does not have to finish before the buyer gets an answer. It is
+queued as an order event on the SQS queue in MARKETPLACE_ORDER_QUEUE_URL and handled in batches by Process_Orders_Lambda.
+Without a queue, or if it cannot be reached, the same work runs inline.
+"""
+import os
+import json
+from decimal import Decimal
+from marketplace_common import call_with_topic_arn, get_client, json_dumps
+from marketplace_search import unindex_products
+
+ORDER_PREFIX = 'ORDER#'
+ORDER_QUEUE_URL = os.environ.get('MARKETPLACE_ORDER_QUEUE_URL') or None
+
+# TransactWriteItems accepts up to 100 actions, and the order item takes one
+MAX_ORDER_ITEMS = 99
+
+# SNS accepts up to 256 KiB per message and per PublishBatch call, and up to 10 entries per PublishBatch call
+MAX_MESSAGE_BYTES = 250 * 1024
+PUBLISH_BATCH_SIZE = 10
+
+def build_order_item(order_id, buyer, products, created_at):
+    """
+    Builds the DynamoDB item stored for an order.
+
+    Args:
+        order_id (str): The unique ID of the order.
+        buyer (str): The email address of the buyer.
+        products (list): The purchased products, with 'ProductID', 'ProductName',
+            'ProductPrice' and 'ProductOwner'.
+        created_at (str): The ISO 8601 time of the purchase.
+
+    Returns:
+        dict: The item to write to 'MarketPlaceDatabase'.
+    """
+    return {
+        'PK': f'{ORDER_PREFIX}{order_id}',
+        'SK': '#DETAILS',
+        'Type': 'Order',
+        'Buyer': buyer,
+        'Items': products,
+        'Total': sum((Decimal(product['ProductPrice']) for product in products), Decimal(0)),
+        'Status': 'CONFIRMED',
+        'CreatedAt': created_at
+    }
+
+def order_event(order_item):
+    """
+    Builds the event queued for an order.
+
+    Args:
+        order_item (dict): The order item, as returned by build_order_item.
+
+    Returns:
+        dict: The order ID, buyer, purchased products and total.
+    """
+    return {
+        'order_id': order_item['PK'][len(ORDER_PREFIX):],
+        'buyer': order_item['Buyer'],
+        'items': order_item['Items'],
+        'total': order_item['Total']
+    }
+
+def format_price(price):
+    """
+    Formats a price for a confirmation message.
+
+    Args:
+        price (Decimal|int|float|str): The price.
+
+    Returns:
+        str: The price with two decimals, e.g. '19.90'.
+    """
+    return f"{Decimal(str(price)):.2f}"
+
+def split_message(header, lines):
+    """
+    Splits the lines of a confirmation message into messages that fit in SNS limits.
+
+    Args:
+        header (str): The text that starts every message.
+        lines (list): The lines to distribute over the messages.
+
+    Returns:
+        list: The message strings.
+    """
+    messages = []
+    current = header
+    for line in lines:
+        candidate = f"{current}\n{line}"
+        if current != header and len(candidate.encode('utf-8')) > MAX_MESSAGE_BYTES:
+            messages.append(current)
+            candidate = f"{header}\n{line}"
+        current = candidate
+    messages.append(current)
+    return messages
+
+def build_confirmation(order):
+    """
+    Builds the confirmation messages of an order.
+
+    Args:
+        order (dict): The order event.
+
+    Returns:
+        list: Dictionaries with the 'Subject' and 'Message' of each SNS message.
+    """
+    items = order['items']
+    if len(items) == 1:
+        product_name = items[0]['ProductName']
+        return [{
+            'Subject': f"Purchase Confirmation for {product_name}",
+            'Message': f"Thank you for purchasing {product_name} for ${format_price(items[0]['ProductPrice'])}. "
+                       f"Your purchase has been confirmed."
+        }]
+
+    lines = [f"- {item['ProductName']} for ${format_price(item['ProductPrice'])}" for item in items]
+    lines.append(f"Total: ${format_price(order['total'])}")
+    header = f"Thank you for your purchase of {len(items)} products. Your purchase has been confirmed:"
+    subject = f"Purchase Confirmation for {len(items)} products"
+    messages = split_message(header, lines)
+    if len(messages) == 1:
+        return [{'Subject': subject, 'Message': messages[0]}]
+    return [{'Subject': f"{subject} ({index + 1}/{len(messages)})", 'Message': message}
+            for index, message in enumerate(messages)]
+
+def publish_confirmations(orders):
+    """
+    Emails the confirmation of several orders with as few SNS calls as possible.
+
+    A single message is sent with publish, anything more is grouped into
+    PublishBatch calls of up to 10 entries and 256 KiB.
+
+    Args:
+        orders (list): The order events.
+
+    Returns:
+        set: The IDs of the orders whose confirmation could not be sent.
+    """
+    entries = []
+    for order in orders:
+        for message in build_confirmation(order):
+            entries.append({'Id': f"{len(entries)}", 'order_id': order['order_id'], **message})
+    if not entries:
+        return set()
+
+    sns_client = get_client('sns')
+    if len(entries) == 1:
+        try:
+            call_with_topic_arn(sns_client.publish, Message=entries[0]['Message'], Subject=entries[0]['Subject'])
+            return set()
+        except Exception as e:
+            print(f"Error sending notification: {e}")
+            return {entries[0]['order_id']}
+
+    batches = [[]]
+    batch_bytes = 0
+    for entry in entries:
+        message_bytes = len(entry['Message'].encode('utf-8'))
+        if len(batches[-1]) == PUBLISH_BATCH_SIZE or batch_bytes + message_bytes > MAX_MESSAGE_BYTES:
+            batches.append([])
+            batch_bytes = 0
+        batches[-1].append(entry)
+        batch_bytes += message_bytes
+
+    order_ids = {entry['Id']: entry['order_id'] for entry in entries}
+    failed = set()
+    for batch in batches:
+        try:
+            response = call_with_topic_arn(
+                sns_client.publish_batch,
+                PublishBatchRequestEntries=[
+                    {'Id': entry['Id'], 'Message': entry['Message'], 'Subject': entry['Subject']} for entry in batch
+                ]
+            )
+        except Exception as e:
+            print(f"Error sending notifications: {e}")
+            failed.update(entry['order_id'] for entry in batch)
+            continue
+        if response.get('Failed'):
+            print(f"Failed to publish messages: {response['Failed']}")
+            failed.update(order_ids[entry['Id']] for entry in response['Failed'])
+    return failed
+
+def finish_orders(orders):
+    """
+    Removes the products sold by several orders from the search index.
+
+    The update is idempotent, so an order event handled twice does no harm. The
+    catalog snapshot needs no update: readers drop the sold products through
+    the tombstones the purchase recorded.
+
+    Args:
+        orders (list): The order events.
+    """
+    sold = [{'PK': f"PRODUCT#{item['ProductID']}", 'ProductName': item['ProductName']}
+            for order in orders for item in order['items']]
+    if sold:
+        unindex_products(sold)
+
+def process_orders(orders):
+    """
+    Does all the work that follows several purchases.
+
+    Args:
+        orders (list): The order events.
+
+    Returns:
+        set: The IDs of the orders whose confirmation could not be sent.
+    """
+    finish_orders(orders)
+    return publish_confirmations(orders)
+
+def enqueue_order(order):
+    """
+    Queues an order event for Process_Orders_Lambda.
+
+    Args:
+        order (dict): The order event.
+
+    Returns:
+        bool: True if the event was queued, False if there is no queue or sending failed.
+    """
+    if ORDER_QUEUE_URL is None:
+        return False
+    try:
+        get_client('sqs').send_message(QueueUrl=ORDER_QUEUE_URL, MessageBody=json_dumps(order))
+        return True
+    except Exception as e:
+        print(f"Error queueing order {order['order_id']}: {e}")
+        return False
+
+def parse_order_event(body):
+    """
+    Parses an order event received from the queue.
+
+    Args:
+        body (str): The SQS message body.
+
+    Returns:
+        dict: The order event, with prices as Decimal.
+    """
+    return json.loads(body, parse_float=Decimal, parse_int=Decimal)
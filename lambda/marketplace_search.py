@@ -0,0 +1,173 @@
+"""
+Prefix index for product search, stored in 'MarketPlaceDatabase'.
+
+Every word of a product name is indexed under its prefixes of PREFIX_LENGTHS
+characters (a word shorter than all of them, e.g. 'tv', under itself), and each
+prefix gets one item in the prefix's partition:
+
+    PK: TOKEN#<prefix>
+    SK: <rank>#<name length>#<lowercase product name>#<product id>
+
+where rank is 0 if the prefix is a whole word of the name and 1 otherwise.
+Querying TOKEN#<prefix> therefore returns whole-word matches first, then
+prefix matches, each group with the shortest (closest) names first. A query
+word is looked up under its longest indexed prefix, and matches of the longer
+word are picked out by name. The items carry a copy of the product under
+'Product' (a map, so none of the secondary indexes pick it up) so results need
+no second read.
+
+Every index item costs a write when a product is created or deleted, so only
+a few prefix lengths are indexed: a word takes at most len(PREFIX_LENGTHS)
+items, where indexing every prefix took up to 11. Reading a shorter prefix's
+partition costs far less, since a read unit covers many small items.
+
+The product Lambdas keep the index up to date. Run tools/build_search_index.py
+to index products created before the index existed.
+"""
+import re
+from marketplace_common import batch_write
+
+TOKEN_PREFIX = 'TOKEN#'
+
+# Words shorter than this are not indexed, and shorter prefixes would put most
+# of the catalog in one partition
+MIN_PREFIX_LENGTH = 2
+# Prefix lengths that get index items; longer query words are matched on their
+# first MAX_PREFIX_LENGTH characters and then compared with the full product name
+PREFIX_LENGTHS = (3, 5, 8)
+MAX_PREFIX_LENGTH = PREFIX_LENGTHS[-1]
+# Characters of the product name kept in an item's sort key (which DynamoDB
+# limits to 1 KB); the full name is in the item's product copy
+MAX_SORT_KEY_NAME_LENGTH = 64
+
+_word_pattern = re.compile(r'[^\W_]+')
+
+def tokenize(text):
+    """
+    Splits text into lowercase words.
+
+    Args:
+        text (str): A product name or search query.
+
+    Returns:
+        list: The distinct words, in order of appearance.
+    """
+    words = []
+    for word in _word_pattern.findall(str(text).lower()):
+        if word not in words:
+            words.append(word)
+    return words
+
+def index_prefix(word):
+    """
+    Returns the prefix under which a query word is looked up.
+
+    Args:
+        word (str): A lowercase query word.
+
+    Returns:
+        str: The word truncated to the longest indexed prefix length it reaches,
+        or the word itself if it is shorter than all of them.
+    """
+    lengths = [length for length in PREFIX_LENGTHS if length <= len(word)]
+    return word[:lengths[-1]] if lengths else word
+
+def index_keys(product):
+    """
+    Builds the keys of every index item of a product.
+
+    Args:
+        product (dict): The product item, with PK and ProductName.
+
+    Returns:
+        list: The PK/SK of each index item, one per distinct prefix.
+    """
+    name = str(product.get('ProductName', ''))
+    product_id = product['PK'].split('#', 1)[1]
+    ranks = {}
+    for word in tokenize(name):
+        if len(word) < MIN_PREFIX_LENGTH:
+            continue
+        prefixes = {word[:length] for length in PREFIX_LENGTHS if length <= len(word)} or {word}
+        for prefix in prefixes:
+            # A prefix shared by several words keeps its best rank
+            rank = 0 if prefix == word else 1
+            ranks[prefix] = min(rank, ranks.get(prefix, rank))
+    sort_name = name.lower()[:MAX_SORT_KEY_NAME_LENGTH]
+    return [
+        {'PK': f'{TOKEN_PREFIX}{prefix}', 'SK': f'{rank}#{len(name):04d}#{sort_name}#{product_id}'}
+        for prefix, rank in ranks.items()
+    ]
+
+def index_items(product):
+    """
+    Builds every index item of a product.
+
+    Args:
+        product (dict): The product item.
+
+    Returns:
+        list: The items to write.
+    """
+    copy = {
+        'ProductID': product['PK'].split('#', 1)[1],
+        'ProductName': product.get('ProductName'),
+        'ProductPrice': product.get('ProductPrice'),
+        'ProductOwner': product.get('ProductOwner')
+    }
+    return [{**key, 'Product': copy} for key in index_keys(product)]
+
+def index_products(products):
+    """
+    Adds products to the search index.
+
+    Errors are logged and swallowed: a missing entry only hides the product
+    from search until tools/build_search_index.py is run again.
+
+    Args:
+        products (list): The product items that were created.
+
+    Returns:
+        bool: True if every index item was written, False otherwise.
+    """
+    write_requests = [{'PutRequest': {'Item': item}} for product in products for item in index_items(product)]
+    return _write_index(write_requests)
+
+def unindex_products(products):
+    """
+    Removes products from the search index.
+
+    Args:
+        products (list): The product items that were deleted (at least PK and ProductName).
+
+    Returns:
+        bool: True if every index item was deleted, False otherwise.
+    """
+    write_requests = [{'DeleteRequest': {'Key': key}} for product in products for key in index_keys(product)]
+    return _write_index(write_requests)
+
+def _write_index(write_requests):
+    if not write_requests:
+        return True
+    try:
+        failed = batch_write(write_requests)
+    except Exception as e:
+        print(f"Error updating search index: {e}")
+        return False
+    if failed:
+        print(f"Failed to update {len(failed)} search index items.")
+    return not failed
+
+def matches(product_name, words):
+    """
+    Returns True if every query word is a prefix of a word in the product name.
+
+    Args:
+        product_name (str): The product name.
+        words (list): The lowercase query words.
+
+    Returns:
+        bool: Whether the product matches the query.
+    """
+    name_words = tokenize(product_name)
+    return all(any(name_word.startswith(word) for name_word in name_words) for word in words)
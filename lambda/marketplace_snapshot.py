@@ -0,0 +1,241 @@
+"""
+Precomputed product catalog stored as a gzip'd JSON object in S3.
+
+The snapshot is built with a parallel segmented scan and records the 'cursor'
+it was taken at. Writes do not touch it: readers merge the products created
+and deleted since (read from the change index) into it, so listing the
+catalog costs one S3 GET and a small query instead of a DynamoDB read per
+page view. Once COMPACT_CHANGES changes have piled up, or the snapshot is
+COMPACT_AGE_MS old, the reader writes the merged catalog back, so the object
+is rewritten at most once per batch of changes rather than on every write.
+
+Set MARKETPLACE_CATALOG_BUCKET to enable it. The S3 and DynamoDB clients come
+from marketplace_common, so the code runs unchanged against a local stand-in
+(moto, LocalStack) by setting AWS_ENDPOINT_URL.
+"""
+import os
+import json
+import gzip
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError
+from boto3.dynamodb.conditions import Key
+from marketplace_common import (CHANGE_FEED, CURSOR_OVERLAP_MS, TABLE_NAME, TOMBSTONE_SK, TOMBSTONE_TTL_SECONDS,
+                                change_timestamp, get_client, get_resource, get_table, json_dumps)
+
+CATALOG_BUCKET = os.environ.get('MARKETPLACE_CATALOG_BUCKET') or None
+CATALOG_KEY = os.environ.get('MARKETPLACE_CATALOG_KEY', 'catalog/products.json.gz')
+
+DEFAULT_SEGMENTS = 8
+
+# Secondary index keyed on the change feed and update time (HASH: ChangeFeed, RANGE: UpdatedAt)
+CHANGE_INDEX = 'ChangeIndex'
+# A reader writes the merged catalog back once this many changes were merged, or
+# once the snapshot is this old, so the changes to merge stay few
+COMPACT_CHANGES = 100
+COMPACT_AGE_MS = 60 * 60 * 1000
+# Older snapshots are not used: the change feed may have dropped deletions since
+MAX_AGE_MS = (TOMBSTONE_TTL_SECONDS - 24 * 60 * 60) * 1000
+
+def is_enabled():
+    """
+    Returns True if a catalog bucket is configured.
+    """
+    return CATALOG_BUCKET is not None
+
+def scan_segment(segment, total_segments):
+    """
+    Reads every product in one segment of a parallel scan.
+
+    Args:
+        segment (int): The segment to read.
+        total_segments (int): The number of segments the table is split into.
+
+    Returns:
+        list: The product items in this segment.
+    """
+    # Low-level clients are thread-safe, unlike Table resources
+    client = get_resource('dynamodb').meta.client
+    scan_kwargs = {
+        'TableName': TABLE_NAME,
+        'Segment': segment,
+        'TotalSegments': total_segments,
+        'FilterExpression': '#type = :product',
+        'ExpressionAttributeNames': {'#type': 'Type'},
+        'ExpressionAttributeValues': {':product': 'Product'}
+    }
+    items = []
+    while True:
+        response = client.scan(**scan_kwargs)
+        items.extend(response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            return items
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def scan_products(total_segments=DEFAULT_SEGMENTS, max_workers=None):
+    """
+    Reads every product with a parallel segmented scan.
+
+    Args:
+        total_segments (int): The number of scan segments.
+        max_workers (int): The size of the worker pool (defaults to one worker per segment).
+
+    Returns:
+        list: All product items, sorted by key.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers or total_segments) as executor:
+        segments = executor.map(lambda segment: scan_segment(segment, total_segments), range(total_segments))
+        products = [item for items in segments for item in items]
+    products.sort(key=lambda item: item['PK'])
+    return products
+
+def read_snapshot():
+    """
+    Downloads the current catalog snapshot.
+
+    Returns:
+        tuple: (snapshot dict, S3 ETag), or None if no snapshot exists.
+    """
+    try:
+        response = get_client('s3').get_object(Bucket=CATALOG_BUCKET, Key=CATALOG_KEY)
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+            return None
+        raise
+    snapshot = json.loads(gzip.decompress(response['Body'].read()))
+    return snapshot, response['ETag']
+
+def write_snapshot(products, if_match=None, cursor=None):
+    """
+    Uploads a catalog snapshot.
+
+    Args:
+        products (list): The product items in the catalog.
+        if_match (str): Only overwrite the object if it still has this ETag.
+        cursor (int): The change timestamp the products are current as of.
+
+    Returns:
+        dict: The snapshot that was written.
+    """
+    snapshot = {
+        'generated_at': datetime.now(timezone.utc).isoformat(),
+        'cursor': cursor,
+        'count': len(products),
+        'products': products
+    }
+    body = gzip.compress(json_dumps(snapshot).encode('utf-8'))
+    put_kwargs = {
+        'Bucket': CATALOG_BUCKET,
+        'Key': CATALOG_KEY,
+        'Body': body,
+        'ContentType': 'application/json',
+        'ContentEncoding': 'gzip',
+        'CacheControl': 'no-cache'
+    }
+    if if_match:
+        put_kwargs['IfMatch'] = if_match
+    get_client('s3').put_object(**put_kwargs)
+    return snapshot
+
+def build_snapshot(total_segments=DEFAULT_SEGMENTS, max_workers=None):
+    """
+    Rebuilds the catalog snapshot from the table.
+
+    Args:
+        total_segments (int): The number of scan segments.
+        max_workers (int): The size of the worker pool.
+
+    Returns:
+        dict: The snapshot that was written.
+    """
+    # Taken before scanning, so changes made during the scan are merged again
+    cursor = change_timestamp()
+    return write_snapshot(scan_products(total_segments=total_segments, max_workers=max_workers), cursor=cursor)
+
+def read_changes(since):
+    """
+    Reads the products created and deleted after a cursor from the change index.
+
+    Args:
+        since (int): The cursor, in epoch milliseconds.
+
+    Returns:
+        tuple: (list of product items created since, set of PK values of products deleted since).
+    """
+    query_kwargs = {
+        'IndexName': CHANGE_INDEX,
+        'KeyConditionExpression': Key('ChangeFeed').eq(CHANGE_FEED) & Key('UpdatedAt').gt(since - CURSOR_OVERLAP_MS)
+    }
+    upserts = {}
+    deletes = set()
+    while True:
+        response = get_table().query(**query_kwargs)
+        for item in response.get('Items', []):
+            if item.get('SK') == TOMBSTONE_SK:
+                deletes.add(item['PK'])
+            else:
+                upserts[item['PK']] = item
+        if 'LastEvaluatedKey' not in response:
+            return list(upserts.values()), deletes
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def read_catalog():
+    """
+    Returns the current catalog: the snapshot with the changes since it was taken merged in.
+
+    Writes the merged catalog back (see COMPACT_CHANGES) when enough changed
+    since the snapshot was taken.
+
+    Returns:
+        list: Every product item, sorted by key, or None if there is no snapshot
+        or it is too old to bring up to date.
+    """
+    current = read_snapshot()
+    if current is None:
+        return None
+    snapshot, etag = current
+    cursor = snapshot.get('cursor')
+    # Taken before the changes are read, so the merged catalog is current as of it
+    now = change_timestamp()
+    if cursor is None or now - cursor > MAX_AGE_MS:
+        print("Catalog snapshot is too old to bring up to date, rebuild it with tools/build_catalog_snapshot.py.")
+        return None
+
+    upserts, deletes = read_changes(cursor)
+    products = {item['PK']: item for item in snapshot['products']}
+    # Changes read again because of the overlap are already in the snapshot and do not count
+    changes = sum(1 for item in upserts if item['PK'] not in products and item['PK'] not in deletes)
+    changes += sum(1 for key in deletes if key in products)
+    products.update((item['PK'], item) for item in upserts)
+    for key in deletes:
+        products.pop(key, None)
+    products = sorted(products.values(), key=lambda item: item['PK'])
+
+    if changes >= COMPACT_CHANGES or now - cursor >= COMPACT_AGE_MS:
+        compact_snapshot(products, etag, now)
+    return products
+
+def compact_snapshot(products, etag, cursor):
+    """
+    Writes a merged catalog back, unless another container already replaced the snapshot.
+
+    Errors are logged and swallowed: the changes are merged again on the next read.
+
+    Args:
+        products (list): The merged product items.
+        etag (str): The S3 ETag of the snapshot the changes were merged into.
+        cursor (int): The change timestamp the products are current as of.
+
+    Returns:
+        bool: True if the snapshot was rewritten, False otherwise.
+    """
+    try:
+        write_snapshot(products, if_match=etag, cursor=cursor)
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] not in ('PreconditionFailed', 'ConditionalRequestConflict'):
+            print(f"Error compacting catalog snapshot: {e}")
+        return False
+    except Exception as e:
+        print(f"Error compacting catalog snapshot: {e}")
+        return False
@@ -0,0 +1,45 @@
+"""
+Builds the catalog snapshot served by the getAllProducts Lambda.
+
+Reads every product from 'MarketPlaceDatabase' with a parallel segmented scan
+and writes a gzip'd JSON catalog to the S3 bucket, with the time of the scan as
+its cursor. The listing merges later changes from the change index and rewrites
+the snapshot as they pile up, so this only needs to run once, after upgrading,
+or when the snapshot is too old for the change index to cover.
+
+Usage:
+    python tools/build_catalog_snapshot.py --bucket <bucket-name> [--segments 8] [--workers 8]
+
+Set AWS_ENDPOINT_URL to run against a local S3/DynamoDB stand-in.
+"""
+import os
+import sys
+import time
+import argparse
+
+parser = argparse.ArgumentParser(description="Build the product catalog snapshot in S3.")
+parser.add_argument('--bucket', help="S3 bucket for the snapshot (defaults to MARKETPLACE_CATALOG_BUCKET)")
+parser.add_argument('--segments', type=int, default=8, help="number of parallel scan segments")
+parser.add_argument('--workers', type=int, default=None, help="size of the worker pool (defaults to --segments)")
+
+def main():
+    args = parser.parse_args()
+    if args.bucket:
+        os.environ['MARKETPLACE_CATALOG_BUCKET'] = args.bucket
+
+    # Imported after the bucket is set, since the module reads it at import time
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda'))
+    import marketplace_snapshot
+
+    if not marketplace_snapshot.is_enabled():
+        print("Error: No bucket given. Use --bucket or set MARKETPLACE_CATALOG_BUCKET.")
+        sys.exit(1)
+
+    started = time.perf_counter()
+    snapshot = marketplace_snapshot.build_snapshot(total_segments=args.segments, max_workers=args.workers)
+    elapsed = time.perf_counter() - started
+    print(f"Wrote {snapshot['count']} products to s3://{marketplace_snapshot.CATALOG_BUCKET}/"
+          f"{marketplace_snapshot.CATALOG_KEY} in {elapsed:.2f}s.")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Builds the product search index in 'MarketPlaceDatabase'.
+
+Reads every product with a parallel segmented scan and writes its TOKEN#<prefix>
+items. The Lambda functions keep the index up to date on every create and
+delete afterwards, so this only needs to run once for products created before
+the search endpoint was deployed. Writing an item that already exists is
+harmless, so the tool can be re-run at any time.
+
+With --prune it also deletes the index items that the current index layout
+(marketplace_search.PREFIX_LENGTHS) no longer uses, e.g. after it changed.
+Whether an item is stale is decided from the product copy it carries, so
+products created while the tool runs keep their items.
+
+Usage:
+    python tools/build_search_index.py [--segments 8] [--workers 8] [--prune]
+
+Set AWS_ENDPOINT_URL to run against a local DynamoDB stand-in, and
+MARKETPLACE_WRITE_CAPACITY to pace the writes to a provisioned table's write
+capacity. Throttled writes are retried with backoff either way.
+"""
+import os
+import sys
+import time
+import argparse
+from boto3.dynamodb.conditions import Attr
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda'))
+
+import marketplace_capacity  # noqa: F401
+from marketplace_common import batch_write, get_table
+from marketplace_search import TOKEN_PREFIX, index_items, index_keys, index_products
+from marketplace_snapshot import scan_products
+
+# Products indexed per batch, so progress is reported on large catalogs
+PRODUCTS_PER_BATCH = 500
+
+parser = argparse.ArgumentParser(description="Build the product search index.")
+parser.add_argument('--segments', type=int, default=8, help="number of parallel scan segments")
+parser.add_argument('--workers', type=int, default=None, help="size of the worker pool (defaults to --segments)")
+parser.add_argument('--prune', action='store_true', help="delete index items of an earlier index layout")
+
+def prune_index():
+    """
+    Deletes the index items that index_keys no longer produces for their product.
+
+    Returns:
+        tuple: (items deleted, items that could not be deleted).
+    """
+    scan_kwargs = {
+        'FilterExpression': Attr('PK').begins_with(TOKEN_PREFIX),
+        'ProjectionExpression': 'PK, SK, Product'
+    }
+    deleted = failed = 0
+    while True:
+        response = get_table().scan(**scan_kwargs)
+        stale = []
+        for item in response.get('Items', []):
+            product = item.get('Product') or {}
+            product_id = product.get('ProductID')
+            current = index_keys({'PK': f'PRODUCT#{product_id}', 'ProductName': product.get('ProductName', '')}) \
+                if product_id else []
+            if {'PK': item['PK'], 'SK': item['SK']} not in current:
+                stale.append({'DeleteRequest': {'Key': {'PK': item['PK'], 'SK': item['SK']}}})
+        if stale:
+            unprocessed = len(batch_write(stale))
+            deleted += len(stale) - unprocessed
+            failed += unprocessed
+        if 'LastEvaluatedKey' not in response:
+            return deleted, failed
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def main():
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    products = scan_products(total_segments=args.segments, max_workers=args.workers)
+    print(f"Read {len(products)} products in {time.perf_counter() - started:.2f}s.")
+
+    written = 0
+    failed_batches = 0
+    for start in range(0, len(products), PRODUCTS_PER_BATCH):
+        batch = products[start:start + PRODUCTS_PER_BATCH]
+        if not index_products(batch):
+            failed_batches += 1
+        written += sum(len(index_items(product)) for product in batch)
+        print(f"Indexed {min(start + PRODUCTS_PER_BATCH, len(products))}/{len(products)} products.")
+
+    print(f"Wrote {written} index items in {time.perf_counter() - started:.2f}s.")
+
+    pruned_failed = 0
+    if args.prune:
+        pruned, pruned_failed = prune_index()
+        print(f"Deleted {pruned} stale index items in {time.perf_counter() - started:.2f}s.")
+
+    if failed_batches or pruned_failed:
+        if failed_batches:
+            print(f"Error: {failed_batches} batches had items that could not be written. Run the tool again.")
+        if pruned_failed:
+            print(f"Error: {pruned_failed} stale index items could not be deleted. Run the tool again with --prune.")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
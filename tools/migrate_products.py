@@ -0,0 +1,352 @@
+"""
+Migrates the PRODUCT# items in 'MarketPlaceDatabase' to the current schema version.
+
+Each product item records the schema version it was written with in
+SchemaVersion (items without it are version 0). Post_Product_Lambda writes
+items at PRODUCT_SCHEMA_VERSION; this tool brings older items up to it by
+applying, in order, every transform newer than the item:
+
+    1  normalize_price     ProductPrice stored as a number rounded to cents,
+                           which puts the product in the price index
+    2  stamp_change_feed   ChangeFeed/UpdatedAt set, which puts the product in
+                           the change index (legacy products get UpdatedAt 0,
+                           so syncing clients do not see the backfill as a change)
+
+The table is read with a parallel segmented scan on a thread pool. Every item
+is rewritten with a conditional update that only succeeds if the item still
+has the version and the values the transforms read, so the Lambda functions
+can keep serving (and deleting) products while the tool runs; an item changed
+meanwhile is counted as a conflict and left alone. Products with a price that
+cannot be normalized are reported and left at their version. Products whose
+price changed are written to the search index again (one write per search
+prefix of the name), since its entries keep a copy of the price.
+
+Reads and writes are paced to --read-capacity and --write-capacity units per
+second (the table is provisioned with 5 of each, so the defaults leave room
+for the live traffic), and throttled calls are retried with backoff.
+
+After every scan page the segment's LastEvaluatedKey is saved to the
+--checkpoint file, so an interrupted run (Ctrl-C, lost connection) picks up
+where it stopped when started again. Pass --restart to scan from the start,
+e.g. to retry the items that failed.
+
+Usage:
+    python tools/migrate_products.py [--segments 8] [--workers 8] [--read-capacity 2] [--write-capacity 2]
+        [--page-size 100] [--checkpoint migrate_products.json] [--restart] [--dry-run]
+
+Set AWS_ENDPOINT_URL to run against a local DynamoDB stand-in.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from decimal import Decimal
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda'))
+
+from botocore.exceptions import ClientError
+import marketplace_capacity
+import marketplace_snapshot
+from marketplace_common import (CHANGE_FEED, PRODUCT_SCHEMA_VERSION, TABLE_NAME, bump_catalog_version, decode_next_token,
+                                encode_next_token, get_resource, parse_price)
+from marketplace_search import index_products
+
+COUNTERS = ('scanned', 'migrated', 'conflicts', 'invalid', 'failed')
+
+# Seconds between progress reports
+PROGRESS_INTERVAL = 10
+
+parser = argparse.ArgumentParser(description="Migrate the product items to the current schema version.")
+parser.add_argument('--segments', type=int, default=8, help="number of parallel scan segments")
+parser.add_argument('--workers', type=int, default=None, help="size of the worker pool (defaults to --segments)")
+parser.add_argument('--read-capacity', type=float, default=2, help="read capacity units per second to use")
+parser.add_argument('--write-capacity', type=float, default=2, help="write capacity units per second to use")
+parser.add_argument('--page-size', type=int, default=100, help="items read per scan call (and per checkpoint)")
+parser.add_argument('--checkpoint', default='migrate_products.json', help="file the scan position is saved to")
+parser.add_argument('--restart', action='store_true', help="ignore the checkpoint and scan from the start")
+parser.add_argument('--dry-run', action='store_true', help="count the items to migrate without writing them")
+
+def normalize_price(item):
+    """
+    Stores the price as a number rounded to cents.
+
+    Raises:
+        ValueError: If the price is not a valid number.
+    """
+    price = item.get('ProductPrice')
+    normalized = parse_price(price)
+    if isinstance(price, Decimal) and price == normalized:
+        return {}
+    return {'ProductPrice': normalized}
+
+def stamp_change_feed(item):
+    """
+    Puts the product in the change index.
+    """
+    updates = {}
+    if item.get('ChangeFeed') != CHANGE_FEED:
+        updates['ChangeFeed'] = CHANGE_FEED
+    if 'UpdatedAt' not in item:
+        updates['UpdatedAt'] = 0
+    return updates
+
+# (version, name, transform) in version order, ending at PRODUCT_SCHEMA_VERSION.
+# A transform returns the attributes to set, and must give the same result
+# when applied again.
+TRANSFORMS = (
+    (1, 'normalize_price', normalize_price),
+    (2, 'stamp_change_feed', stamp_change_feed)
+)
+
+class Checkpoint:
+    """
+    The scan position and counters of every segment, saved to a JSON file
+    (or only kept in memory when path is None).
+    """
+    def __init__(self, path, total_segments, restart=False):
+        self.path = path
+        self.lock = threading.Lock()
+        self.state = None
+        if path is not None and not restart and os.path.exists(path):
+            with open(path) as f:
+                self.state = json.load(f)
+            if self.state.get('version') != PRODUCT_SCHEMA_VERSION or self.state.get('total_segments') != total_segments:
+                raise ValueError(f"{path} was written for version {self.state.get('version')} with "
+                                 f"{self.state.get('total_segments')} segments. Pass the same --segments or --restart.")
+        if self.state is None:
+            self.state = {
+                'version': PRODUCT_SCHEMA_VERSION,
+                'total_segments': total_segments,
+                'segments': {str(segment): {'last_key': None, 'done': False, 'counts': dict.fromkeys(COUNTERS, 0)}
+                             for segment in range(total_segments)}
+            }
+
+    def segment(self, segment):
+        """
+        Returns a copy of a segment's state.
+        """
+        with self.lock:
+            return json.loads(json.dumps(self.state['segments'][str(segment)]))
+
+    def update(self, segment, last_key, counts):
+        """
+        Records a processed scan page and saves the checkpoint.
+
+        Args:
+            segment (int): The segment.
+            last_key (str): The encoded LastEvaluatedKey, or None once the segment is done.
+            counts (dict): The counters of the page, added to the segment's.
+        """
+        with self.lock:
+            state = self.state['segments'][str(segment)]
+            state['last_key'] = last_key
+            state['done'] = last_key is None
+            for name, value in counts.items():
+                state['counts'][name] += value
+            if self.path is None:
+                return
+            # Written to a temporary file first, so an interrupted save keeps the previous checkpoint
+            temporary = f'{self.path}.tmp'
+            with open(temporary, 'w') as f:
+                json.dump(self.state, f, indent=2)
+            os.replace(temporary, self.path)
+
+    def totals(self):
+        """
+        Returns the counters summed over every segment, and the number of finished segments.
+        """
+        with self.lock:
+            segments = self.state['segments'].values()
+            totals = {name: sum(state['counts'][name] for state in segments) for name in COUNTERS}
+            return totals, sum(1 for state in segments if state['done'])
+
+def plan_item(item):
+    """
+    Applies the transforms newer than an item's schema version.
+
+    Args:
+        item (dict): The product item.
+
+    Returns:
+        tuple: (the attributes to set, the migrated item).
+
+    Raises:
+        ValueError: If a transform cannot migrate the item.
+    """
+    current = int(item.get('SchemaVersion', 0))
+    updates = {}
+    migrated = dict(item)
+    for version, _, transform in TRANSFORMS:
+        if version > current:
+            changes = transform(migrated)
+            updates.update(changes)
+            migrated.update(changes)
+    return updates, migrated
+
+def migrate_item(client, item, dry_run=False):
+    """
+    Rewrites one product item at PRODUCT_SCHEMA_VERSION with a conditional update.
+
+    The update only succeeds if the item still exists with the schema version
+    and the attribute values the transforms read.
+
+    Args:
+        client (botocore.client.BaseClient): The DynamoDB client of the table resource.
+        item (dict): The product item, as scanned.
+        dry_run (bool): Only check that the item can be migrated.
+
+    Returns:
+        str: The counter to increment: 'migrated', 'conflicts', 'invalid' or 'failed'.
+    """
+    try:
+        updates, migrated = plan_item(item)
+    except ValueError as e:
+        print(f"Cannot migrate {item['PK']}: {e}")
+        return 'invalid'
+    if dry_run:
+        return 'migrated'
+
+    names = {'#version': 'SchemaVersion'}
+    values = {':version': PRODUCT_SCHEMA_VERSION}
+    assignments = ['#version = :version']
+    conditions = ['attribute_exists(PK)']
+    if 'SchemaVersion' in item:
+        conditions.append('#version = :current')
+        values[':current'] = item['SchemaVersion']
+    else:
+        conditions.append('attribute_not_exists(#version)')
+    for index, (name, value) in enumerate(updates.items()):
+        names[f'#attr{index}'] = name
+        values[f':new{index}'] = value
+        assignments.append(f'#attr{index} = :new{index}')
+        if name in item:
+            conditions.append(f'#attr{index} = :old{index}')
+            values[f':old{index}'] = item[name]
+        else:
+            conditions.append(f'attribute_not_exists(#attr{index})')
+
+    try:
+        client.update_item(
+            TableName=TABLE_NAME,
+            Key={'PK': item['PK'], 'SK': item['SK']},
+            UpdateExpression='SET ' + ', '.join(assignments),
+            ConditionExpression=' AND '.join(conditions),
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return 'conflicts'
+        print(f"Error migrating {item['PK']}: {e}")
+        return 'failed'
+
+    # The search index keeps a copy of the price
+    if 'ProductPrice' in updates:
+        index_products([migrated])
+    return 'migrated'
+
+def migrate_segment(segment, checkpoint, args, stop):
+    """
+    Migrates the items of one scan segment, resuming from its checkpoint.
+
+    Args:
+        segment (int): The segment to migrate.
+        checkpoint (Checkpoint): The saved scan positions.
+        args (argparse.Namespace): The command line arguments.
+        stop (threading.Event): Set to stop after the current page.
+    """
+    state = checkpoint.segment(segment)
+    if state['done']:
+        return
+
+    # Low-level clients are thread-safe, unlike Table resources
+    client = get_resource('dynamodb').meta.client
+    scan_kwargs = {
+        'TableName': TABLE_NAME,
+        'Segment': segment,
+        'TotalSegments': args.segments,
+        'Limit': args.page_size,
+        # Items already at the current version are read but not returned
+        'FilterExpression': 'begins_with(PK, :product) AND SK = :details AND '
+                            '(attribute_not_exists(#version) OR #version < :version)',
+        'ExpressionAttributeNames': {'#version': 'SchemaVersion'},
+        'ExpressionAttributeValues': {':product': 'PRODUCT#', ':details': '#DETAILS', ':version': PRODUCT_SCHEMA_VERSION}
+    }
+    last_key = state['last_key']
+    while not stop.is_set():
+        if last_key:
+            scan_kwargs['ExclusiveStartKey'] = decode_next_token(last_key)
+        response = client.scan(**scan_kwargs)
+        counts = dict.fromkeys(COUNTERS, 0)
+        counts['scanned'] = response.get('ScannedCount', 0)
+        for item in response.get('Items', []):
+            counts[migrate_item(client, item, dry_run=args.dry_run)] += 1
+        last_key = encode_next_token(response.get('LastEvaluatedKey'))
+        checkpoint.update(segment, last_key, counts)
+        if last_key is None:
+            return
+
+def report(checkpoint, total_segments, started):
+    """
+    Prints the progress of the migration and returns the counters.
+    """
+    totals, done = checkpoint.totals()
+    print(f"{done}/{total_segments} segments done in {time.perf_counter() - started:.0f}s: "
+          + ', '.join(f"{totals[name]} {name}" for name in COUNTERS))
+    return totals
+
+def main():
+    args = parser.parse_args()
+    if args.segments < 1 or args.page_size < 1:
+        print("Error: --segments and --page-size must be positive.")
+        sys.exit(1)
+    try:
+        # A dry run does not move the saved scan position
+        checkpoint = Checkpoint(None if args.dry_run else args.checkpoint, args.segments, restart=args.restart)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    marketplace_capacity.configure(read_capacity=args.read_capacity, write_capacity=args.write_capacity)
+    print(f"Migrating products to schema version {PRODUCT_SCHEMA_VERSION}"
+          f"{' (dry run)' if args.dry_run else ''} at {args.read_capacity:g} RCU and {args.write_capacity:g} WCU.")
+
+    started = time.perf_counter()
+    stop = threading.Event()
+    with ThreadPoolExecutor(max_workers=args.workers or args.segments) as executor:
+        futures = [executor.submit(migrate_segment, segment, checkpoint, args, stop) for segment in range(args.segments)]
+        try:
+            pending = futures
+            while pending:
+                _, pending = wait(pending, timeout=PROGRESS_INTERVAL, return_when=FIRST_EXCEPTION)
+                if any(future.done() and future.exception() for future in futures):
+                    stop.set()
+                    break
+                if pending:
+                    report(checkpoint, args.segments, started)
+        except KeyboardInterrupt:
+            print("Stopping after the current scan pages. Run the tool again to resume.")
+            stop.set()
+
+    errors = [future.exception() for future in futures if future.done() and future.exception()]
+    totals = report(checkpoint, args.segments, started)
+    if errors:
+        print(f"Error: {errors[0]}. Run the tool again to resume.")
+        sys.exit(1)
+    if stop.is_set():
+        sys.exit(1)
+
+    if totals['migrated'] and not args.dry_run:
+        # Cached product listings are rebuilt with the new prices
+        bump_catalog_version()
+        if marketplace_snapshot.is_enabled():
+            print("Rebuild the catalog snapshot with tools/build_catalog_snapshot.py to pick up the new prices.")
+    if totals['conflicts'] or totals['failed']:
+        print("Some items changed during the run or could not be written. Run the tool again with --restart to retry them.")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
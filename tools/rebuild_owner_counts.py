@@ -0,0 +1,72 @@
+"""
+Rebuilds the per-seller product counts in 'MarketPlaceDatabase'.
+
+Reads every product with a parallel segmented scan, counts the products of
+each owner and overwrites their OWNER#<email> / #COUNT items. The Lambda
+functions keep the counts up to date on every create and delete afterwards, so
+this only needs to run once for products created before the counts existed, or
+after a counter update failed. Counters of owners with no products left are
+reset to 0. Counts changed while the tool runs are overwritten, so run it when
+no products are being created or deleted.
+
+Usage:
+    python tools/rebuild_owner_counts.py [--segments 8] [--workers 8]
+
+Set AWS_ENDPOINT_URL to run against a local DynamoDB stand-in, and
+MARKETPLACE_WRITE_CAPACITY to pace the writes to a provisioned table's write
+capacity. Throttled writes are retried with backoff either way.
+"""
+import os
+import sys
+import time
+import argparse
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda'))
+
+from boto3.dynamodb.conditions import Attr
+import marketplace_capacity  # noqa: F401
+from marketplace_common import OWNER_COUNT_SK, OWNER_PREFIX, batch_write, get_table, owner_count_key
+from marketplace_snapshot import scan_products
+
+parser = argparse.ArgumentParser(description="Rebuild the per-seller product counts.")
+parser.add_argument('--segments', type=int, default=8, help="number of parallel scan segments")
+parser.add_argument('--workers', type=int, default=None, help="size of the worker pool (defaults to --segments)")
+
+def scan_counted_owners():
+    """
+    Returns the owners that currently have a counter item.
+    """
+    scan_kwargs = {
+        'FilterExpression': Attr('PK').begins_with(OWNER_PREFIX) & Attr('SK').eq(OWNER_COUNT_SK),
+        'ProjectionExpression': 'PK'
+    }
+    owners = set()
+    while True:
+        response = get_table().scan(**scan_kwargs)
+        owners.update(item['PK'][len(OWNER_PREFIX):] for item in response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            return owners
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def main():
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    products = scan_products(total_segments=args.segments, max_workers=args.workers)
+    counts = Counter(product['ProductOwner'] for product in products if product.get('ProductOwner'))
+    for owner in scan_counted_owners():
+        counts.setdefault(owner, 0)
+    print(f"Counted {len(products)} products of {len(counts)} owners in {time.perf_counter() - started:.2f}s.")
+
+    failed = batch_write([
+        {'PutRequest': {'Item': {**owner_count_key(owner), 'ProductCount': count}}}
+        for owner, count in counts.items()
+    ])
+    if failed:
+        print(f"Error: {len(failed)} counts could not be written. Run the tool again.")
+        sys.exit(1)
+    print(f"Wrote {len(counts)} counts in {time.perf_counter() - started:.2f}s.")
+
+if __name__ == '__main__':
+    main()
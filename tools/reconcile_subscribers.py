@@ -0,0 +1,98 @@
+"""
+Rebuilds the SUBSCRIBER#<email> records in 'MarketPlaceDatabase' from the
+subscriptions of the 'MarketPlaceTopic' SNS topic.
+
+Run it after subscriptions were added or removed outside of the subscribe
+Lambda (e.g. from the SNS console) or to seed the records for an existing topic.
+
+Usage:
+    python tools/reconcile_subscribers.py [--prune] [--dry-run]
+"""
+import os
+import sys
+import argparse
+from boto3.dynamodb.conditions import Key
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda'))
+
+from marketplace_common import get_client, get_table, get_topic_arn
+from Post_Subscribe_Lambda import subscriber_item, subscriber_key
+
+# Secondary index keyed on the item type (HASH: Type, RANGE: PK)
+TYPE_INDEX = 'TypeIndex'
+
+def list_topic_subscriptions():
+    """
+    Lists the email subscriptions of the MarketPlace topic.
+
+    Returns:
+        dict: Subscription ARNs keyed by normalized email address.
+    """
+    subscriptions = {}
+    paginator = get_client('sns').get_paginator('list_subscriptions_by_topic')
+    for page in paginator.paginate(TopicArn=get_topic_arn()):
+        for subscription in page['Subscriptions']:
+            if subscription['Protocol'] == 'email':
+                email = subscription['Endpoint']
+                subscriptions[email.strip().lower()] = (email, subscription['SubscriptionArn'])
+    return subscriptions
+
+def list_subscriber_records():
+    """
+    Lists the subscriber records currently stored in the table.
+
+    Returns:
+        dict: Stored email addresses keyed by normalized email address.
+    """
+    records = {}
+    query_kwargs = {
+        'IndexName': TYPE_INDEX,
+        'KeyConditionExpression': Key('Type').eq('Subscriber'),
+        'ProjectionExpression': 'Email'
+    }
+    while True:
+        response = get_table().query(**query_kwargs)
+        for item in response.get('Items', []):
+            records[item['Email'].strip().lower()] = item['Email']
+        if 'LastEvaluatedKey' not in response:
+            return records
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def reconcile(prune=False, dry_run=False):
+    """
+    Writes a subscriber record for every email subscription of the topic.
+
+    Args:
+        prune (bool): Also delete records whose subscription no longer exists.
+        dry_run (bool): Only report what would change.
+
+    Returns:
+        dict: The number of records written and deleted.
+    """
+    subscriptions = list_topic_subscriptions()
+    stale = []
+    if prune:
+        stale = [email for key, email in list_subscriber_records().items() if key not in subscriptions]
+
+    if not dry_run:
+        # batch_writer sends the writes in BatchWriteItem calls of up to 25 items
+        with get_table().batch_writer(overwrite_by_pkeys=['PK', 'SK']) as batch:
+            for email, subscription_arn in subscriptions.values():
+                batch.put_item(Item=subscriber_item(email, subscription_arn))
+            for email in stale:
+                batch.delete_item(Key=subscriber_key(email))
+
+    return {'written': len(subscriptions), 'deleted': len(stale)}
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the subscriber records from the SNS topic.")
+    parser.add_argument('--prune', action='store_true', help="delete records without a matching subscription")
+    parser.add_argument('--dry-run', action='store_true', help="report the changes without writing them")
+    args = parser.parse_args()
+
+    counts = reconcile(prune=args.prune, dry_run=args.dry_run)
+    prefix = "Would have" if args.dry_run else "Successfully"
+    print(f"{prefix} written {counts['written']} and deleted {counts['deleted']} subscriber records.")
+
+if __name__ == '__main__':
+    main()